@@ -1,45 +1,146 @@
-"""Creates a sound wave file and its wave graph."""
+"""Creates a sound wave file, and optionally its wave graph.
 
-import time
+  python soundwave.py sin sawtooth --duration 2 --option frequency=220 \
+      --output sounds/chord.wav --plot frame
+
+Wave types are given by their SoundWaveType values, and options by their
+SoundWaveOption values, for every channel. Without wave types, creates the
+example file: x**2, sin, random and custom waves at a fifth of their
+volume. Channels are rendered and written block by block.
+
+Only plotting imports matplotlib, so files without graphs start several
+times faster.
+"""
+
+import argparse
+import sys
+import wave_batch
+import wave_codecs
 import wave_creator
+import wave_format
 import wave_generator
 import wave_plotter
+import wave_transformer
+from typing import Optional, Sequence, Text, Tuple
 
 
 _SOUND_FILE_NAME = 'sounds/sound.wav'
 _FILE_DURATION = 3  # In seconds.
 
+# Wave types of the example file, created when no wave types are given.
+_EXAMPLE_WAVE_TYPES = (
+    wave_generator.SoundWaveType.X2_WAVE,
+    wave_generator.SoundWaveType.SIN_WAVE,
+    wave_generator.SoundWaveType.RANDOM_WAVE,
+    wave_generator.SoundWaveType.CUSTOM_WAVE,
+)
+
 _SOUND_WAVE_OPTIONS = {
     wave_generator.SoundWaveOption.CUSTOM_WAVE_FORMULA: (
         '({x} + {min_sample}) / {max_sample}'),
-    wave_generator.SoundWaveOption.WAVE_TRANSFORMER: lambda x: int(x / 5),
+    wave_generator.SoundWaveOption.WAVE_TRANSFORMER: (
+        wave_transformer.TransformerPipeline([wave_transformer.Gain(1 / 5)])),
     wave_generator.SoundWaveOption.DEBUG: False,
     wave_generator.SoundWaveOption.FREQUENCY: 440,
 }
 
-_FILE_OPTIONS = {
-    wave_creator.SoundFileOption.FILE_NAME: _SOUND_FILE_NAME,
-}
 
-_SOUND_WAVE_GRAPH_TYPE = wave_plotter.WaveGraphType.PER_FRAME
+def _parse_option(option: Text) -> Tuple[Text, Text]:
+  """Parses a NAME=VALUE wave option of the command line.
+
+  Args:
+    option: Option as given on the command line.
+
+  Raises:
+    argparse.ArgumentTypeError: Option is not NAME=VALUE.
+
+  Returns:
+    Name and value of the option.
+  """
+  option_name, separator, option_value = option.partition('=')
+  if not separator:
+    raise argparse.ArgumentTypeError(
+        f'Options must be NAME=VALUE, got {option!r}.')
+  return option_name, option_value
+
+
+def main(argv: Optional[Sequence[Text]] = None) -> int:
+  """Creates a sound wave file from the command line.
+
+  Args:
+    argv: Command line arguments, without the program name.
 
+  Returns:
+    Exit status.
+  """
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument(
+      'wave_types', nargs='*', type=wave_generator.SoundWaveType,
+      metavar='WAVE_TYPE',
+      help='Wave type of each channel: ' + ', '.join(
+          wave_type.value for wave_type in wave_generator.SoundWaveType) +
+      '. Defaults to the example file.')
+  parser.add_argument(
+      '--duration', type=float, default=_FILE_DURATION,
+      help='Duration of the file, in seconds.')
+  parser.add_argument(
+      '--option', type=_parse_option, action='append', default=[],
+      metavar='NAME=VALUE', help='Wave option of every channel.')
+  parser.add_argument(
+      '--output', default=_SOUND_FILE_NAME, help='Sound file to write.')
+  parser.add_argument(
+      '--sample-format',
+      choices=[sample_format.value
+               for sample_format in wave_format.SampleFormat],
+      help='How samples are stored in the file. Samples have 16 bits of '
+           'resolution in any format. Defaults to int16.')
+  parser.add_argument(
+      '--compression-type',
+      choices=[compression_type.value
+               for compression_type in wave_codecs.CompressionType],
+      help='How samples are compressed. Defaults to NONE.')
+  parser.add_argument(
+      '--plot',
+      choices=[graph_type.value for graph_type in wave_plotter.WaveGraphType],
+      help='Type of wave graph to plot next to the file. Not plotted if not '
+      'set. Only uncompressed files are plotted.')
+  arguments = parser.parse_args(argv)
 
-if __name__ == "__main__":
-  wave_sound_generator = wave_generator.WaveSoundGenerator(_SOUND_WAVE_OPTIONS)
+  if arguments.duration <= 0:
+    parser.error(f'Duration must be positive, got {arguments.duration}.')
+  try:
+    wave_options = wave_batch.parse_wave_options(dict(arguments.option))
+  except ValueError as error:
+    parser.error(str(error))
+  sound_wave_types = tuple(arguments.wave_types)
+  if not sound_wave_types:
+    sound_wave_types = _EXAMPLE_WAVE_TYPES
+    wave_options = {**_SOUND_WAVE_OPTIONS, **wave_options}
 
-  wave_types = [
-      wave_generator.SoundWaveType.X2_WAVE,
-      wave_generator.SoundWaveType.SIN_WAVE,
-      wave_generator.SoundWaveType.RANDOM_WAVE,
-      wave_generator.SoundWaveType.CUSTOM_WAVE,
-  ]
+  file_options = {wave_creator.SoundFileOption.FILE_NAME: arguments.output}
+  if arguments.sample_format:
+    file_options[wave_creator.SoundFileOption.SAMPLE_FORMAT] = (
+        wave_format.SampleFormat(arguments.sample_format))
+  if arguments.compression_type:
+    file_options[wave_creator.SoundFileOption.COMPRESSION_TYPE] = (
+        arguments.compression_type)
+  wave_graph_type = None
+  if arguments.plot:
+    # Wave graphs read the file back, and only uncompressed WAV is read.
+    if arguments.compression_type not in (
+            None, wave_codecs.CompressionType.NONE.value):
+      parser.error(
+          f'Cannot plot files compressed as {arguments.compression_type}.')
+    wave_graph_type = wave_plotter.WaveGraphType(arguments.plot)
 
-  channels_data = [
-      wave_sound_generator.get_wave_sound_samples(_FILE_DURATION, wave_type)
-      for wave_type in wave_types
-  ]
+  wave_batch.write_job(
+      wave_generator.WaveSoundGenerator(),
+      wave_batch.BatchJob(
+          arguments.output, arguments.duration, sound_wave_types,
+          (wave_options,) * len(sound_wave_types), file_options,
+          wave_graph_type))
+  return 0
 
-  wave_creator.create_sound_file(_FILE_DURATION, channels_data, _FILE_OPTIONS)
 
-  wave_plotter.create_sound_wave_graph(
-      _SOUND_FILE_NAME, _SOUND_WAVE_GRAPH_TYPE)
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
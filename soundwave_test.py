@@ -0,0 +1,61 @@
+"""Tests that short command line jobs start fast and without plotting."""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+
+# Max seconds for soundwave.py to start, write a short WAV file and exit.
+_COLD_START_LIMIT = 1.0
+# Best of this many runs is kept, as the first one may load files from disk.
+_COLD_START_REPEATS = 3
+# Directory of soundwave.py.
+_PACKAGE_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+# Runs soundwave.py in a new interpreter, then prints whether it imported
+# matplotlib.
+_MODULES_SCRIPT = '''
+import sys
+import soundwave
+soundwave.main(sys.argv[1:])
+print('matplotlib' in sys.modules)
+'''
+
+
+class ColdStartTest(unittest.TestCase):
+  """Checks soundwave.py writing a short WAV file from a new interpreter.
+
+  Methods:
+    test_cold_start_time: The job runs under _COLD_START_LIMIT.
+    test_no_matplotlib: The job does not import matplotlib.
+  """
+
+  def setUp(self):
+    self._directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self._directory.cleanup)
+    self._arguments = [
+        'sin', '--duration', '0.1',
+        '--output', os.path.join(self._directory.name, 'cold_start.wav')]
+
+  def test_cold_start_time(self):
+    command = [
+        sys.executable, os.path.join(_PACKAGE_DIRECTORY, 'soundwave.py')]
+    run_seconds = []
+    for _ in range(_COLD_START_REPEATS):
+      start_time = time.perf_counter()
+      subprocess.run(command + self._arguments, check=True)
+      run_seconds.append(time.perf_counter() - start_time)
+    self.assertLessEqual(min(run_seconds), _COLD_START_LIMIT)
+
+  def test_no_matplotlib(self):
+    output = subprocess.run(
+        [sys.executable, '-c', _MODULES_SCRIPT] + self._arguments,
+        check=True, capture_output=True, text=True, cwd=_PACKAGE_DIRECTORY)
+    self.assertTrue(os.path.exists(self._arguments[-1]))
+    self.assertEqual(output.stdout.splitlines()[-1], 'False')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,290 @@
+"""Renders and writes sound files from asyncio, without blocking the loop."""
+
+import array
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import threading
+import wave_creator
+import wave_generator
+import wave_plotter
+import wave_settings
+import wave_writer
+from typing import (
+    Any, AsyncIterator, Callable, List, Optional, Sequence, Text)
+
+
+# Plots are drawn on pyplot's global figure, so only one at a time.
+_PLOT_LOCK = threading.Lock()
+
+
+def _create_sound_wave_graph(
+        sound_wave_file_name: Text,
+        wave_graph_type: wave_plotter.WaveGraphType):
+  """Creates a wave graph, waiting for any other graph to be done."""
+  with _PLOT_LOCK:
+    wave_plotter.create_sound_wave_graph(sound_wave_file_name, wave_graph_type)
+
+
+class AsyncWaveRenderer(object):
+  """Async versions of the blocking render, write and plot calls.
+
+  CPU-heavy synthesis, file writes and plots run in an executor, so the
+  event loop keeps serving other jobs. Streamed sound files overlap writing
+  each block with rendering the next one. Jobs run within job() wait for
+  one of max_concurrent_jobs slots.
+
+  Thread executors see the active wave_instrumentation profiler. Process
+  executors only render samples and plot, which need picklable wave options
+  and are not profiled. Calls that hold open files, file writes and
+  streamed renders, run on the event loop's default thread executor then.
+
+  Methods:
+    job: Waits for a job slot and holds it.
+    get_wave_sound_samples: Gets data for sound wave.
+    create_sound_file: Creates a sound file from sound samples.
+    create_streamed_sound_file: Renders and writes a sound file block by
+      block.
+    create_sound_wave_graph: Creates a wave graph of a sound file.
+    render_sound_file: Renders, writes and optionally plots a sound file, as
+      one job.
+  """
+
+  def __init__(
+          self, wave_sound_generator: wave_generator.WaveSoundGenerator,
+          max_concurrent_jobs: Optional[int] = None,
+          executor: Optional[concurrent.futures.Executor] = None):
+    """Instantiates an AsyncWaveRenderer.
+
+    Args:
+      wave_sound_generator: Generator of the sound waves.
+      max_concurrent_jobs: Max number of jobs running at once. None for no
+        limit.
+      executor: Executor to run blocking calls in. Defaults to the event
+        loop's default executor. Process executors run sample renders and
+        plots only.
+
+    Raises:
+      ValueError: max_concurrent_jobs must be positive.
+    """
+    if max_concurrent_jobs is not None and max_concurrent_jobs < 1:
+      raise ValueError(
+          f'Max concurrent jobs must be positive, got {max_concurrent_jobs}.')
+    self._wave_sound_generator = wave_sound_generator
+    self._executor = executor
+    self._job_semaphore = None
+    if max_concurrent_jobs is not None:
+      self._job_semaphore = asyncio.Semaphore(max_concurrent_jobs)
+
+  async def _run_in_executor(
+          self, function: Callable[..., Any], *args: Any) -> Any:
+    """Runs a blocking function in the executor.
+
+    Process executors need the function, its arguments and its result to be
+    picklable, e.g. top-level functions and renders of samples.
+
+    Args:
+      function: Function to run.
+      *args: Arguments of the function.
+
+    Returns:
+      Result of the function.
+    """
+    if self._executor is None or isinstance(
+            self._executor, concurrent.futures.ThreadPoolExecutor):
+      return await self._run_in_thread(function, *args)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        self._executor, functools.partial(function, *args))
+
+  async def _run_in_thread(
+          self, function: Callable[..., Any], *args: Any) -> Any:
+    """Runs a blocking function in a thread.
+
+    For functions that cannot run in other processes, as they or their
+    results cannot be pickled, e.g. writes to open files. They run in the
+    executor if it is a thread executor, or in the event loop's default one.
+
+    Args:
+      function: Function to run.
+      *args: Arguments of the function.
+
+    Returns:
+      Result of the function.
+    """
+    executor = self._executor
+    if not isinstance(executor, concurrent.futures.ThreadPoolExecutor):
+      executor = None
+    loop = asyncio.get_running_loop()
+    # Threads do not inherit context variables, e.g. the active profiler.
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(
+        executor, functools.partial(context.run, function, *args))
+
+  @contextlib.asynccontextmanager
+  async def job(self) -> AsyncIterator[None]:
+    """Waits for a job slot and holds it within the context."""
+    if self._job_semaphore is None:
+      yield
+      return
+    async with self._job_semaphore:
+      yield
+
+  async def get_wave_sound_samples(
+          self, duration: int, sound_wave_type: wave_generator.SoundWaveType,
+          wave_specific_options: Optional[wave_generator.WaveOptions] = None
+  ) -> array.array:
+    """Gets the sound wave values for the given wave type and duration.
+
+    Args:
+      duration: Duration of the sound wave.
+      sound_wave_type: Type of sound wave to generate.
+      wave_specific_options: Modifiers to the specific wave.
+
+    Returns:
+      Values generated by requested sound wave for requested duration.
+    """
+    return await self._run_in_executor(
+        self._wave_sound_generator.get_wave_sound_samples, duration,
+        sound_wave_type, wave_specific_options)
+
+  async def create_sound_file(
+          self, duration: int, channels_data: Sequence[array.array],
+          file_options: wave_creator.SoundFileOptions) -> wave_writer.WavWriter:
+    """Creates a sound file based on the provided sound samples.
+
+    Args:
+      duration: Duration of the file in seconds.
+      channels_data: Sound samples to write to each channel.
+      file_options: File configuration.
+
+    Returns:
+      Sound file.
+    """
+    # The sound file holds its closed file, which cannot be pickled.
+    return await self._run_in_thread(
+        wave_creator.create_sound_file, duration, channels_data, file_options)
+
+  async def create_streamed_sound_file(
+          self, duration: int,
+          sound_wave_types: Sequence[wave_generator.SoundWaveType],
+          file_options: wave_creator.SoundFileOptions,
+          wave_specific_options: Optional[
+              Sequence[Optional[wave_generator.WaveOptions]]] = None,
+          block_size: Optional[int] = None) -> wave_writer.WavWriter:
+    """Renders and writes a sound file block by block.
+
+    Each block is written while the next one is rendered, and only those two
+    blocks are held in memory. Channels at other sample rates than the file
+    are resampled to it. Blocks are rendered and written in threads, as the
+    block generators and the open file stay in this process.
+
+    Args:
+      duration: Duration of the file in seconds.
+      sound_wave_types: Type of sound wave of each channel.
+      file_options: File configuration.
+      wave_specific_options: Modifiers to the wave of each channel.
+      block_size: Number of frames per block.
+
+    Raises:
+      ValueError: Must provide at least one channel and as many wave options
+        as wave types.
+
+    Returns:
+      Sound file.
+    """
+    if not sound_wave_types:
+      raise ValueError('Must provide samples for at least one channel.')
+    wave_specific_options = (
+        wave_specific_options or [None] * len(sound_wave_types))
+    if len(wave_specific_options) != len(sound_wave_types):
+      raise ValueError('Must provide wave options for each wave type.')
+    channel_sample_rates = [
+        self._wave_sound_generator.get_wave_spec(channel_options).sample_rate
+        for channel_options in wave_specific_options]
+    sample_rate = wave_creator.get_sound_file_sample_rate(
+        file_options, channel_sample_rates)
+
+    block_size = block_size or wave_settings.RENDER_BLOCK_SIZE
+    channels_blocks = wave_creator.read_channels_blocks(
+        sample_rate,
+        [self._wave_sound_generator.get_wave_sound_blocks(
+            duration, sound_wave_type, channel_options, block_size)
+         for sound_wave_type, channel_options in zip(
+             sound_wave_types, wave_specific_options)],
+        channel_sample_rates, block_size)
+
+    def render_next_block() -> Optional[List[Any]]:
+      """Renders the next block of every channel, or None when done."""
+      return next(channels_blocks, None)
+
+    sound_writer = await self._run_in_thread(
+        wave_creator.SoundFileWriter, sample_rate, len(sound_wave_types),
+        file_options)
+    next_block_future = None
+    write_future = None
+    try:
+      channels_block = await self._run_in_thread(render_next_block)
+      while channels_block is not None:
+        next_block_future = asyncio.ensure_future(
+            self._run_in_thread(render_next_block))
+        if write_future is not None:
+          await write_future
+        write_future = asyncio.ensure_future(
+            self._run_in_thread(sound_writer.write_block, channels_block))
+        channels_block = await next_block_future
+      if write_future is not None:
+        await write_future
+    finally:
+      # Executor calls cannot be interrupted, only waited for.
+      pending_futures = [
+          future for future in (next_block_future, write_future)
+          if future is not None and not future.done()]
+      await asyncio.gather(*pending_futures, return_exceptions=True)
+      await self._run_in_thread(sound_writer.close)
+    return sound_writer.sound_file
+
+  async def create_sound_wave_graph(
+          self, sound_wave_file_name: Text,
+          wave_graph_type: wave_plotter.WaveGraphType):
+    """Creates a wave graph for given sound wav file.
+
+    Graphs are drawn one at a time, as pyplot is not thread-safe.
+
+    Args:
+      sound_wave_file_name: Wav file to plot.
+      wave_graph_type: Type of plot to create.
+    """
+    await self._run_in_executor(
+        _create_sound_wave_graph, sound_wave_file_name, wave_graph_type)
+
+  async def render_sound_file(
+          self, duration: int,
+          sound_wave_types: Sequence[wave_generator.SoundWaveType],
+          file_options: wave_creator.SoundFileOptions,
+          wave_specific_options: Optional[
+              Sequence[Optional[wave_generator.WaveOptions]]] = None,
+          wave_graph_type: Optional[wave_plotter.WaveGraphType] = None
+  ) -> wave_writer.WavWriter:
+    """Renders, writes and optionally plots a sound file, as one job.
+
+    Args:
+      duration: Duration of the file in seconds.
+      sound_wave_types: Type of sound wave of each channel.
+      file_options: File configuration.
+      wave_specific_options: Modifiers to the wave of each channel.
+      wave_graph_type: Type of plot to create. None to not plot.
+
+    Returns:
+      Sound file.
+    """
+    async with self.job():
+      sound_file = await self.create_streamed_sound_file(
+          duration, sound_wave_types, file_options, wave_specific_options)
+      if wave_graph_type is not None:
+        file_name = wave_creator.get_file_option_value(
+            file_options or {}, wave_creator.SoundFileOption.FILE_NAME)
+        await self.create_sound_wave_graph(file_name, wave_graph_type)
+    return sound_file
@@ -0,0 +1,532 @@
+"""Renders many sound files from a JSON or CSV manifest.
+
+Each job of the manifest describes a sound file. In JSON, the manifest is a
+list of jobs, or an object with a list of "jobs":
+
+  [{"file_name": "sounds/a.wav", "duration": 3,
+    "wave_types": ["sin", "x**2"],
+    "options": {"frequency": 440},
+    "channel_options": [{}, {"volume": 0.5}],
+    "mix_mode": "average", "channel_gains": [1, 0.5], "graph": "frame",
+    "sample_format": "int24"}]
+
+Wave types, mix modes, graph types, sample formats and compression types
+are given by their enum values, and options by their SoundWaveOption
+values. Only file_name, duration and wave_types are required. In CSV, each
+row is a job with file_name, duration and wave_types columns, wave types
+separated by ';'. mix_mode, graph, sample_format and compression_type
+columns are optional, and any other column is a wave option for every
+channel:
+
+  file_name,duration,wave_types,frequency,graph
+  sounds/a.wav,3,sin;x**2,440,frame
+
+Jobs run on a pool of processes. Each process keeps its wave sound
+generator, so cached wave cycles and compiled formulas are reused across
+jobs. Channels repeated across jobs are rendered once, and shared between
+the processes through a temporary render cache directory.
+Files are written block by block, with bounded memory. A failing job is
+reported and does not stop the others.
+
+  python wave_batch.py manifest.json --workers 4
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import csv
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+import wave_cache
+import wave_codecs
+import wave_creator
+import wave_format
+import wave_generator
+import wave_mixer
+import wave_noise
+import wave_plotter
+import wave_settings
+from typing import (
+    Any, Collection, List, Mapping, NamedTuple, Optional, Sequence,
+    Text, Tuple)
+
+
+# Separator of the wave types in CSV manifests.
+_CSV_WAVE_TYPES_SEPARATOR = ';'
+
+# Manifest fields that are not wave options, in CSV manifests.
+_CSV_JOB_FIELDS = frozenset(['file_name', 'duration', 'wave_types',
+                             'mix_mode', 'graph', 'sample_format',
+                             'compression_type'])
+
+# A job of a manifest, as read from the file.
+ManifestJob = Mapping[Text, Any]
+
+
+class BatchJob(NamedTuple):
+  """Sound file to render, as parsed from a manifest job."""
+  file_name: Text
+  duration: float
+  sound_wave_types: Tuple[wave_generator.SoundWaveType, ...]
+  # Wave options of each channel.
+  wave_specific_options: Tuple[wave_generator.WaveOptions, ...]
+  file_options: wave_creator.SoundFileOptions
+  # Type of graph to plot, or None to not plot.
+  wave_graph_type: Optional[wave_plotter.WaveGraphType]
+
+
+class BatchJobResult(NamedTuple):
+  """Outcome of a job."""
+  # Position of the job in the manifest.
+  job_index: int
+  file_name: Text
+  frames: int
+  bytes_written: int
+  seconds: float
+  # Description of the error, or None if the job succeeded.
+  error: Optional[Text]
+
+
+def _parse_option_value(value: Any) -> Any:
+  """Parses a number or a boolean out of a CSV value, if it is one.
+
+  Args:
+    value: Value as read from the manifest.
+
+  Returns:
+    Int or float if value is a string of a number, bool if it is 'true' or
+    'false', else value.
+  """
+  if not isinstance(value, str):
+    return value
+  if value.lower() in ('true', 'false'):
+    return value.lower() == 'true'
+  for number_type in (int, float):
+    try:
+      return number_type(value)
+    except ValueError:
+      pass
+  return value
+
+
+def parse_wave_options(
+        option_values: Mapping[Text, Any]) -> wave_generator.WaveOptions:
+  """Parses wave options from a manifest or the command line.
+
+  Args:
+    option_values: Value of each option, by SoundWaveOption value.
+
+  Raises:
+    ValueError: Unknown option, or option that cannot come from a manifest.
+
+  Returns:
+    Wave options.
+  """
+  wave_options = {}
+  for option_name, option_value in option_values.items():
+    option = wave_generator.SoundWaveOption(option_name)
+    if option == wave_generator.SoundWaveOption.WAVE_TRANSFORMER:
+      raise ValueError('Wave transformers cannot be set from a manifest.')
+    option_value = _parse_option_value(option_value)
+    if option == wave_generator.SoundWaveOption.RENDER_MODE:
+      option_value = wave_generator.RenderMode(option_value)
+    elif option == wave_generator.SoundWaveOption.NOISE_COLOR:
+      option_value = wave_noise.NoiseColor(option_value)
+    wave_options[option] = option_value
+  return wave_options
+
+
+def parse_job(manifest_job: ManifestJob) -> BatchJob:
+  """Parses a job of a manifest.
+
+  Args:
+    manifest_job: Job as read from the manifest.
+
+  Raises:
+    ValueError: Job is missing fields or has invalid values.
+
+  Returns:
+    Sound file to render.
+  """
+  missing_fields = {'file_name', 'duration', 'wave_types'} - set(manifest_job)
+  if missing_fields:
+    raise ValueError(f'Missing job fields: {sorted(missing_fields)}')
+
+  file_name = manifest_job['file_name']
+  duration = float(manifest_job['duration'])
+  if duration <= 0:
+    raise ValueError(f'Duration must be positive, got {duration}.')
+  sound_wave_types = tuple(
+      wave_generator.SoundWaveType(wave_type)
+      for wave_type in manifest_job['wave_types'])
+  if not sound_wave_types:
+    raise ValueError('Must provide at least one wave type.')
+
+  shared_options = parse_wave_options(manifest_job.get('options') or {})
+  channel_options = manifest_job.get('channel_options') or (
+      [{}] * len(sound_wave_types))
+  if len(channel_options) != len(sound_wave_types):
+    raise ValueError('Must provide channel options for each wave type.')
+  wave_specific_options = tuple(
+      {**shared_options, **parse_wave_options(channel_values)}
+      for channel_values in channel_options)
+
+  file_options = {wave_creator.SoundFileOption.FILE_NAME: file_name}
+  if manifest_job.get('mix_mode'):
+    file_options[wave_creator.SoundFileOption.MIX_MODE] = wave_mixer.MixMode(
+        manifest_job['mix_mode'])
+  if manifest_job.get('channel_gains'):
+    file_options[wave_creator.SoundFileOption.CHANNEL_GAINS] = [
+        float(channel_gain) for channel_gain in manifest_job['channel_gains']]
+  if manifest_job.get('sample_format'):
+    file_options[wave_creator.SoundFileOption.SAMPLE_FORMAT] = (
+        wave_format.SampleFormat(manifest_job['sample_format']))
+  if manifest_job.get('compression_type'):
+    file_options[wave_creator.SoundFileOption.COMPRESSION_TYPE] = (
+        wave_codecs.CompressionType(manifest_job['compression_type']).value)
+
+  wave_graph_type = None
+  if manifest_job.get('graph'):
+    compression_type = file_options.get(
+        wave_creator.SoundFileOption.COMPRESSION_TYPE,
+        wave_codecs.CompressionType.NONE.value)
+    # Wave graphs read the file back, and only uncompressed WAV is read.
+    if compression_type != wave_codecs.CompressionType.NONE.value:
+      raise ValueError(f'Cannot plot files compressed as {compression_type}.')
+    wave_graph_type = wave_plotter.WaveGraphType(manifest_job['graph'])
+
+  return BatchJob(
+      file_name, duration, sound_wave_types, wave_specific_options,
+      file_options, wave_graph_type)
+
+
+def _read_csv_manifest(manifest_file_name: Text) -> List[ManifestJob]:
+  """Reads the jobs of a CSV manifest.
+
+  Args:
+    manifest_file_name: CSV file, with a header row.
+
+  Returns:
+    Jobs of the manifest.
+  """
+  manifest_jobs = []
+  with open(manifest_file_name, newline='') as manifest_file:
+    for row in csv.DictReader(manifest_file):
+      manifest_job = {
+          field: value for field, value in row.items()
+          if field in _CSV_JOB_FIELDS}
+      manifest_job['wave_types'] = [
+          wave_type.strip() for wave_type in
+          row.get('wave_types', '').split(_CSV_WAVE_TYPES_SEPARATOR)
+          if wave_type.strip()]
+      manifest_job['options'] = {
+          field: value for field, value in row.items()
+          if field not in _CSV_JOB_FIELDS and value not in (None, '')}
+      manifest_jobs.append(manifest_job)
+  return manifest_jobs
+
+
+def load_manifest(manifest_file_name: Text) -> List[ManifestJob]:
+  """Reads the jobs of a JSON or CSV manifest, by file extension.
+
+  Args:
+    manifest_file_name: Manifest file.
+
+  Raises:
+    ValueError: Manifest is not a list of jobs.
+
+  Returns:
+    Jobs of the manifest, not yet parsed.
+  """
+  if manifest_file_name.lower().endswith('.csv'):
+    return _read_csv_manifest(manifest_file_name)
+
+  with open(manifest_file_name) as manifest_file:
+    manifest = json.load(manifest_file)
+  if isinstance(manifest, dict):
+    manifest = manifest.get('jobs')
+  if not isinstance(manifest, list):
+    raise ValueError(f'Manifest must be a list of jobs: {manifest_file_name}')
+  return manifest
+
+
+# Wave sound generator of the current batch worker process.
+_batch_worker_state = {}
+
+
+def _init_batch_worker(cache_directory: Optional[Text] = None):
+  """Creates the wave sound generator that a batch process reuses.
+
+  Args:
+    cache_directory: Directory of the render cache shared by the batch
+      processes. None to only cache in memory.
+  """
+  _batch_worker_state['generator'] = wave_generator.WaveSoundGenerator(
+      render_cache=wave_cache.RenderCache(directory=cache_directory))
+
+
+def write_sound_file(
+        wave_sound_generator: wave_generator.WaveSoundGenerator,
+        batch_job: BatchJob,
+        shared_cache_keys: Collection[Text] = frozenset()) -> int:
+  """Writes the sound file of a job, without its graph.
+
+  If writing fails once the file is open, the partly written file is
+  removed, as it would look like a valid output. Files are left untouched
+  by errors before they are opened.
+
+  Args:
+    wave_sound_generator: Generator of the wave functions.
+    batch_job: Sound file to render.
+    shared_cache_keys: Render cache keys of the channels to render whole and
+      cache. Others are streamed.
+
+  Returns:
+    Number of frames written.
+  """
+  channel_sample_rates = [
+      wave_sound_generator.get_wave_spec(channel_options).sample_rate
+      for channel_options in batch_job.wave_specific_options]
+  sample_rate = wave_creator.get_sound_file_sample_rate(
+      batch_job.file_options, channel_sample_rates)
+  file_options = dict(batch_job.file_options)
+  file_options[wave_creator.SoundFileOption.CHANNEL_SAMPLE_RATES] = (
+      channel_sample_rates)
+
+  channels_chunks = []
+  for sound_wave_type, channel_options in zip(
+          batch_job.sound_wave_types, batch_job.wave_specific_options):
+    render_cache_key = wave_sound_generator.get_render_cache_key(
+        batch_job.duration, sound_wave_type, channel_options)
+    if render_cache_key in shared_cache_keys:
+      channels_chunks.append([wave_sound_generator.get_wave_sound_samples(
+          batch_job.duration, sound_wave_type, channel_options)])
+    else:
+      channels_chunks.append(wave_sound_generator.get_wave_sound_blocks(
+          batch_job.duration, sound_wave_type, channel_options))
+
+  output_directory = os.path.dirname(batch_job.file_name)
+  if output_directory:
+    os.makedirs(output_directory, exist_ok=True)
+  sound_writer = wave_creator.SoundFileWriter(
+      sample_rate, len(channels_chunks), file_options)
+  try:
+    with sound_writer:
+      for channels_block in wave_creator.read_channels_blocks(
+              sample_rate, channels_chunks, channel_sample_rates):
+        sound_writer.write_block(channels_block)
+  except BaseException:
+    if os.path.exists(batch_job.file_name):
+      os.remove(batch_job.file_name)
+    raise
+  return int(batch_job.duration * sample_rate)
+
+
+def write_job(
+        wave_sound_generator: wave_generator.WaveSoundGenerator,
+        batch_job: BatchJob,
+        shared_cache_keys: Collection[Text] = frozenset()) -> int:
+  """Writes the sound file of a job, and its graph if any.
+
+  Args:
+    wave_sound_generator: Generator of the wave functions.
+    batch_job: Sound file to render.
+    shared_cache_keys: Render cache keys of the channels to render whole and
+      cache. Others are streamed.
+
+  Returns:
+    Number of frames written.
+  """
+  frames = write_sound_file(
+      wave_sound_generator, batch_job, shared_cache_keys)
+  if batch_job.wave_graph_type is not None:
+    wave_plotter.create_sound_wave_graph(
+        batch_job.file_name, batch_job.wave_graph_type)
+  return frames
+
+
+def _get_error_description() -> Text:
+  """Describes the exception being handled, in one line."""
+  return traceback.format_exc(limit=1).strip().splitlines()[-1]
+
+
+def _render_batch_job(
+        job_index: int, batch_job: BatchJob,
+        shared_cache_keys: Collection[Text]) -> BatchJobResult:
+  """Renders a job, writing its sound file and graph.
+
+  Args:
+    job_index: Position of the job in the manifest.
+    batch_job: Sound file to render.
+    shared_cache_keys: Render cache keys of the channels in many jobs.
+      Those are rendered whole and cached, others are streamed.
+
+  Returns:
+    Outcome of the job. Errors are reported, not raised. Sound files whose
+    graph fails are kept, and the graph error reported.
+  """
+  start_time = time.perf_counter()
+  frames = 0
+  bytes_written = 0
+  error = None
+  # Errors are reported in the results, so the batch goes on.
+  try:
+    frames = write_sound_file(
+        _batch_worker_state['generator'], batch_job, shared_cache_keys)
+    bytes_written = os.path.getsize(batch_job.file_name)
+  except Exception:
+    error = _get_error_description()
+  if error is None and batch_job.wave_graph_type is not None:
+    try:
+      wave_plotter.create_sound_wave_graph(
+          batch_job.file_name, batch_job.wave_graph_type)
+    except Exception:
+      error = f'Wave graph failed: {_get_error_description()}'
+  return BatchJobResult(
+      job_index, batch_job.file_name, frames, bytes_written,
+      time.perf_counter() - start_time, error)
+
+
+def _get_shared_cache_keys(batch_jobs: Sequence[BatchJob]) -> Collection[Text]:
+  """Gets the render cache keys of the channels in more than one job.
+
+  Args:
+    batch_jobs: Sound files to render.
+
+  Returns:
+    Render cache keys of the repeated channels.
+  """
+  wave_sound_generator = wave_generator.WaveSoundGenerator()
+  key_counts = collections.Counter()
+  for batch_job in batch_jobs:
+    job_keys = set()
+    for sound_wave_type, channel_options in zip(
+            batch_job.sound_wave_types, batch_job.wave_specific_options):
+      try:
+        render_cache_key = wave_sound_generator.get_render_cache_key(
+            batch_job.duration, sound_wave_type, channel_options)
+        wave_spec = wave_sound_generator.get_wave_spec(channel_options)
+      except (TypeError, ValueError):
+        # Invalid options fail the job when rendered, not the whole batch.
+        continue
+      frames = int(batch_job.duration * wave_spec.sample_rate)
+      # Channels too large for the cache would be rendered whole for nothing.
+      if (render_cache_key is not None and
+              frames * wave_settings.BYTES_OF_DATA <=
+              wave_settings.RENDER_CACHE_MEMORY_BYTES):
+        job_keys.add(render_cache_key)
+    key_counts.update(job_keys)
+  return frozenset(
+      render_cache_key for render_cache_key, key_count in key_counts.items()
+      if key_count > 1)
+
+
+def run_batch(
+        manifest_jobs: Sequence[ManifestJob],
+        max_workers: Optional[int] = None) -> List[BatchJobResult]:
+  """Renders the sound files of the jobs of a manifest.
+
+  Args:
+    manifest_jobs: Jobs as read from a manifest.
+    max_workers: Max number of processes. Defaults to the number of CPUs. 1
+      renders in this process.
+
+  Returns:
+    Outcome of each job, in manifest order.
+  """
+  results = []
+  batch_jobs = []
+  for job_index, manifest_job in enumerate(manifest_jobs):
+    try:
+      batch_jobs.append((job_index, parse_job(manifest_job)))
+    except (KeyError, TypeError, ValueError) as error:
+      file_name = ''
+      if isinstance(manifest_job, Mapping):
+        file_name = str(manifest_job.get('file_name', ''))
+      results.append(BatchJobResult(
+          job_index, file_name, 0, 0, 0.0, f'Invalid job: {error}'))
+
+  shared_cache_keys = _get_shared_cache_keys(
+      [batch_job for _, batch_job in batch_jobs])
+
+  if max_workers == 1 or len(batch_jobs) <= 1:
+    _init_batch_worker()
+    for job_index, batch_job in batch_jobs:
+      results.append(
+          _render_batch_job(job_index, batch_job, shared_cache_keys))
+  else:
+    # Channels of many jobs are cached on disk, so whichever process renders
+    # them first shares them with the others.
+    with tempfile.TemporaryDirectory(
+            prefix='wave_batch_cache_') as cache_directory:
+      with concurrent.futures.ProcessPoolExecutor(
+              max_workers=max_workers,
+              initializer=_init_batch_worker,
+              initargs=(cache_directory,)) as executor:
+        job_futures = [
+            executor.submit(
+                _render_batch_job, job_index, batch_job, shared_cache_keys)
+            for job_index, batch_job in batch_jobs]
+        for job_future in concurrent.futures.as_completed(job_futures):
+          results.append(job_future.result())
+
+  return sorted(results, key=lambda result: result.job_index)
+
+
+def format_batch_summary(
+        results: Sequence[BatchJobResult], elapsed_time: float) -> Text:
+  """Formats the throughput of a batch and its failed jobs.
+
+  Args:
+    results: Outcome of each job.
+    elapsed_time: Seconds the whole batch took.
+
+  Returns:
+    Summary, one line per failed job and a line of totals.
+  """
+  lines = []
+  failed_results = [result for result in results if result.error]
+  for result in failed_results:
+    lines.append(
+        f'FAILED job {result.job_index} ({result.file_name}): {result.error}')
+
+  frames = sum(result.frames for result in results)
+  bytes_written = sum(result.bytes_written for result in results)
+  succeeded_jobs = len(results) - len(failed_results)
+  elapsed_time = elapsed_time or float('inf')
+  lines.append(
+      f'{succeeded_jobs}/{len(results)} jobs succeeded in '
+      f'{elapsed_time:.2f} s: {succeeded_jobs / elapsed_time:.1f} files/s, '
+      f'{frames / elapsed_time:.0f} frames/s, '
+      f'{bytes_written / elapsed_time / 2 ** 20:.1f} MiB/s written')
+  return '\n'.join(lines)
+
+
+def main(argv: Optional[Sequence[Text]] = None) -> int:
+  """Renders the sound files of a manifest from the command line.
+
+  Args:
+    argv: Command line arguments, without the program name.
+
+  Returns:
+    Exit status: 0 if every job succeeded, else 1.
+  """
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument('manifest', help='JSON or CSV manifest of jobs.')
+  parser.add_argument(
+      '--workers', type=int, default=None,
+      help='Number of processes. Defaults to the number of CPUs.')
+  arguments = parser.parse_args(argv)
+
+  start_time = time.perf_counter()
+  results = run_batch(load_manifest(arguments.manifest), arguments.workers)
+  print(format_batch_summary(results, time.perf_counter() - start_time))
+  return 1 if any(result.error for result in results) else 0
+
+
+if __name__ == '__main__':
+  sys.exit(main(sys.argv[1:]))
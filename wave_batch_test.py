@@ -0,0 +1,75 @@
+"""Tests that batch jobs are rendered independently of each other."""
+
+import numpy as np
+import os
+import tempfile
+import unittest
+import wave_batch
+import wave_reader
+
+
+# Duration of the rendered sound files, in seconds.
+_DURATION = 0.5
+
+
+class RunBatchTest(unittest.TestCase):
+  """Checks the outcome of batches with failing and shared jobs.
+
+  Methods:
+    test_failing_job_serial: A failing job does not stop the others.
+    test_failing_job_parallel: Same, on a pool of processes.
+  """
+
+  def setUp(self):
+    self._directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self._directory.cleanup)
+
+  def _get_file_name(self, name: str) -> str:
+    """Gets a file name in the test directory."""
+    return os.path.join(self._directory.name, name)
+
+  def _assert_failing_job_reported(self, max_workers: int):
+    """Asserts that a failing job is reported and others are written.
+
+    Args:
+      max_workers: Max number of processes.
+    """
+    # The sin channel of the first two jobs is rendered once and shared.
+    manifest_jobs = [
+        {'file_name': self._get_file_name('a.wav'), 'duration': _DURATION,
+         'wave_types': ['sin', 'x**2']},
+        {'file_name': self._get_file_name('b.wav'), 'duration': _DURATION,
+         'wave_types': ['sin']},
+        {'file_name': self._get_file_name('failing.wav'),
+         'duration': _DURATION, 'wave_types': ['custom'],
+         'options': {'custom_wave_formula': '1 / ({x} - 100)'}},
+        {'file_name': self._get_file_name('invalid.wav'),
+         'duration': _DURATION, 'wave_types': ['unknown']},
+        {'file_name': self._get_file_name('c.wav'), 'duration': _DURATION,
+         'wave_types': ['sin', 'x**2']},
+    ]
+    results = wave_batch.run_batch(manifest_jobs, max_workers)
+
+    self.assertEqual(
+        [result.job_index for result in results], list(range(5)))
+    self.assertIn('ZeroDivisionError', results[2].error)
+    self.assertIn('Invalid job', results[3].error)
+    self.assertFalse(os.path.exists(self._get_file_name('failing.wav')))
+    for result in (results[0], results[1], results[4]):
+      self.assertIsNone(result.error)
+      self.assertEqual(result.bytes_written, os.path.getsize(result.file_name))
+
+    with wave_reader.open_wav_file(self._get_file_name('a.wav')) as a_file:
+      with wave_reader.open_wav_file(self._get_file_name('c.wav')) as c_file:
+        self.assertEqual(a_file.number_frames, int(_DURATION * 44100))
+        np.testing.assert_array_equal(a_file.get_frames(), c_file.get_frames())
+
+  def test_failing_job_serial(self):
+    self._assert_failing_job_reported(1)
+
+  def test_failing_job_parallel(self):
+    self._assert_failing_job_reported(2)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,590 @@
+"""Benchmarks wave generation hot paths.
+
+Times each stage of creating a sound file on its own: wave function setup,
+sample rendering for every wave type and noise color, mixdown, conversion
+to every sample format, WAV writing, compression with every compression
+type and plotting. Stages run for every combination of durations, sample
+rates and number of channels, and report frames per second and peak
+memory, and compression the ratio of its file size. The cost of
+band-limiting sawtooth, square and triangle waves is reported as a factor
+of their naive rendering, and the cost of previews rendered at a low
+sample rate and upsampled as a factor of full rate rendering. Results can
+be saved as JSON and compared against a previous run:
+
+  python wave_benchmark.py --output after.json --compare before.json
+
+The cold start of soundwave.py writing a WAV file, from a new interpreter,
+is reported along with whether it imported matplotlib. Its limit is checked
+by soundwave_test.py.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import wave_codecs
+import wave_creator
+import wave_format
+import wave_generator
+import wave_mixer
+import wave_noise
+import wave_plotter
+import wave_resampler
+import wave_settings
+import wave_writer
+from typing import Any, Callable, List, Mapping, Optional, Sequence, Text, Tuple
+
+
+_PER_FRAME_OVERHEAD_FRAMES = 200000
+
+_BAND_LIMITING_DURATION = 10  # In seconds.
+# Best of this many runs is kept, as a single run is too noisy to compare.
+_BAND_LIMITING_REPEATS = 3
+
+_PREVIEW_DURATION = 1  # In seconds.
+_PREVIEW_SAMPLE_RATE = 8000
+
+# Best of this many runs is kept, as the first one may load files from disk.
+_COLD_START_REPEATS = 3
+
+_DEFAULT_DURATIONS = (1, 10)
+_DEFAULT_SAMPLE_RATES = (22050, 44100)
+_DEFAULT_CHANNEL_COUNTS = (1, 4)
+
+# Formula used to benchmark custom waves, as in the soundwave.py example.
+_CUSTOM_WAVE_FORMULA = '({x} + {min_sample}) / {max_sample}'
+
+# A benchmark result: stage, parameters and measurements.
+BenchmarkResult = Mapping[Text, Any]
+
+
+def _get_nanoseconds_per_call(
+        function: Callable[[int], object], number_calls: int) -> float:
+  """Gets the average time that a function takes per call.
+
+  Args:
+    function: Function to time. Takes the call number.
+    number_calls: Number of calls to average.
+
+  Returns:
+    Nanoseconds per call.
+  """
+  start_time = time.perf_counter()
+  for call_number in range(number_calls):
+    function(call_number)
+  elapsed_time = time.perf_counter() - start_time
+  return elapsed_time * 1e9 / number_calls
+
+
+def _measure(function: Callable[[], Any]) -> Tuple[Any, float, int]:
+  """Runs a function, measuring its time and peak memory.
+
+  Args:
+    function: Function to run.
+
+  Returns:
+    Result of the function, seconds it took and peak bytes it allocated.
+  """
+  tracemalloc.start()
+  try:
+    start_time = time.perf_counter()
+    result = function()
+    elapsed_time = time.perf_counter() - start_time
+    _, peak_memory = tracemalloc.get_traced_memory()
+  finally:
+    tracemalloc.stop()
+  return result, elapsed_time, peak_memory
+
+
+def _get_result(
+        stage: Text, number_frames: int, elapsed_time: float,
+        peak_memory: int, **parameters: Any) -> BenchmarkResult:
+  """Builds a benchmark result.
+
+  Args:
+    stage: Name of the benchmarked stage.
+    number_frames: Frames processed by the stage.
+    elapsed_time: Seconds the stage took.
+    peak_memory: Peak bytes allocated by the stage.
+    **parameters: Parameters of the benchmark.
+
+  Returns:
+    Benchmark result.
+  """
+  result = {'stage': stage}
+  result.update(parameters)
+  result.update({
+      'frames': number_frames,
+      'seconds': elapsed_time,
+      'frames_per_second': number_frames / elapsed_time if elapsed_time else 0,
+      'peak_memory_bytes': peak_memory,
+  })
+  return result
+
+
+def benchmark_per_frame_overhead(
+        number_frames: int = _PER_FRAME_OVERHEAD_FRAMES
+) -> Mapping[Text, float]:
+  """Measures the per-frame cost of resolving wave options.
+
+  Compares looking up the options dictionaries on every frame, as sin waves
+  and sample normalization did, with reading the resolved wave spec.
+
+  Args:
+    number_frames: Number of frames to time.
+
+  Returns:
+    Nanoseconds per frame, by measurement.
+  """
+  generator = wave_generator.WaveSoundGenerator()
+  wave_options = generator._get_merged_wave_options(None)
+  wave_spec = generator.get_wave_spec()
+
+  def resolve_from_options(sample_frame: int) -> float:
+    """Resolves per-frame sin wave values from the options dictionaries."""
+    samples_per_cycle = generator._get_samples_per_cycle(wave_options)
+    generator._get_wave_transformer(wave_options)
+    return (sample_frame % samples_per_cycle) / samples_per_cycle
+
+  def resolve_from_spec(sample_frame: int) -> float:
+    """Resolves per-frame sin wave values from the wave spec."""
+    samples_per_cycle = wave_spec.samples_per_cycle
+    wave_spec.wave_transformer
+    return (sample_frame % samples_per_cycle) / samples_per_cycle
+
+  sin_sound_wave = generator.get_wave_function(
+      wave_generator.SoundWaveType.SIN_WAVE)
+
+  return {
+      'resolve_from_options': _get_nanoseconds_per_call(
+          resolve_from_options, number_frames),
+      'resolve_from_spec': _get_nanoseconds_per_call(
+          resolve_from_spec, number_frames),
+      'sin_wave_function': _get_nanoseconds_per_call(
+          sin_sound_wave, number_frames),
+  }
+
+
+def benchmark_band_limiting(
+        duration: int = _BAND_LIMITING_DURATION,
+        sample_rate: int = 44100) -> Mapping[Text, Mapping[Text, float]]:
+  """Measures the cost of band-limiting sawtooth, square and triangle waves.
+
+  Args:
+    duration: Duration of the rendered sound, in seconds.
+    sample_rate: Number of frames per second.
+
+  Returns:
+    Seconds of naive and band-limited rendering, and their ratio, by wave
+    type.
+  """
+  generator = wave_generator.WaveSoundGenerator({
+      wave_generator.SoundWaveOption.SAMPLE_RATE: sample_rate,
+  })
+  band_limiting_costs = {}
+  for wave_type in wave_generator.SoundWaveType:
+    if wave_type not in wave_generator.PHASE_WAVE_TYPES:
+      continue
+    seconds = {}
+    for band_limited in (False, True):
+      wave_options = {
+          wave_generator.SoundWaveOption.BAND_LIMITED: band_limited}
+      seconds[band_limited] = min(
+          _measure(lambda: generator.get_wave_sound_samples(
+              duration, wave_type, wave_options))[1]
+          for _ in range(_BAND_LIMITING_REPEATS))
+    band_limiting_costs[wave_type.name] = {
+        'naive_seconds': seconds[False],
+        'band_limited_seconds': seconds[True],
+        'ratio': seconds[True] / seconds[False],
+    }
+  return band_limiting_costs
+
+
+def benchmark_previews(
+        duration: int = _PREVIEW_DURATION,
+        sample_rate: int = 44100) -> Mapping[Text, Mapping[Text, float]]:
+  """Measures the cost of previews rendered at a low sample rate.
+
+  Previews pay off when rendering costs more per frame than resampling,
+  e.g. per frame.
+
+  Args:
+    duration: Duration of the rendered sound, in seconds.
+    sample_rate: Number of frames per second of the full rate rendering.
+
+  Returns:
+    Seconds of full rate and preview rendering, and their ratio, by render
+    mode.
+  """
+  generator = wave_generator.WaveSoundGenerator({
+      wave_generator.SoundWaveOption.SAMPLE_RATE: sample_rate,
+  })
+  wave_type = wave_generator.SoundWaveType.SAWTOOTH_WAVE
+  preview_costs = {}
+  for render_mode in wave_generator.RenderMode:
+    # Rendering per frame is too slow to repeat, and steady enough not to.
+    repeats = (
+        1 if render_mode == wave_generator.RenderMode.PER_FRAME else
+        _BAND_LIMITING_REPEATS)
+    wave_options = {
+        wave_generator.SoundWaveOption.BAND_LIMITED: True,
+        wave_generator.SoundWaveOption.RENDER_MODE: render_mode,
+    }
+    full_rate_seconds = min(
+        _measure(lambda: generator.get_wave_sound_samples(
+            duration, wave_type, wave_options))[1]
+        for _ in range(repeats))
+    preview_seconds = min(
+        _measure(lambda: wave_resampler.get_preview_samples(
+            generator, duration, wave_type, _PREVIEW_SAMPLE_RATE,
+            wave_options))[1]
+        for _ in range(repeats))
+    preview_costs[render_mode.value] = {
+        'full_rate_seconds': full_rate_seconds,
+        'preview_seconds': preview_seconds,
+        'ratio': preview_seconds / full_rate_seconds,
+    }
+  return preview_costs
+
+
+def _write_compressed(
+        file_name: Text, sample_values: np.ndarray, sample_rate: int,
+        compression_type: wave_codecs.CompressionType
+) -> wave_writer.WavWriter:
+  """Writes mono int16 samples into a compressed file, block by block.
+
+  Args:
+    file_name: File to write.
+    sample_values: Samples to write.
+    sample_rate: Number of frames per second.
+    compression_type: How to compress the samples.
+
+  Returns:
+    Written file.
+  """
+  with wave_writer.open_wav_writer(
+          file_name, 1, sample_rate, wave_format.SampleFormat.INT16,
+          compression_type) as sound_file:
+    for block_start in range(
+            0, len(sample_values), wave_settings.RENDER_BLOCK_SIZE):
+      sound_file.write_samples(sample_values[
+          block_start:block_start + wave_settings.RENDER_BLOCK_SIZE])
+  return sound_file
+
+
+def benchmark_cold_start(output_directory: Text) -> Mapping[Text, Any]:
+  """Measures the cold start of soundwave.py writing a WAV file.
+
+  Each run is a new interpreter, so it pays for every import, as short
+  jobs do.
+
+  Args:
+    output_directory: Directory to write the sound file to.
+
+  Returns:
+    Best seconds of a run and whether the run imported matplotlib.
+  """
+  command = [
+      os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                   'soundwave.py'),
+      'sin', '--duration', '0.1',
+      '--output', os.path.join(output_directory, 'cold_start.wav'),
+  ]
+  run_seconds = []
+  for _ in range(_COLD_START_REPEATS):
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable] + command, check=True)
+    run_seconds.append(time.perf_counter() - start_time)
+  import_times = subprocess.run(
+      [sys.executable, '-X', 'importtime'] + command, check=True,
+      capture_output=True, text=True).stderr
+  return {
+      'seconds': min(run_seconds),
+      'imports_matplotlib': 'matplotlib' in import_times,
+  }
+
+
+def _format_cold_start(cold_start: Mapping[Text, Any]) -> Text:
+  """Formats a cold start measurement as a line of text."""
+  return (
+      f'cold start: {cold_start["seconds"]:.3f}s'
+      f'{", imports matplotlib" if cold_start["imports_matplotlib"] else ""}')
+
+
+def benchmark_stages(
+        duration: int, sample_rate: int, number_channels: int,
+        render_modes: Sequence[wave_generator.RenderMode],
+        output_directory: Text) -> List[BenchmarkResult]:
+  """Benchmarks every stage of creating a sound file for some parameters.
+
+  Args:
+    duration: Duration of the sound, in seconds.
+    sample_rate: Number of frames per second.
+    number_channels: Number of channels to mix and write.
+    render_modes: Render modes to benchmark sample rendering with.
+    output_directory: Directory to write sound files and graphs to.
+
+  Returns:
+    Benchmark result of each stage.
+  """
+  parameters = {
+      'duration': duration,
+      'sample_rate': sample_rate,
+      'channels': number_channels,
+  }
+  number_frames = int(duration * sample_rate)
+  generator = wave_generator.WaveSoundGenerator({
+      wave_generator.SoundWaveOption.CUSTOM_WAVE_FORMULA: _CUSTOM_WAVE_FORMULA,
+      wave_generator.SoundWaveOption.SAMPLE_RATE: sample_rate,
+  })
+  results = []
+
+  for wave_type in wave_generator.SoundWaveType:
+    _, elapsed_time, peak_memory = _measure(
+        lambda: generator.get_wave_function(wave_type))
+    results.append(_get_result(
+        'get_wave_function', 0, elapsed_time, peak_memory,
+        wave_type=wave_type.name, **parameters))
+
+    for render_mode in render_modes:
+      render_options = {wave_generator.SoundWaveOption.RENDER_MODE: render_mode}
+      _, elapsed_time, peak_memory = _measure(
+          lambda: generator.get_wave_sound_samples(
+              duration, wave_type, render_options))
+      results.append(_get_result(
+          'get_wave_sound_samples', number_frames, elapsed_time, peak_memory,
+          wave_type=wave_type.name, render_mode=render_mode.name,
+          **parameters))
+
+  # Seeded, so every render mode computes the same samples.
+  for noise_color in wave_noise.NoiseColor:
+    for render_mode in render_modes:
+      noise_options = {
+          wave_generator.SoundWaveOption.NOISE_COLOR: noise_color,
+          wave_generator.SoundWaveOption.RENDER_MODE: render_mode,
+          wave_generator.SoundWaveOption.SEED: 0,
+      }
+      _, elapsed_time, peak_memory = _measure(
+          lambda: generator.get_wave_sound_samples(
+              duration, wave_generator.SoundWaveType.RANDOM_WAVE,
+              noise_options))
+      results.append(_get_result(
+          'noise', number_frames, elapsed_time, peak_memory,
+          noise_color=noise_color.name, render_mode=render_mode.name,
+          **parameters))
+
+  wave_types = list(wave_generator.SoundWaveType)
+  channels_data = [
+      generator.get_wave_sound_samples(
+          duration, wave_types[channel % len(wave_types)])
+      for channel in range(number_channels)]
+
+  mixed_samples, elapsed_time, peak_memory = _measure(
+      lambda: wave_mixer.mix_channels(channels_data))
+  results.append(_get_result(
+      'mixdown', number_frames, elapsed_time, peak_memory, **parameters))
+
+  for sample_format in wave_format.SampleFormat:
+    _, elapsed_time, peak_memory = _measure(
+        lambda: wave_format.encode_samples(mixed_samples, sample_format))
+    results.append(_get_result(
+        'encode_samples', number_frames, elapsed_time, peak_memory,
+        sample_format=sample_format.name, **parameters))
+
+  # Writing a single, already mixed, channel leaves only the file I/O.
+  sound_file_name = os.path.join(output_directory, 'benchmark.wav')
+  file_options = {wave_creator.SoundFileOption.FILE_NAME: sound_file_name}
+  _, elapsed_time, peak_memory = _measure(
+      lambda: wave_creator.create_sound_file(
+          duration, [mixed_samples], file_options))
+  results.append(_get_result(
+      'wav_write', number_frames, elapsed_time, peak_memory, **parameters))
+
+  for compression_type in wave_codecs.CompressionType:
+    compressed_file_name = os.path.join(
+        output_directory, f'benchmark_{compression_type.name.lower()}')
+    write_compressed = lambda: _write_compressed(
+        compressed_file_name, mixed_samples, sample_rate, compression_type)
+    _, _, peak_memory = _measure(write_compressed)
+    # Tracing allocations slows down the many small steps of the IMA ADPCM
+    # and FLAC encoders, so they are timed untraced.
+    start_time = time.perf_counter()
+    compressed_file = write_compressed()
+    elapsed_time = time.perf_counter() - start_time
+    result = _get_result(
+        'compress', number_frames, elapsed_time, peak_memory,
+        compression_type=compression_type.name, **parameters)
+    result['compression_ratio'] = (
+        2 * number_frames / compressed_file.data_size)
+    results.append(result)
+
+  _, elapsed_time, peak_memory = _measure(
+      lambda: wave_creator.create_sound_file(
+          duration, channels_data, file_options))
+  results.append(_get_result(
+      'create_sound_file', number_frames, elapsed_time, peak_memory,
+      **parameters))
+
+  _, elapsed_time, peak_memory = _measure(
+      lambda: wave_plotter.create_sound_wave_graph(
+          sound_file_name, wave_plotter.WaveGraphType.PER_FRAME))
+  results.append(_get_result(
+      'create_sound_wave_graph', number_frames, elapsed_time, peak_memory,
+      **parameters))
+  return results
+
+
+def run_benchmarks(
+        durations: Sequence[int] = _DEFAULT_DURATIONS,
+        sample_rates: Sequence[int] = _DEFAULT_SAMPLE_RATES,
+        channel_counts: Sequence[int] = _DEFAULT_CHANNEL_COUNTS,
+        render_modes: Sequence[wave_generator.RenderMode] = (
+            wave_generator.RenderMode.VECTORIZED,)
+) -> Mapping[Text, Any]:
+  """Runs all the benchmarks.
+
+  Args:
+    durations: Durations to benchmark, in seconds.
+    sample_rates: Sample rates to benchmark.
+    channel_counts: Number of channels to benchmark.
+    render_modes: Render modes to benchmark sample rendering with.
+
+  Returns:
+    Environment of the run and the benchmark results.
+  """
+  results = []
+  with tempfile.TemporaryDirectory() as output_directory:
+    cold_start = benchmark_cold_start(output_directory)
+    for duration in durations:
+      for sample_rate in sample_rates:
+        for number_channels in channel_counts:
+          results.extend(benchmark_stages(
+              duration, sample_rate, number_channels, render_modes,
+              output_directory))
+
+  return {
+      'environment': {
+          'python': platform.python_version(),
+          'numpy': np.__version__,
+          'platform': platform.platform(),
+          'time': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+      },
+      'per_frame_overhead_ns': benchmark_per_frame_overhead(),
+      'band_limiting_cost': benchmark_band_limiting(),
+      'preview_cost': benchmark_previews(),
+      'cold_start': cold_start,
+      'results': results,
+  }
+
+
+def _get_result_key(result: BenchmarkResult) -> Tuple[Any, ...]:
+  """Gets the stage and parameters that identify a result across runs."""
+  return tuple(
+      (name, value) for name, value in sorted(result.items())
+      if name not in ('frames', 'seconds', 'frames_per_second',
+                      'peak_memory_bytes', 'compression_ratio'))
+
+
+def compare_benchmarks(
+        baseline: Mapping[Text, Any],
+        current: Mapping[Text, Any]) -> List[Text]:
+  """Compares the results of two benchmark runs.
+
+  Args:
+    baseline: Results of the previous run.
+    current: Results of the new run.
+
+  Returns:
+    One line per result present in both runs, with the speedup.
+  """
+  baseline_results = {
+      _get_result_key(result): result for result in baseline['results']}
+  comparison = []
+  for result in current['results']:
+    baseline_result = baseline_results.get(_get_result_key(result))
+    if not baseline_result or not result['seconds']:
+      continue
+    speedup = baseline_result['seconds'] / result['seconds']
+    description = ' '.join(
+        f'{name}={value}' for name, value in _get_result_key(result))
+    comparison.append(f'{description}: {speedup:.2f}x')
+  return comparison
+
+
+def _format_result(result: BenchmarkResult) -> Text:
+  """Formats a benchmark result as a line of text."""
+  description = ' '.join(
+      f'{name}={value}' for name, value in _get_result_key(result))
+  formatted_result = (
+      f'{description}: {result["seconds"] * 1000:.1f} ms, '
+      f'{result["frames_per_second"]:.0f} frames/s, '
+      f'{result["peak_memory_bytes"] / 2 ** 20:.1f} MiB peak')
+  if 'compression_ratio' in result:
+    formatted_result += f', {result["compression_ratio"]:.2f}x smaller'
+  return formatted_result
+
+
+def main(argv: Optional[Sequence[Text]] = None):
+  """Runs the benchmarks from the command line.
+
+  Args:
+    argv: Command line arguments, without the program name.
+  """
+  parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+  parser.add_argument(
+      '--durations', type=int, nargs='+', default=_DEFAULT_DURATIONS,
+      help='Durations to benchmark, in seconds.')
+  parser.add_argument(
+      '--sample-rates', type=int, nargs='+', default=_DEFAULT_SAMPLE_RATES,
+      help='Sample rates to benchmark.')
+  parser.add_argument(
+      '--channels', type=int, nargs='+', default=_DEFAULT_CHANNEL_COUNTS,
+      help='Number of channels to benchmark.')
+  parser.add_argument(
+      '--render-modes', nargs='+', default=['vectorized'],
+      choices=[render_mode.value for render_mode in wave_generator.RenderMode],
+      help='Render modes to benchmark sample rendering with.')
+  parser.add_argument('--output', help='JSON file to save the results to.')
+  parser.add_argument(
+      '--compare', help='JSON file of a previous run to compare against.')
+  arguments = parser.parse_args(argv)
+
+  benchmarks = run_benchmarks(
+      arguments.durations, arguments.sample_rates, arguments.channels,
+      [wave_generator.RenderMode(render_mode)
+       for render_mode in arguments.render_modes])
+
+  for measurement, nanoseconds in benchmarks['per_frame_overhead_ns'].items():
+    print(f'{measurement}: {nanoseconds:.0f} ns/frame')
+  for wave_type, cost in benchmarks['band_limiting_cost'].items():
+    print(f'{wave_type} band-limited: {cost["ratio"]:.2f}x naive '
+          f'({cost["band_limited_seconds"]:.3f}s vs '
+          f'{cost["naive_seconds"]:.3f}s)')
+  for render_mode, cost in benchmarks['preview_cost'].items():
+    print(f'{render_mode} preview: {cost["ratio"]:.2f}x full rate '
+          f'({cost["preview_seconds"]:.3f}s vs '
+          f'{cost["full_rate_seconds"]:.3f}s)')
+  print(_format_cold_start(benchmarks['cold_start']))
+  for result in benchmarks['results']:
+    print(_format_result(result))
+
+  if arguments.output:
+    with open(arguments.output, 'w') as output_file:
+      json.dump(benchmarks, output_file, indent=2)
+
+  if arguments.compare:
+    with open(arguments.compare) as baseline_file:
+      baseline = json.load(baseline_file)
+    for line in compare_benchmarks(baseline, benchmarks):
+      print(line)
+
+
+if __name__ == '__main__':
+  main(sys.argv[1:])
@@ -0,0 +1,193 @@
+"""Caches for computed wave data."""
+
+import collections
+import numpy as np
+import os
+import tempfile
+import wave_settings
+from typing import Any, Callable, Hashable, Optional, Text
+
+
+def _get_unit_size(unused_value: Any) -> int:
+  """Gets the size of a value when entries are counted, not measured."""
+  return 1
+
+
+class LruCache(object):
+  """Cache that evicts the least recently used entries beyond a max size.
+
+  By default the size of the cache is its number of entries. A function can
+  measure the size of each value instead, e.g. in bytes.
+
+  Methods:
+    size: Total size of the cached values.
+    get: Gets a cached value.
+    put: Caches a value.
+    clear: Removes all cached values.
+  """
+
+  def __init__(
+          self, max_size: int,
+          get_value_size: Callable[[Any], int] = _get_unit_size):
+    """Instantiates a LruCache.
+
+    Args:
+      max_size: Max total size of the values to keep.
+      get_value_size: Gets the size of a value. Defaults to 1 per entry.
+
+    Raises:
+      ValueError: max_size must be positive.
+    """
+    if max_size < 1:
+      raise ValueError(f'Cache size must be positive, got {max_size}.')
+    self._max_size = max_size
+    self._get_value_size = get_value_size
+    self._size = 0
+    self._entries = collections.OrderedDict()
+
+  def __len__(self) -> int:
+    return len(self._entries)
+
+  def __contains__(self, key: Hashable) -> bool:
+    return key in self._entries
+
+  @property
+  def size(self) -> int:
+    """Total size of the cached values."""
+    return self._size
+
+  def get(self, key: Hashable, default: Optional[Any] = None) -> Any:
+    """Gets a cached value, marking it as the most recently used.
+
+    Args:
+      key: Key of the value.
+      default: Value to return if key is not cached.
+
+    Returns:
+      Cached value, or default if not cached.
+    """
+    if key not in self._entries:
+      return default
+    self._entries.move_to_end(key)
+    return self._entries[key][0]
+
+  def put(self, key: Hashable, value: Any):
+    """Caches a value, evicting the least recently used until it fits.
+
+    Values larger than the max size are not cached.
+
+    Args:
+      key: Key of the value.
+      value: Value to cache.
+    """
+    value_size = self._get_value_size(value)
+    if key in self._entries:
+      self._size -= self._entries.pop(key)[1]
+    if value_size > self._max_size:
+      return
+    self._entries[key] = (value, value_size)
+    self._size += value_size
+    while self._size > self._max_size:
+      _, (_, evicted_size) = self._entries.popitem(last=False)
+      self._size -= evicted_size
+
+  def clear(self):
+    """Removes all cached values."""
+    self._entries.clear()
+    self._size = 0
+
+
+def _get_array_size(samples: np.ndarray) -> int:
+  """Gets the size of an array of samples, in bytes."""
+  return samples.nbytes
+
+
+class RenderCache(object):
+  """Cache of rendered sound samples, in memory and optionally on disk.
+
+  Samples are int16 arrays stored by content key. In memory, the least
+  recently used are evicted beyond a byte budget. On disk, each is a raw
+  little-endian int16 file named after its key, shared across processes.
+
+  Methods:
+    get: Gets cached samples.
+    put: Caches samples.
+    clear: Removes all samples cached in memory.
+  """
+
+  def __init__(
+          self,
+          max_memory_bytes: int = wave_settings.RENDER_CACHE_MEMORY_BYTES,
+          directory: Optional[Text] = None):
+    """Instantiates a RenderCache.
+
+    Args:
+      max_memory_bytes: Max bytes of samples to keep in memory.
+      directory: Directory to also keep samples on disk. None to only keep
+        them in memory.
+    """
+    self._memory_cache = LruCache(max_memory_bytes, _get_array_size)
+    self._directory = directory
+    if directory:
+      os.makedirs(directory, exist_ok=True)
+
+  def _get_file_name(self, key: Text) -> Text:
+    """Gets the file where samples are cached on disk.
+
+    Args:
+      key: Content key of the samples.
+
+    Returns:
+      File name.
+    """
+    return os.path.join(self._directory, f'{key}.raw')
+
+  def get(self, key: Text) -> Optional[np.ndarray]:
+    """Gets cached samples, from memory or else from disk.
+
+    Args:
+      key: Content key of the samples.
+
+    Returns:
+      Read-only int16 samples, or None if not cached.
+    """
+    samples = self._memory_cache.get(key)
+    if samples is not None:
+      return samples
+    if not self._directory:
+      return None
+
+    file_name = self._get_file_name(key)
+    if not os.path.exists(file_name):
+      return None
+    samples = np.fromfile(file_name, dtype='<i2').astype(np.int16, copy=False)
+    samples.flags.writeable = False
+    self._memory_cache.put(key, samples)
+    return samples
+
+  def put(self, key: Text, samples: np.ndarray):
+    """Caches samples in memory and, if enabled, on disk.
+
+    Args:
+      key: Content key of the samples.
+      samples: Int16 samples.
+    """
+    samples = np.array(samples, dtype=np.int16)
+    samples.flags.writeable = False
+    self._memory_cache.put(key, samples)
+    if not self._directory:
+      return
+
+    file_name = self._get_file_name(key)
+    if os.path.exists(file_name):
+      return
+    # Written aside and renamed, so readers never see partial files.
+    file_descriptor, temporary_file_name = tempfile.mkstemp(
+        dir=self._directory, suffix='.tmp')
+    with os.fdopen(file_descriptor, 'wb') as temporary_file:
+      temporary_file.write(samples.astype('<i2').tobytes())
+    os.replace(temporary_file_name, file_name)
+
+  def clear(self):
+    """Removes all samples cached in memory. Files on disk are kept."""
+    self._memory_cache.clear()
@@ -0,0 +1,507 @@
+"""Compresses samples into μ-law, A-law, IMA ADPCM and FLAC, block by block.
+
+Every codec encodes 16-bit samples, the working precision, in NumPy:
+
+- μ-law and A-law (G.711) store each sample in 8 bits, on a logarithmic
+  scale. They encode sample by sample.
+- IMA ADPCM stores each sample in 4 bits, as the step from the previous
+  one. Samples are encoded in blocks with their own header, so all blocks
+  and channels of a write are encoded at once, one sample position at a
+  time.
+- FLAC is lossless. Each channel of a frame is predicted from the previous
+  samples by the best fixed polynomial, and the residuals are Rice coded.
+
+Writers buffer the samples of partial ADPCM blocks and FLAC frames until
+they are complete or the file is closed.
+"""
+
+import enum
+import numpy as np
+import struct
+from typing import List, Optional, Tuple
+
+
+class CompressionType(enum.Enum):
+  """Represents how the samples of a sound file are compressed."""
+  NONE = 'NONE'
+  # G.711 μ-law WAV, 8 bits per sample.
+  ULAW = 'ULAW'
+  # G.711 A-law WAV, 8 bits per sample.
+  ALAW = 'ALAW'
+  # IMA ADPCM WAV, 4 bits per sample.
+  IMA_ADPCM = 'IMA_ADPCM'
+  # Lossless FLAC file, not WAV.
+  FLAC = 'FLAC'
+
+
+# Upper bound of the 14-bit magnitude of each μ-law segment.
+_ULAW_SEGMENT_ENDS = np.array(
+    [0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF, 0x1FFF])
+# Largest 14-bit μ-law magnitude, before the bias.
+_ULAW_CLIP = 8159
+_ULAW_BIAS = 0x21
+
+# Upper bound of the 13-bit magnitude of each A-law segment.
+_ALAW_SEGMENT_ENDS = np.array(
+    [0x1F, 0x3F, 0x7F, 0xFF, 0x1FF, 0x3FF, 0x7FF, 0xFFF])
+
+# Change of the IMA ADPCM step index after each 3-bit magnitude.
+_IMA_INDEX_CHANGES = np.array([-1, -1, -1, -1, 2, 4, 6, 8])
+# IMA ADPCM step sizes, by step index.
+_IMA_STEPS = np.array([
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41,
+    45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190,
+    209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724,
+    796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272,
+    2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132,
+    7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500,
+    20350, 22385, 24623, 27086, 29794, 32767])
+# Bytes per channel of an IMA ADPCM block at 11025 Hz or below. Doubles with
+# every doubling of the sample rate, as other encoders do.
+_IMA_BLOCK_BYTES = 256
+# Bytes of the header of each channel of an IMA ADPCM block.
+_IMA_HEADER_BYTES = 4
+
+# Frames per FLAC frame.
+FLAC_BLOCK_SIZE = 4096
+# FLAC block size codes of fixed sizes. Other sizes are stored after the
+# frame header.
+_FLAC_BLOCK_SIZE_CODES = {
+    192: 1, 576: 2, 1152: 3, 2304: 4, 4608: 5,
+    256: 8, 512: 9, 1024: 10, 2048: 11, 4096: 12,
+    8192: 13, 16384: 14, 32768: 15,
+}
+# FLAC sample size codes, by bits per sample.
+_FLAC_SAMPLE_SIZE_CODES = {8: 1, 12: 2, 16: 4, 20: 5, 24: 6, 32: 7}
+_FLAC_MAX_FIXED_ORDER = 4
+_FLAC_MAX_PARTITION_ORDER = 8
+# Largest Rice parameter of 4-bit partition headers. 15 escapes to raw bits.
+_FLAC_MAX_RICE_PARAMETER = 14
+# Bits of the header of a subframe and of a Rice partition.
+_FLAC_SUBFRAME_HEADER_BITS = 8
+_FLAC_PARTITION_HEADER_BITS = 4
+# Subframe type codes, shifted past the wasted bits flag.
+_FLAC_SUBFRAME_CONSTANT = 0x00
+_FLAC_SUBFRAME_VERBATIM = 0x02
+_FLAC_SUBFRAME_FIXED = 0x10
+# Size of the STREAMINFO metadata block.
+_FLAC_STREAMINFO_SIZE = 34
+
+
+def _get_crc_table(polynomial: int, bits: int) -> List[int]:
+  """Gets the byte table of an MSB-first CRC.
+
+  Args:
+    polynomial: Generator polynomial, without its top bit.
+    bits: Width of the CRC.
+
+  Returns:
+    CRC of each byte value.
+  """
+  top_bit = 1 << (bits - 1)
+  mask = (1 << bits) - 1
+  crc_table = []
+  for byte in range(256):
+    crc = byte << (bits - 8)
+    for _ in range(8):
+      crc = ((crc << 1) ^ polynomial if crc & top_bit else crc << 1) & mask
+    crc_table.append(crc)
+  return crc_table
+
+
+_CRC8_TABLE = _get_crc_table(0x07, 8)
+_CRC16_TABLE = _get_crc_table(0x8005, 16)
+
+
+def _get_crc8(data: bytes) -> int:
+  """Gets the CRC-8 of FLAC frame headers."""
+  crc = 0
+  for byte in data:
+    crc = _CRC8_TABLE[crc ^ byte]
+  return crc
+
+
+def _get_crc16(data: bytes) -> int:
+  """Gets the CRC-16 of FLAC frames."""
+  crc = 0
+  for byte in data:
+    crc = ((crc << 8) & 0xFFFF) ^ _CRC16_TABLE[(crc >> 8) ^ byte]
+  return crc
+
+
+def encode_ulaw(sample_values: np.ndarray) -> bytes:
+  """Compresses 16-bit samples into G.711 μ-law.
+
+  Args:
+    sample_values: Int16 samples.
+
+  Returns:
+    One byte per sample.
+  """
+  magnitudes = np.asarray(sample_values, dtype=np.int32) >> 2
+  masks = np.where(magnitudes < 0, 0x7F, 0xFF)
+  magnitudes = np.minimum(np.abs(magnitudes), _ULAW_CLIP) + _ULAW_BIAS
+  segments = np.searchsorted(_ULAW_SEGMENT_ENDS, magnitudes)
+  ulaw_values = np.where(
+      segments < 8,
+      (np.minimum(segments, 7) << 4) | ((magnitudes >> (segments + 1)) & 0x0F),
+      0x7F)
+  return (ulaw_values ^ masks).astype(np.uint8).tobytes()
+
+
+def encode_alaw(sample_values: np.ndarray) -> bytes:
+  """Compresses 16-bit samples into G.711 A-law.
+
+  Args:
+    sample_values: Int16 samples.
+
+  Returns:
+    One byte per sample.
+  """
+  magnitudes = np.asarray(sample_values, dtype=np.int32) >> 3
+  masks = np.where(magnitudes < 0, 0x55, 0xD5)
+  magnitudes = np.where(magnitudes < 0, -magnitudes - 1, magnitudes)
+  segments = np.searchsorted(_ALAW_SEGMENT_ENDS, magnitudes)
+  mantissas = (magnitudes >> np.maximum(segments, 1)) & 0x0F
+  alaw_values = np.where(
+      segments < 8, (np.minimum(segments, 7) << 4) | mantissas, 0x7F)
+  return (alaw_values ^ masks).astype(np.uint8).tobytes()
+
+
+def get_ima_adpcm_block_align(number_channels: int, sample_rate: int) -> int:
+  """Gets the bytes of an IMA ADPCM block.
+
+  Args:
+    number_channels: Number of channels.
+    sample_rate: Number of frames per second.
+
+  Returns:
+    Bytes of each block, with the headers of all channels.
+  """
+  return _IMA_BLOCK_BYTES * number_channels * max(1, sample_rate // 11025)
+
+
+def get_ima_adpcm_block_frames(block_align: int, number_channels: int) -> int:
+  """Gets the frames of an IMA ADPCM block.
+
+  Args:
+    block_align: Bytes of each block.
+    number_channels: Number of channels.
+
+  Returns:
+    Frames of each block: the frame of the headers, and two per byte of
+    each channel after them.
+  """
+  return (
+      (block_align - _IMA_HEADER_BYTES * number_channels) * 2 //
+      number_channels + 1)
+
+
+def encode_ima_adpcm(
+        frames_values: np.ndarray, block_frames: int) -> bytes:
+  """Compresses whole blocks of 16-bit frames into IMA ADPCM.
+
+  The header of each channel of a block holds its first sample and a step
+  index that fits its first steps, so blocks are independent of each other.
+
+  Args:
+    frames_values: Int16 samples, one row per frame and one column per
+      channel. Whole blocks of frames.
+    block_frames: Frames of each block.
+
+  Returns:
+    Blocks of the frames, each channel's nibbles in groups of 8 samples.
+  """
+  number_frames, number_channels = frames_values.shape
+  number_blocks = number_frames // block_frames
+  # One stream of samples per channel of each block.
+  streams_values = (
+      frames_values.reshape(number_blocks, block_frames, number_channels)
+      .transpose(0, 2, 1).reshape(-1, block_frames).astype(np.int32))
+
+  predictors = streams_values[:, 0].copy()
+  first_steps = np.abs(np.diff(streams_values[:, :9], axis=1)).mean(axis=1)
+  step_indexes = np.minimum(
+      np.searchsorted(_IMA_STEPS, first_steps), len(_IMA_STEPS) - 1)
+  headers = np.zeros((len(streams_values), _IMA_HEADER_BYTES), dtype=np.uint8)
+  headers[:, :2] = predictors.astype('<i2').view(np.uint8).reshape(-1, 2)
+  headers[:, 2] = step_indexes
+
+  # One row per frame, so each step reads contiguous samples.
+  frames_streams = np.ascontiguousarray(streams_values[:, 1:].T)
+  nibbles = np.empty_like(frames_streams)
+  for frame_streams, frame_nibbles in zip(frames_streams, nibbles):
+    steps = _IMA_STEPS[step_indexes]
+    differences = frame_streams - predictors
+    negative = differences < 0
+    np.abs(differences, out=differences)
+    # Magnitude bits of 1, 1/2 and 1/4 of the step, from the highest one.
+    step_bits = []
+    quantized_differences = steps >> 3
+    for bit_step in (steps, steps >> 1, steps >> 2):
+      in_step = differences >= bit_step
+      bit_difference = in_step * bit_step
+      differences -= bit_difference
+      quantized_differences += bit_difference
+      step_bits.append(in_step)
+    magnitudes = 4 * step_bits[0] + 2 * step_bits[1] + step_bits[2]
+    predictors += np.where(
+        negative, -quantized_differences, quantized_differences)
+    np.maximum(predictors, -32768, out=predictors)
+    np.minimum(predictors, 32767, out=predictors)
+    step_indexes += _IMA_INDEX_CHANGES[magnitudes]
+    np.maximum(step_indexes, 0, out=step_indexes)
+    np.minimum(step_indexes, len(_IMA_STEPS) - 1, out=step_indexes)
+    np.bitwise_or(magnitudes, 8 * negative, out=frame_nibbles)
+  nibbles = nibbles.T
+
+  # Two nibbles per byte, the first one in the low bits, in groups of 4
+  # bytes per channel.
+  stream_bytes = (nibbles[:, 0::2] | (nibbles[:, 1::2] << 4)).astype(np.uint8)
+  block_bytes = (
+      stream_bytes.reshape(number_blocks, number_channels, -1, 4)
+      .transpose(0, 2, 1, 3).reshape(number_blocks, -1))
+  return np.concatenate([
+      headers.reshape(number_blocks, -1), block_bytes], axis=1).tobytes()
+
+
+def _pack_bits(values: np.ndarray, widths: np.ndarray) -> bytes:
+  """Packs fields into a bit stream, most significant bit first.
+
+  Args:
+    values: Uint64 value of each field, below 2^63.
+    widths: Bits of each field. Fields of 0 bits are skipped.
+
+  Returns:
+    Bytes of the fields, with the last byte padded with zeros.
+  """
+  total_bits = int(widths.sum())
+  field_ends = np.cumsum(widths)
+  # Position of each bit from the end of its field.
+  bit_shifts = (
+      np.repeat(field_ends, widths) - 1 - np.arange(total_bits)).clip(0, 63)
+  bits = (np.repeat(values, widths) >> bit_shifts.astype(np.uint64)) & 1
+  return np.packbits(bits.astype(np.uint8)).tobytes()
+
+
+def _get_rice_costs(
+        folded_residuals: np.ndarray, order: int, block_size: int
+) -> Tuple[int, int, np.ndarray]:
+  """Finds the partition order and Rice parameters that code best.
+
+  Args:
+    folded_residuals: Non-negative residuals of a subframe.
+    order: Order of the predictor, the samples without residuals.
+    block_size: Frames of the subframe.
+
+  Returns:
+    Bits of the residuals, partition order and Rice parameter of each
+    partition.
+  """
+  # Bits of the quotients of every residual, for every Rice parameter.
+  cumulative_quotients = np.zeros(
+      (_FLAC_MAX_RICE_PARAMETER + 1, len(folded_residuals) + 1),
+      dtype=np.int64)
+  for rice_parameter in range(_FLAC_MAX_RICE_PARAMETER + 1):
+    np.cumsum(
+        (folded_residuals >> np.uint64(rice_parameter)).astype(np.int64),
+        out=cumulative_quotients[rice_parameter, 1:])
+  rice_parameters = np.arange(_FLAC_MAX_RICE_PARAMETER + 1)[:, np.newaxis]
+
+  best_residual = None
+  for partition_order in range(_FLAC_MAX_PARTITION_ORDER + 1):
+    partition_size = block_size >> partition_order
+    if (block_size % (1 << partition_order) or partition_size <= order):
+      break
+    partition_ends = (
+        np.arange(1, (1 << partition_order) + 1) * partition_size - order)
+    partition_starts = np.concatenate([[0], partition_ends[:-1]])
+    partition_costs = (
+        cumulative_quotients[:, partition_ends] -
+        cumulative_quotients[:, partition_starts] +
+        (partition_ends - partition_starts) * (rice_parameters + 1))
+    partition_parameters = np.argmin(partition_costs, axis=0)
+    residual_bits = int(
+        partition_costs.min(axis=0).sum() +
+        _FLAC_PARTITION_HEADER_BITS * len(partition_ends))
+    if best_residual is None or residual_bits < best_residual[0]:
+      best_residual = (residual_bits, partition_order, partition_parameters)
+  return best_residual
+
+
+def _get_subframe_fields(
+        channel_values: np.ndarray,
+        sample_bits: int) -> Tuple[np.ndarray, np.ndarray]:
+  """Encodes the samples of a channel into a FLAC subframe.
+
+  Args:
+    channel_values: Int64 samples of the channel in the frame.
+    sample_bits: Bits per sample.
+
+  Returns:
+    Value and bits of each field of the subframe.
+  """
+  sample_mask = np.int64((1 << sample_bits) - 1)
+  block_size = len(channel_values)
+  if np.all(channel_values == channel_values[0]):
+    return (
+        np.array([_FLAC_SUBFRAME_CONSTANT, channel_values[0] & sample_mask],
+                 dtype=np.uint64),
+        np.array([_FLAC_SUBFRAME_HEADER_BITS, sample_bits]))
+
+  # Fixed predictor of the order with the smallest residuals.
+  best_order = None
+  for order in range(min(_FLAC_MAX_FIXED_ORDER, block_size - 1) + 1):
+    residuals = np.diff(channel_values, order)
+    residual_sum = int(np.abs(residuals).sum())
+    if best_order is None or residual_sum < best_order[0]:
+      best_order = (residual_sum, order, residuals)
+  _, order, residuals = best_order
+  folded_residuals = ((residuals << 1) ^ (residuals >> 63)).astype(np.uint64)
+  residual_bits, partition_order, partition_parameters = _get_rice_costs(
+      folded_residuals, order, block_size)
+
+  verbatim_bits = block_size * sample_bits
+  fixed_bits = order * sample_bits + 6 + residual_bits
+  if fixed_bits >= verbatim_bits:
+    return (
+        np.concatenate([
+            np.array([_FLAC_SUBFRAME_VERBATIM], dtype=np.uint64),
+            (channel_values & sample_mask).astype(np.uint64)]),
+        np.concatenate([
+            [_FLAC_SUBFRAME_HEADER_BITS],
+            np.full(block_size, sample_bits)]))
+
+  partition_size = block_size >> partition_order
+  residual_parameters = np.repeat(partition_parameters, partition_size)[
+      order:].astype(np.uint64)
+  quotients = (folded_residuals >> residual_parameters).astype(np.int64)
+  # Each residual is its quotient in unary, 0s ended by a 1, then its low
+  # bits. Each partition starts with its Rice parameter.
+  residual_values = np.empty(2 * len(residuals), dtype=np.uint64)
+  residual_values[0::2] = 1
+  residual_values[1::2] = folded_residuals & (
+      (np.uint64(1) << residual_parameters) - np.uint64(1))
+  residual_widths = np.empty(2 * len(residuals), dtype=np.int64)
+  residual_widths[0::2] = quotients + 1
+  residual_widths[1::2] = residual_parameters
+  partition_starts = 2 * np.maximum(
+      np.arange(len(partition_parameters)) * partition_size - order, 0)
+  residual_values = np.insert(
+      residual_values, partition_starts,
+      partition_parameters.astype(np.uint64))
+  residual_widths = np.insert(
+      residual_widths, partition_starts, _FLAC_PARTITION_HEADER_BITS)
+
+  return (
+      np.concatenate([
+          np.array([_FLAC_SUBFRAME_FIXED | order << 1], dtype=np.uint64),
+          (channel_values[:order] & sample_mask).astype(np.uint64),
+          # Rice coding with 4-bit parameters, and the partition order.
+          np.array([0, partition_order], dtype=np.uint64),
+          residual_values]),
+      np.concatenate([
+          [_FLAC_SUBFRAME_HEADER_BITS],
+          np.full(order, sample_bits),
+          [2, 4],
+          residual_widths]))
+
+
+def _encode_frame_number(frame_number: int) -> bytes:
+  """Encodes a FLAC frame number as UTF-8 encodes code points.
+
+  Args:
+    frame_number: Number of the frame, below 2^31.
+
+  Returns:
+    1 to 6 bytes.
+  """
+  if frame_number < 0x80:
+    return bytes([frame_number])
+  number_bytes = 2
+  while frame_number >= 1 << (5 * number_bytes + 1):
+    number_bytes += 1
+  encoded_bytes = [
+      0x80 | (frame_number >> (6 * byte_number)) & 0x3F
+      for byte_number in range(number_bytes - 1)]
+  encoded_bytes.append(
+      (0xFF << (8 - number_bytes)) & 0xFF |
+      frame_number >> (6 * (number_bytes - 1)))
+  return bytes(reversed(encoded_bytes))
+
+
+def encode_flac_frame(
+        frames_values: np.ndarray, frame_number: int,
+        sample_bits: int = 16) -> bytes:
+  """Compresses frames into a FLAC frame, each channel on its own.
+
+  Args:
+    frames_values: Samples, one row per frame and one column per channel.
+      At most 65536 frames of up to 8 channels.
+    frame_number: Number of the frame in the stream.
+    sample_bits: Bits per sample.
+
+  Returns:
+    FLAC frame, with its header and CRCs.
+  """
+  block_size, number_channels = frames_values.shape
+  block_size_code = _FLAC_BLOCK_SIZE_CODES.get(block_size)
+  block_size_bytes = b''
+  if block_size_code is None:
+    if block_size <= 256:
+      block_size_code = 6
+      block_size_bytes = struct.pack('>B', block_size - 1)
+    else:
+      block_size_code = 7
+      block_size_bytes = struct.pack('>H', block_size - 1)
+  # Sync code, then the block size and the sample rate from STREAMINFO.
+  header = b''.join([
+      struct.pack(
+          '>HBB', 0xFFF8, block_size_code << 4,
+          (number_channels - 1) << 4 |
+          _FLAC_SAMPLE_SIZE_CODES.get(sample_bits, 0) << 1),
+      _encode_frame_number(frame_number),
+      block_size_bytes,
+  ])
+  header += bytes([_get_crc8(header)])
+
+  channels_fields = [
+      _get_subframe_fields(channel_values, sample_bits)
+      for channel_values in frames_values.astype(np.int64).T]
+  frame = header + _pack_bits(
+      np.concatenate([values for values, _ in channels_fields]),
+      np.concatenate([widths for _, widths in channels_fields]))
+  return frame + struct.pack('>H', _get_crc16(frame))
+
+
+def get_flac_header(
+        number_channels: int, sample_rate: int, sample_bits: int,
+        number_frames: int = 0, min_frame_size: int = 0,
+        max_frame_size: int = 0, samples_md5: Optional[bytes] = None) -> bytes:
+  """Gets the signature and STREAMINFO block of a FLAC file.
+
+  Args:
+    number_channels: Number of channels.
+    sample_rate: Number of frames per second.
+    sample_bits: Bits per sample.
+    number_frames: Number of frames of the file, 0 if unknown.
+    min_frame_size: Bytes of the smallest FLAC frame, 0 if unknown.
+    max_frame_size: Bytes of the largest FLAC frame, 0 if unknown.
+    samples_md5: MD5 of the interleaved little-endian samples, None if
+      unknown.
+
+  Returns:
+    Header, of the same length for any number of frames.
+  """
+  return b''.join([
+      b'fLaC',
+      # Last metadata block, of type STREAMINFO.
+      struct.pack('>I', 0x80 << 24 | _FLAC_STREAMINFO_SIZE),
+      struct.pack('>HH', FLAC_BLOCK_SIZE, FLAC_BLOCK_SIZE),
+      min_frame_size.to_bytes(3, 'big'),
+      max_frame_size.to_bytes(3, 'big'),
+      struct.pack(
+          '>Q', sample_rate << 44 | (number_channels - 1) << 41 |
+          (sample_bits - 1) << 36 | number_frames),
+      samples_md5 or bytes(16),
+  ])
@@ -0,0 +1,418 @@
+"""Tests that compressed samples decode back into the samples written."""
+
+import hashlib
+import numpy as np
+import os
+import struct
+import tempfile
+import unittest
+import wave_codecs
+import wave_writer
+import warnings
+from typing import List, Tuple
+
+with warnings.catch_warnings():
+  warnings.simplefilter('ignore', DeprecationWarning)
+  try:
+    import audioop  # Removed in Python 3.13.
+  except ImportError:
+    audioop = None
+
+
+# Frames per second of the compressed files.
+_SAMPLE_RATE = 44100
+# Every int16 sample value.
+_ALL_INT16_VALUES = np.arange(-32768, 32768, dtype=np.int16)
+# Largest difference allowed between IMA ADPCM samples and the original ones.
+_MAX_ADPCM_ERROR = 600
+
+# IMA ADPCM step sizes and step index changes, from the IMA specification.
+_IMA_STEPS = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41,
+    45, 50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190,
+    209, 230, 253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724,
+    796, 876, 963, 1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272,
+    2499, 2749, 3024, 3327, 3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132,
+    7845, 8630, 9493, 10442, 11487, 12635, 13899, 15289, 16818, 18500,
+    20350, 22385, 24623, 27086, 29794, 32767]
+_IMA_INDEX_CHANGES = [-1, -1, -1, -1, 2, 4, 6, 8]
+
+# Frame sizes of fixed FLAC block size codes.
+_FLAC_BLOCK_SIZES = {
+    1: 192, 2: 576, 3: 1152, 4: 2304, 5: 4608,
+    8: 256, 9: 512, 10: 1024, 11: 2048, 12: 4096,
+    13: 8192, 14: 16384, 15: 32768,
+}
+# Coefficients of the fixed FLAC predictors, by order, from the last sample.
+_FLAC_FIXED_COEFFICIENTS = {
+    0: [], 1: [1], 2: [2, -1], 3: [3, -3, 1], 4: [4, -6, 4, -1]}
+
+
+def _decode_ulaw(ulaw_value: int) -> int:
+  """Decodes a G.711 μ-law byte into a 16-bit sample."""
+  ulaw_value = ~ulaw_value & 0xFF
+  magnitude = (((ulaw_value & 0x0F) << 3) + 0x84) << (
+      (ulaw_value & 0x70) >> 4)
+  return 0x84 - magnitude if ulaw_value & 0x80 else magnitude - 0x84
+
+
+def _decode_alaw(alaw_value: int) -> int:
+  """Decodes a G.711 A-law byte into a 16-bit sample."""
+  alaw_value ^= 0x55
+  segment = (alaw_value & 0x70) >> 4
+  magnitude = (alaw_value & 0x0F) << 4
+  if segment == 0:
+    magnitude += 8
+  else:
+    magnitude = (magnitude + 0x108) << (segment - 1)
+  return magnitude if alaw_value & 0x80 else -magnitude
+
+
+def _get_crc(data: bytes, polynomial: int, bits: int) -> int:
+  """Gets an MSB-first CRC, bit by bit."""
+  crc = 0
+  top_bit = 1 << (bits - 1)
+  for byte in data:
+    crc ^= byte << (bits - 8)
+    for _ in range(8):
+      crc = ((crc << 1) ^ polynomial if crc & top_bit else crc << 1) & (
+          (1 << bits) - 1)
+  return crc
+
+
+class _BitReader(object):
+  """Reads fields of a bit stream, most significant bit first."""
+
+  def __init__(self, data: bytes, byte_position: int = 0):
+    self._bits = ''.join(f'{byte:08b}' for byte in data)
+    self.position = 8 * byte_position
+
+  def read(self, width: int) -> int:
+    """Reads an unsigned field."""
+    if not width:
+      return 0
+    value = int(self._bits[self.position:self.position + width], 2)
+    self.position += width
+    return value
+
+  def read_signed(self, width: int) -> int:
+    """Reads a two's complement field."""
+    value = self.read(width)
+    return value - (1 << width) if value >> (width - 1) else value
+
+  def read_unary(self) -> int:
+    """Reads the number of 0 bits before the next 1 bit."""
+    end = self._bits.index('1', self.position)
+    zeros = end - self.position
+    self.position = end + 1
+    return zeros
+
+  def align(self):
+    """Skips to the next byte."""
+    self.position += -self.position % 8
+
+
+def _decode_flac_subframe(
+        bit_reader: _BitReader, block_size: int,
+        sample_bits: int) -> List[int]:
+  """Decodes a FLAC subframe of a constant, verbatim or fixed type."""
+  subframe_header = bit_reader.read(8)
+  subframe_type = subframe_header >> 1 & 0x3F
+  if subframe_type == 0:
+    return [bit_reader.read_signed(sample_bits)] * block_size
+  if subframe_type == 1:
+    return [bit_reader.read_signed(sample_bits) for _ in range(block_size)]
+  if not 8 <= subframe_type <= 12:
+    raise ValueError(f'Unexpected subframe type: {subframe_type}')
+
+  order = subframe_type - 8
+  sample_values = [bit_reader.read_signed(sample_bits) for _ in range(order)]
+  if bit_reader.read(2) != 0:
+    raise ValueError('Unexpected residual coding method.')
+  partition_order = bit_reader.read(4)
+  partition_size = block_size >> partition_order
+  residuals = []
+  for partition in range(1 << partition_order):
+    rice_parameter = bit_reader.read(4)
+    number_residuals = partition_size - (order if partition == 0 else 0)
+    for _ in range(number_residuals):
+      folded_residual = (bit_reader.read_unary() << rice_parameter) | (
+          bit_reader.read(rice_parameter))
+      residuals.append(
+          folded_residual >> 1 if folded_residual % 2 == 0
+          else -(folded_residual >> 1) - 1)
+  coefficients = _FLAC_FIXED_COEFFICIENTS[order]
+  for residual in residuals:
+    sample_values.append(residual + sum(
+        coefficient * sample_values[-1 - position]
+        for position, coefficient in enumerate(coefficients)))
+  return sample_values
+
+
+def _decode_flac_file(
+        flac_data: bytes) -> Tuple[Tuple[int, ...], np.ndarray, List[int]]:
+  """Decodes a FLAC file, checking the CRCs of its frames.
+
+  Returns:
+    STREAMINFO fields, samples with one row per frame, and size of each
+    FLAC frame.
+  """
+  if flac_data[:4] != b'fLaC':
+    raise ValueError('Not a FLAC file.')
+  block_header, = struct.unpack('>I', flac_data[4:8])
+  streaminfo_size = block_header & 0xFFFFFF
+  streaminfo = flac_data[8:8 + streaminfo_size]
+  (min_block_size, max_block_size, min_frame_size,
+   max_frame_size) = struct.unpack('>HH3s3s', streaminfo[:10])
+  stream_fields, = struct.unpack('>Q', streaminfo[10:18])
+  streaminfo_fields = (
+      min_block_size, max_block_size,
+      int.from_bytes(min_frame_size, 'big'),
+      int.from_bytes(max_frame_size, 'big'),
+      stream_fields >> 44,
+      (stream_fields >> 41 & 0x7) + 1,
+      (stream_fields >> 36 & 0x1F) + 1,
+      stream_fields & 0xFFFFFFFFF,
+      streaminfo[18:34])
+
+  frames_values = []
+  frame_sizes = []
+  frame_start = 8 + streaminfo_size
+  bit_reader = _BitReader(flac_data, frame_start)
+  while frame_start < len(flac_data):
+    if bit_reader.read(16) != 0xFFF8:
+      raise ValueError('Missing frame sync code.')
+    block_size_code = bit_reader.read(4)
+    bit_reader.read(4)  # Sample rate of STREAMINFO.
+    number_channels = bit_reader.read(4) + 1
+    sample_bits = {4: 16}[bit_reader.read(3)]
+    bit_reader.read(1)
+    # Frame number, as UTF-8 encodes code points: the leading 1 bits of the
+    # first byte are the number of bytes.
+    number_bytes = f'{bit_reader.read(8):08b}'.index('0')
+    bit_reader.read(8 * max(number_bytes - 1, 0))
+    if block_size_code == 6:
+      block_size = bit_reader.read(8) + 1
+    elif block_size_code == 7:
+      block_size = bit_reader.read(16) + 1
+    else:
+      block_size = _FLAC_BLOCK_SIZES[block_size_code]
+    header_end = bit_reader.position // 8
+    if bit_reader.read(8) != _get_crc(
+            flac_data[frame_start:header_end], 0x07, 8):
+      raise ValueError('Wrong frame header CRC-8.')
+
+    channels_values = [
+        _decode_flac_subframe(bit_reader, block_size, sample_bits)
+        for _ in range(number_channels)]
+    bit_reader.align()
+    frame_end = bit_reader.position // 8
+    if bit_reader.read(16) != _get_crc(
+            flac_data[frame_start:frame_end], 0x8005, 16):
+      raise ValueError('Wrong frame CRC-16.')
+    frames_values.append(np.array(channels_values).T)
+    frame_sizes.append(frame_end + 2 - frame_start)
+    frame_start = frame_end + 2
+  return streaminfo_fields, np.concatenate(frames_values), frame_sizes
+
+
+def _decode_ima_adpcm(
+        adpcm_data: bytes, block_align: int,
+        number_channels: int) -> np.ndarray:
+  """Decodes IMA ADPCM blocks into samples, one row per frame."""
+  frames_values = []
+  for block_start in range(0, len(adpcm_data), block_align):
+    block = adpcm_data[block_start:block_start + block_align]
+    predictors = []
+    step_indexes = []
+    for channel in range(number_channels):
+      predictor, step_index, _ = struct.unpack(
+          '<hBB', block[4 * channel:4 * channel + 4])
+      predictors.append(predictor)
+      step_indexes.append(step_index)
+    channels_values = [[predictor] for predictor in predictors]
+    nibble_bytes = block[4 * number_channels:]
+    # Groups of 4 bytes of each channel, in turn.
+    for group_start in range(0, len(nibble_bytes), 4):
+      channel = group_start // 4 % number_channels
+      for byte in nibble_bytes[group_start:group_start + 4]:
+        for nibble in (byte & 0x0F, byte >> 4):
+          step = _IMA_STEPS[step_indexes[channel]]
+          difference = step >> 3
+          if nibble & 4:
+            difference += step
+          if nibble & 2:
+            difference += step >> 1
+          if nibble & 1:
+            difference += step >> 2
+          predictor = predictors[channel] + (
+              -difference if nibble & 8 else difference)
+          predictors[channel] = max(-32768, min(32767, predictor))
+          step_indexes[channel] = max(0, min(
+              len(_IMA_STEPS) - 1,
+              step_indexes[channel] + _IMA_INDEX_CHANGES[nibble & 7]))
+          channels_values[channel].append(predictors[channel])
+    frames_values.append(np.array(channels_values).T)
+  return np.concatenate(frames_values)
+
+
+def _get_test_frames(number_frames: int) -> np.ndarray:
+  """Gets stereo int16 frames of a tone and of noise, with silent parts.
+
+  Args:
+    number_frames: Number of frames.
+
+  Returns:
+    Samples, one row per frame.
+  """
+  random_generator = np.random.default_rng(7)
+  times = np.arange(number_frames) / _SAMPLE_RATE
+  tone = 12000 * np.sin(2 * np.pi * 440 * times) + random_generator.normal(
+      0, 50, number_frames)
+  noise = random_generator.integers(-32768, 32768, number_frames)
+  frames_values = np.stack([tone, noise], axis=1).astype(np.int16)
+  frames_values[:5000, 1] = 0
+  return frames_values
+
+
+class G711Test(unittest.TestCase):
+  """Checks μ-law and A-law encoding of every int16 sample.
+
+  Methods:
+    test_ulaw_matches_audioop: μ-law bytes are those of audioop.
+    test_alaw_matches_audioop: A-law bytes are those of audioop.
+    test_ulaw_quantization: μ-law levels are ordered and close to samples.
+    test_alaw_quantization: A-law levels are ordered and close to samples.
+  """
+
+  def _assert_quantization(
+          self, encoded_values: bytes, decode_function, max_error_ratio):
+    """Asserts that encoded samples decode close to and in sample order."""
+    decoded_values = np.array(
+        [decode_function(encoded_value) for encoded_value in encoded_values])
+    self.assertTrue(np.all(np.diff(decoded_values) >= 0))
+    sample_values = _ALL_INT16_VALUES.astype(np.int64)
+    errors = np.abs(decoded_values - sample_values)
+    self.assertTrue(np.all(
+        errors <= np.abs(sample_values) * max_error_ratio + 16))
+
+  @unittest.skipIf(audioop is None, 'audioop is not available.')
+  def test_ulaw_matches_audioop(self):
+    self.assertEqual(
+        wave_codecs.encode_ulaw(_ALL_INT16_VALUES),
+        audioop.lin2ulaw(_ALL_INT16_VALUES.astype('<i2').tobytes(), 2))
+
+  @unittest.skipIf(audioop is None, 'audioop is not available.')
+  def test_alaw_matches_audioop(self):
+    self.assertEqual(
+        wave_codecs.encode_alaw(_ALL_INT16_VALUES),
+        audioop.lin2alaw(_ALL_INT16_VALUES.astype('<i2').tobytes(), 2))
+
+  def test_ulaw_quantization(self):
+    self._assert_quantization(
+        wave_codecs.encode_ulaw(_ALL_INT16_VALUES), _decode_ulaw, 1 / 16)
+
+  def test_alaw_quantization(self):
+    self._assert_quantization(
+        wave_codecs.encode_alaw(_ALL_INT16_VALUES), _decode_alaw, 1 / 16)
+
+
+class ImaAdpcmTest(unittest.TestCase):
+  """Checks IMA ADPCM files by decoding them.
+
+  Methods:
+    test_block_sizes: Files hold whole blocks of the declared size.
+    test_decoded_error: Decoded samples are close to the original ones.
+  """
+
+  def setUp(self):
+    self._frames_values = _get_test_frames(30000)
+    self._frames_values[:, 1] = self._frames_values[::-1, 0]
+
+  def _write_adpcm(self, number_channels: int) -> Tuple[bytes, int]:
+    """Writes the test frames of some channels into an IMA ADPCM file.
+
+    Returns:
+      Data chunk of the file, and bytes per block.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+      file_name = os.path.join(directory, 'sound.wav')
+      with wave_writer.open_wav_writer(
+              file_name, number_channels, _SAMPLE_RATE,
+              compression_type=wave_codecs.CompressionType.IMA_ADPCM) as (
+                  sound_writer):
+        frames_values = self._frames_values[:, :number_channels]
+        # Writes of uneven sizes, so blocks span writes.
+        for block_start in range(0, len(frames_values), 7777):
+          sound_writer.write_samples(
+              frames_values[block_start:block_start + 7777].reshape(-1))
+      with open(file_name, 'rb') as sound_file:
+        sound_data = sound_file.read()
+    data_start = sound_data.index(b'data') + 8
+    data_size, = struct.unpack('<I', sound_data[data_start - 4:data_start])
+    block_align, = struct.unpack('<H', sound_data[32:34])
+    return sound_data[data_start:data_start + data_size], block_align
+
+  def test_block_sizes(self):
+    for number_channels in (1, 2):
+      adpcm_data, block_align = self._write_adpcm(number_channels)
+      self.assertEqual(
+          block_align, wave_codecs.get_ima_adpcm_block_align(
+              number_channels, _SAMPLE_RATE))
+      block_frames = wave_codecs.get_ima_adpcm_block_frames(
+          block_align, number_channels)
+      self.assertEqual(len(adpcm_data) % block_align, 0)
+      self.assertEqual(
+          len(adpcm_data) // block_align,
+          -(-len(self._frames_values) // block_frames))
+
+  def test_decoded_error(self):
+    for number_channels in (1, 2):
+      adpcm_data, block_align = self._write_adpcm(number_channels)
+      decoded_values = _decode_ima_adpcm(
+          adpcm_data, block_align, number_channels)
+      frames_values = self._frames_values[:, :number_channels]
+      errors = np.abs(
+          decoded_values[:len(frames_values)] -
+          frames_values.astype(np.int64))
+      self.assertLessEqual(errors.max(), _MAX_ADPCM_ERROR)
+
+
+class FlacTest(unittest.TestCase):
+  """Checks FLAC files by decoding them.
+
+  Methods:
+    test_round_trip: Decoded samples are the samples written.
+    test_streaminfo: STREAMINFO holds the frames, frame sizes and MD5.
+  """
+
+  def setUp(self):
+    self._frames_values = _get_test_frames(
+        3 * wave_codecs.FLAC_BLOCK_SIZE + 1000)
+    with tempfile.TemporaryDirectory() as directory:
+      file_name = os.path.join(directory, 'sound.flac')
+      with wave_writer.open_wav_writer(
+              file_name, 2, _SAMPLE_RATE,
+              compression_type=wave_codecs.CompressionType.FLAC) as (
+                  sound_writer):
+        for block_start in range(0, len(self._frames_values), 5000):
+          sound_writer.write_samples(self._frames_values[
+              block_start:block_start + 5000].reshape(-1))
+      with open(file_name, 'rb') as sound_file:
+        self._flac_data = sound_file.read()
+
+  def test_round_trip(self):
+    _, decoded_values, _ = _decode_flac_file(self._flac_data)
+    np.testing.assert_array_equal(decoded_values, self._frames_values)
+
+  def test_streaminfo(self):
+    streaminfo_fields, _, frame_sizes = _decode_flac_file(self._flac_data)
+    self.assertEqual(streaminfo_fields, (
+        wave_codecs.FLAC_BLOCK_SIZE, wave_codecs.FLAC_BLOCK_SIZE,
+        min(frame_sizes), max(frame_sizes), _SAMPLE_RATE, 2, 16,
+        len(self._frames_values),
+        hashlib.md5(self._frames_values.astype('<i2').tobytes()).digest()))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -2,28 +2,59 @@
 
 import array
 import enum
-import wave
+import numpy as np
+import wave_codecs
+import wave_format
+import wave_instrumentation
+import wave_mixer
+import wave_resampler
 import wave_settings
-from typing import Any, Iterable, Mapping, Text, Union
+import wave_writer
+from typing import (
+    Any, Iterable, Iterator, List, Mapping, Optional, Sequence)
 
 
 class SoundFileOption(enum.Enum):
   """Sound wave file configurations."""
+  # Name of a wave_codecs.CompressionType: 'NONE', 'ULAW', 'ALAW' or
+  # 'IMA_ADPCM' WAV, or 'FLAC'. Compressed files store 16-bit samples.
   COMPRESSION_TYPE = 'compression_type'
+  # Description of the compression, not stored in the file.
   COMPRESSION_NAME = 'compression_name'
+  # Gain of each channel when mixing. Defaults to 1 for every channel.
+  CHANNEL_GAINS = 'channel_gains'
+  # Sample rate of each channel. Channels at another rate than the file are
+  # resampled to it before mixing. Defaults to the rate of the file for every
+  # channel.
+  CHANNEL_SAMPLE_RATES = 'channel_sample_rates'
   FILE_NAME = 'file_name'
+  # How channels are mixed into the file. Must be a wave_mixer.MixMode.
+  MIX_MODE = 'mix_mode'
+  # How samples are stored in the file. Must be a wave_format.SampleFormat.
+  # Samples are mixed and clipped to the int16 working range, and converted
+  # once, when written. Wider formats add no resolution, see SampleFormat.
+  SAMPLE_FORMAT = 'sample_format'
+  # Number of frames per second of the file. Defaults to the highest channel
+  # sample rate, or without channel sample rates, to the number of samples
+  # per second of duration.
+  SAMPLE_RATE = 'sample_rate'
 
 
 _DEFAULT_FILE_OPTIONS = {
     SoundFileOption.COMPRESSION_TYPE: 'NONE',
     SoundFileOption.COMPRESSION_NAME: 'Uncompressed',
+    SoundFileOption.CHANNEL_GAINS: None,
+    SoundFileOption.CHANNEL_SAMPLE_RATES: None,
     SoundFileOption.FILE_NAME: 'sound.wav',
+    SoundFileOption.MIX_MODE: wave_mixer.MixMode.AVERAGE,
+    SoundFileOption.SAMPLE_FORMAT: wave_format.SampleFormat.INT16,
+    SoundFileOption.SAMPLE_RATE: None,
 }
 
 SoundFileOptions = Mapping[SoundFileOption, Any]
 
 
-def _get_file_option_value(
+def get_file_option_value(
         file_options: SoundFileOptions, option: SoundFileOption) -> Any:
   """Gets the value for a given file option, or its default value if not set.
 
@@ -43,19 +74,125 @@ def _get_file_option_value(
   return file_options.get(option, default_value)
 
 
+def get_sound_file_sample_rate(
+        file_options: SoundFileOptions,
+        channel_sample_rates: Sequence[int]) -> int:
+  """Gets the sample rate of a sound file with channels at some sample rates.
+
+  Args:
+    file_options: File configuration.
+    channel_sample_rates: Sample rate of each channel.
+
+  Returns:
+    SAMPLE_RATE option if set, else the highest channel sample rate.
+  """
+  sample_rate = get_file_option_value(
+      file_options or {}, SoundFileOption.SAMPLE_RATE)
+  if sample_rate is None:
+    return max(channel_sample_rates)
+  return sample_rate
+
+
+def _get_channel_sample_rates(
+        file_options: SoundFileOptions, number_channels: int,
+        sample_rate: int) -> Sequence[int]:
+  """Gets the sample rate of each channel.
+
+  Args:
+    file_options: File configuration.
+    number_channels: Number of channels.
+    sample_rate: Sample rate of the file, the default for every channel.
+
+  Raises:
+    ValueError: Must provide one sample rate per channel.
+
+  Returns:
+    Sample rate of each channel.
+  """
+  channel_sample_rates = get_file_option_value(
+      file_options, SoundFileOption.CHANNEL_SAMPLE_RATES)
+  if channel_sample_rates is None:
+    return [sample_rate] * number_channels
+  if len(channel_sample_rates) != number_channels:
+    raise ValueError(
+        f'Expected {number_channels} channel sample rates, '
+        f'got {len(channel_sample_rates)}.')
+  return channel_sample_rates
+
+
+def _pad_to_longest(
+        channels_samples: Sequence[wave_mixer.ChannelSamples]
+) -> List[np.ndarray]:
+  """Pads channels with silence to the length of the longest one.
+
+  Channels resampled from different rates can end a frame apart.
+
+  Args:
+    channels_samples: Int16 samples of each channel.
+
+  Returns:
+    Int16 samples of each channel, all of the same length.
+  """
+  channels_samples = [
+      np.asarray(channel_samples, dtype=np.int16)
+      for channel_samples in channels_samples]
+  number_samples = max(
+      len(channel_samples) for channel_samples in channels_samples)
+  return [
+      np.pad(channel_samples, (0, number_samples - len(channel_samples)))
+      for channel_samples in channels_samples]
+
+
+def _open_wav_writer(
+        file_options: SoundFileOptions, number_channels: int,
+        sample_rate: int) -> wave_writer.WavWriter:
+  """Opens the WAV or FLAC file of the file options.
+
+  Args:
+    file_options: File configuration.
+    number_channels: Number of channels of the file.
+    sample_rate: Number of frames per second.
+
+  Raises:
+    ValueError: Compression is not supported, or not with the sample format
+      or number of channels.
+
+  Returns:
+    Sound file writer.
+  """
+  compression_type = get_file_option_value(
+      file_options, SoundFileOption.COMPRESSION_TYPE)
+  try:
+    compression_type = wave_codecs.CompressionType(compression_type)
+  except ValueError:
+    raise ValueError(
+        f'Unsupported compression type: {compression_type}') from None
+  file_name = get_file_option_value(file_options, SoundFileOption.FILE_NAME)
+  sample_format = get_file_option_value(
+      file_options, SoundFileOption.SAMPLE_FORMAT)
+  return wave_writer.open_wav_writer(
+      file_name, number_channels, sample_rate, sample_format,
+      compression_type)
+
+
 def create_sound_file(
         duration: int,
         channels_data: Iterable[array.array],
-        file_options: SoundFileOptions) -> wave.Wave_write:
+        file_options: SoundFileOptions) -> wave_writer.WavWriter:
   """Creates a sound file based on the provided sound samples.
 
+  Channels with CHANNEL_SAMPLE_RATES other than the rate of the file are
+  resampled to it before mixing. Samples are converted to the sample format
+  of the file as they are written.
+
   Args:
     duration: Duration of the file in seconds.
     channels_data: Sound samples to write to each channel.
     file_options: File configuration.
 
   Raises:
-    ValueError: channels_data must be an iterable of size >1.
+    ValueError: channels_data must be an iterable of size >1, and channels
+      without sample rates must have the same number of samples.
 
   Returns:
     Sound file.
@@ -65,31 +202,263 @@ def create_sound_file(
 
   file_options = file_options or {}
 
-  file_name = _get_file_option_value(file_options, SoundFileOption.FILE_NAME)
-  sound_file = wave.open(file_name, 'w')
-
   number_channels = len(channels_data)
-  sample_width = wave_settings.BYTES_OF_DATA
-  first_sample = channels_data[0]
-  number_samples = len(first_sample)
-  sample_rate = int(number_samples / duration)
-  compression_type = _get_file_option_value(
-      file_options, SoundFileOption.COMPRESSION_TYPE)
-  compression_name = _get_file_option_value(
-      file_options, SoundFileOption.COMPRESSION_NAME)
-
-  sound_params = (number_channels, sample_width, sample_rate,
-                  number_samples, compression_type, compression_name)
-  sound_file.setparams(sound_params)
-
-  mixed_sound_sample = array.array('h')
-  for keyframe in range(0, number_samples):
-    sample_total = 0
-    for channel in range(0, number_channels):
-      sample_total += channels_data[channel][keyframe]
-    mixed_sound_frame = int(sample_total / number_channels)
-    mixed_sound_sample.append(mixed_sound_frame)
-
-  sound_file.writeframes(mixed_sound_sample.tobytes())
-  sound_file.close()
+  if get_file_option_value(
+          file_options, SoundFileOption.CHANNEL_SAMPLE_RATES) is None:
+    if len({len(channel_data) for channel_data in channels_data}) != 1:
+      raise ValueError(
+          'All channels must have the same number of samples. Set '
+          'CHANNEL_SAMPLE_RATES for channels at different sample rates.')
+    sample_rate = get_file_option_value(
+        file_options, SoundFileOption.SAMPLE_RATE)
+    if sample_rate is None:
+      sample_rate = round(len(channels_data[0]) / duration)
+  else:
+    channel_sample_rates = _get_channel_sample_rates(
+        file_options, number_channels, None)
+    sample_rate = get_sound_file_sample_rate(
+        file_options, channel_sample_rates)
+    channels_data = _pad_to_longest([
+        wave_resampler.resample(channel_data, channel_sample_rate, sample_rate)
+        for channel_data, channel_sample_rate in zip(
+            channels_data, channel_sample_rates)])
+  number_samples = len(channels_data[0])
+  mix_mode = get_file_option_value(file_options, SoundFileOption.MIX_MODE)
+  channel_gains = get_file_option_value(
+      file_options, SoundFileOption.CHANNEL_GAINS)
+
+  number_output_channels = wave_mixer.get_number_output_channels(
+      mix_mode, number_channels)
+  sound_file = _open_wav_writer(
+      file_options, number_output_channels, sample_rate)
+
+  with wave_instrumentation.measure(
+          wave_instrumentation.Stage.MIXDOWN) as counters:
+    mixed_sound_sample = wave_mixer.mix_channels(
+        channels_data, mix_mode, channel_gains)
+    counters[wave_instrumentation.Counter.FRAMES] += number_samples
+
+  with wave_instrumentation.measure(
+          wave_instrumentation.Stage.WRITE) as counters:
+    counters[wave_instrumentation.Counter.BYTES_WRITTEN] += (
+        sound_file.write_samples(mixed_sound_sample))
+    sound_file.close()
   return sound_file
+
+
+class _ChannelBlockReader(object):
+  """Reads fixed-size blocks out of chunks of any size.
+
+  Methods:
+    read: Reads up to a number of samples.
+  """
+
+  def __init__(self, channel_chunks: Iterable[wave_mixer.ChannelSamples]):
+    """Instantiates a _ChannelBlockReader.
+
+    Args:
+      channel_chunks: Chunks of int16 samples of a channel.
+    """
+    self._channel_chunks = iter(channel_chunks)
+    self._pending_chunks = []
+    self._pending_samples = 0
+
+  def read(self, number_samples: int) -> np.ndarray:
+    """Reads up to a number of samples.
+
+    Args:
+      number_samples: Number of samples to read.
+
+    Returns:
+      Int16 samples. Fewer than requested only when the channel is exhausted.
+    """
+    while self._pending_samples < number_samples:
+      channel_chunk = next(self._channel_chunks, None)
+      if channel_chunk is None:
+        break
+      channel_chunk = np.asarray(channel_chunk, dtype=np.int16)
+      self._pending_chunks.append(channel_chunk)
+      self._pending_samples += len(channel_chunk)
+
+    pending_block = np.concatenate(
+        self._pending_chunks or [np.zeros(0, dtype=np.int16)])
+    block = pending_block[:number_samples]
+    remainder = pending_block[number_samples:]
+    self._pending_chunks = [remainder] if len(remainder) else []
+    self._pending_samples = len(remainder)
+    return block
+
+
+class SoundFileWriter(object):
+  """Writes a sound file block by block, with constant memory.
+
+  The file header is written with the first block and patched with the final
+  number of frames when the writer is closed.
+
+  Methods:
+    sound_file: Sound file being written.
+    write_block: Mixes and writes a block of samples of each channel.
+    close: Finishes the sound file.
+  """
+
+  def __init__(
+          self, sample_rate: int, number_channels: int,
+          file_options: SoundFileOptions):
+    """Instantiates a SoundFileWriter.
+
+    Args:
+      sample_rate: Number of frames per second.
+      number_channels: Number of channels to mix in each block.
+      file_options: File configuration.
+
+    Raises:
+      ValueError: number_channels must be at least 1.
+    """
+    if number_channels < 1:
+      raise ValueError('Must provide samples for at least one channel.')
+
+    file_options = file_options or {}
+
+    self._mix_mode = get_file_option_value(
+        file_options, SoundFileOption.MIX_MODE)
+    self._channel_gains = get_file_option_value(
+        file_options, SoundFileOption.CHANNEL_GAINS)
+
+    self._number_channels = number_channels
+    number_output_channels = wave_mixer.get_number_output_channels(
+        self._mix_mode, number_channels)
+    # Number of frames is unknown until closing, when the header is patched.
+    self._sound_file = _open_wav_writer(
+        file_options, number_output_channels, sample_rate)
+
+  @property
+  def sound_file(self) -> wave_writer.WavWriter:
+    """Sound file being written."""
+    return self._sound_file
+
+  def __enter__(self) -> 'SoundFileWriter':
+    return self
+
+  def __exit__(self, *unused_exception_info):
+    self.close()
+
+  def write_block(self, channels_block: Sequence[wave_mixer.ChannelSamples]):
+    """Mixes and writes a block of samples of each channel.
+
+    Args:
+      channels_block: Int16 samples of each channel. All of the same length.
+
+    Raises:
+      ValueError: Must provide one block of the same length per channel.
+    """
+    if len(channels_block) != self._number_channels:
+      raise ValueError(
+          f'Expected {self._number_channels} channels, '
+          f'got {len(channels_block)}.')
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.MIXDOWN) as counters:
+      mixed_sound_block = wave_mixer.mix_channels(
+          channels_block, self._mix_mode, self._channel_gains)
+      counters[wave_instrumentation.Counter.FRAMES] += len(channels_block[0])
+
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.WRITE) as counters:
+      counters[wave_instrumentation.Counter.BYTES_WRITTEN] += (
+          self._sound_file.write_samples(mixed_sound_block))
+
+  def close(self):
+    """Finishes the sound file, patching its header."""
+    with wave_instrumentation.measure(wave_instrumentation.Stage.WRITE):
+      self._sound_file.close()
+
+
+def read_channels_blocks(
+        sample_rate: int,
+        channels_chunks: Sequence[Iterable[wave_mixer.ChannelSamples]],
+        channel_sample_rates: Optional[Sequence[int]] = None,
+        block_size: int = wave_settings.RENDER_BLOCK_SIZE
+) -> Iterator[List[np.ndarray]]:
+  """Reads blocks of every channel out of chunks of any size.
+
+  Chunks are consumed, and resampled if needed, as blocks are read.
+
+  Args:
+    sample_rate: Sample rate of the blocks.
+    channels_chunks: Chunks of sound samples of each channel.
+    channel_sample_rates: Sample rate of the chunks of each channel.
+      Defaults to sample_rate for every channel.
+    block_size: Number of frames per block.
+
+  Raises:
+    ValueError: Must provide one sample rate per channel.
+
+  Yields:
+    Int16 block of each channel. Resampled channels that end a frame apart
+    are padded with silence.
+  """
+  if channel_sample_rates is None:
+    channel_sample_rates = [sample_rate] * len(channels_chunks)
+  if len(channel_sample_rates) != len(channels_chunks):
+    raise ValueError(
+        f'Expected {len(channels_chunks)} channel sample rates, '
+        f'got {len(channel_sample_rates)}.')
+  is_resampled = any(
+      channel_sample_rate != sample_rate
+      for channel_sample_rate in channel_sample_rates)
+  channel_readers = [
+      _ChannelBlockReader(wave_resampler.resample_chunks(
+          channel_chunks, channel_sample_rate, sample_rate))
+      for channel_chunks, channel_sample_rate in zip(
+          channels_chunks, channel_sample_rates)]
+
+  while True:
+    channels_block = []
+    for channel, channel_reader in enumerate(channel_readers):
+      # Chunks may be rendered as they are read, e.g. wave sound blocks.
+      with wave_instrumentation.channel(channel):
+        channels_block.append(channel_reader.read(block_size))
+    if not any(len(channel_block) for channel_block in channels_block):
+      return
+    if is_resampled:
+      channels_block = _pad_to_longest(channels_block)
+    yield channels_block
+
+
+def create_streamed_sound_file(
+        sample_rate: int,
+        channels_chunks: Sequence[Iterable[wave_mixer.ChannelSamples]],
+        file_options: SoundFileOptions,
+        block_size: int = wave_settings.RENDER_BLOCK_SIZE
+) -> wave_writer.WavWriter:
+  """Creates a sound file from chunks of sound samples, block by block.
+
+  Chunks can be of any size, e.g. as given by
+  WaveSoundGenerator.get_wave_sound_blocks. They are consumed as the file is
+  written, so memory depends on block_size and not on the duration. Channels
+  with CHANNEL_SAMPLE_RATES other than sample_rate are resampled as they are
+  read.
+
+  Args:
+    sample_rate: Number of frames per second of the file.
+    channels_chunks: Chunks of sound samples to write to each channel.
+    file_options: File configuration.
+    block_size: Number of frames to mix and write at once.
+
+  Raises:
+    ValueError: channels_chunks must be a sequence of size >1, and all
+      channels must have the same number of samples.
+
+  Returns:
+    Sound file.
+  """
+  if not channels_chunks:
+    raise ValueError('Must provide samples for at least one channel.')
+
+  channel_sample_rates = _get_channel_sample_rates(
+      file_options or {}, len(channels_chunks), sample_rate)
+  with SoundFileWriter(
+          sample_rate, len(channels_chunks), file_options) as sound_writer:
+    for channels_block in read_channels_blocks(
+            sample_rate, channels_chunks, channel_sample_rates, block_size):
+      sound_writer.write_block(channels_block)
+  return sound_writer.sound_file
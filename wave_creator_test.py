@@ -0,0 +1,141 @@
+"""Tests that streamed sound files equal the files written at once."""
+
+import numpy as np
+import os
+import struct
+import tempfile
+import unittest
+import wave
+import wave_creator
+import wave_format
+import wave_mixer
+import wave_writer
+from typing import List, Tuple
+
+
+# Frames per second of the written files.
+_SAMPLE_RATE = 8000
+# Number of frames of each channel, not a multiple of the block size.
+_NUMBER_FRAMES = 10007
+# Number of frames mixed and written at once when streaming.
+_BLOCK_SIZE = 1000
+# Number of chunks of any size each streamed channel is split into.
+_NUMBER_CHUNKS = 13
+
+
+class StreamedSoundFileTest(unittest.TestCase):
+  """Compares streamed files with whole files and checks their headers.
+
+  Methods:
+    test_interleaved: Stereo files are equal and read back by wave.
+    test_average: Mixed mono files are equal and read back by wave.
+    test_odd_data_size: Files with a padded data chunk are equal.
+  """
+
+  def setUp(self):
+    self._directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self._directory.cleanup)
+    self._random_generator = np.random.default_rng(5)
+
+  def _get_channels_values(self, number_channels: int) -> List[np.ndarray]:
+    """Gets random int16 samples of each channel."""
+    return [
+        self._random_generator.integers(
+            -32768, 32768, _NUMBER_FRAMES).astype(np.int16)
+        for _ in range(number_channels)]
+
+  def _get_chunks(self, channel_values: np.ndarray) -> List[np.ndarray]:
+    """Splits the samples of a channel into chunks of random sizes."""
+    chunk_ends = np.sort(self._random_generator.integers(
+        0, len(channel_values), _NUMBER_CHUNKS - 1))
+    return np.split(channel_values, chunk_ends)
+
+  def _write_files(
+          self, number_channels: int,
+          file_options: wave_creator.SoundFileOptions
+  ) -> Tuple[wave_writer.WavWriter, wave_writer.WavWriter]:
+    """Writes the same channels at once and streamed.
+
+    Args:
+      number_channels: Number of channels to mix.
+      file_options: File configuration, without file name.
+
+    Returns:
+      Whole and streamed sound files.
+    """
+    channels_values = self._get_channels_values(number_channels)
+    whole_file = wave_creator.create_sound_file(
+        _NUMBER_FRAMES / _SAMPLE_RATE, channels_values, {
+            **file_options,
+            wave_creator.SoundFileOption.FILE_NAME: os.path.join(
+                self._directory.name, 'whole.wav'),
+            wave_creator.SoundFileOption.SAMPLE_RATE: _SAMPLE_RATE,
+        })
+    streamed_file = wave_creator.create_streamed_sound_file(
+        _SAMPLE_RATE,
+        [self._get_chunks(channel_values)
+         for channel_values in channels_values], {
+            **file_options,
+            wave_creator.SoundFileOption.FILE_NAME: os.path.join(
+                self._directory.name, 'streamed.wav'),
+        },
+        block_size=_BLOCK_SIZE)
+    return whole_file, streamed_file
+
+  def _assert_equal_files(
+          self, number_channels: int,
+          file_options: wave_creator.SoundFileOptions):
+    """Asserts that whole and streamed files are equal and well formed.
+
+    Args:
+      number_channels: Number of channels to mix.
+      file_options: File configuration, without file name.
+    """
+    whole_file, streamed_file = self._write_files(
+        number_channels, file_options)
+    with open(whole_file.file_name, 'rb') as whole_data:
+      with open(streamed_file.file_name, 'rb') as streamed_data:
+        self.assertEqual(whole_data.read(), streamed_data.read())
+
+    with open(streamed_file.file_name, 'rb') as sound_data:
+      file_data = sound_data.read()
+    riff_size, = struct.unpack_from('<I', file_data, 4)
+    self.assertEqual(riff_size, len(file_data) - 8)
+    data_position = file_data.index(b'data')
+    data_size, = struct.unpack_from('<I', file_data, data_position + 4)
+    self.assertEqual(data_size, streamed_file.data_size)
+    self.assertEqual(
+        data_size, streamed_file.number_frames *
+        streamed_file.number_channels *
+        wave_format.get_sample_width(streamed_file.sample_format))
+    self.assertEqual(streamed_file.number_frames, _NUMBER_FRAMES)
+
+    with wave.open(streamed_file.file_name, 'rb') as wave_file:
+      self.assertEqual(
+          wave_file.getnchannels(), streamed_file.number_channels)
+      self.assertEqual(wave_file.getframerate(), _SAMPLE_RATE)
+      self.assertEqual(wave_file.getnframes(), _NUMBER_FRAMES)
+      self.assertEqual(
+          wave_file.readframes(_NUMBER_FRAMES),
+          file_data[data_position + 8:data_position + 8 + data_size])
+
+  def test_interleaved(self):
+    self._assert_equal_files(2, {
+        wave_creator.SoundFileOption.MIX_MODE: wave_mixer.MixMode.INTERLEAVED,
+    })
+
+  def test_average(self):
+    self._assert_equal_files(3, {
+        wave_creator.SoundFileOption.MIX_MODE: wave_mixer.MixMode.AVERAGE,
+        wave_creator.SoundFileOption.CHANNEL_GAINS: [0.5, 1, 2],
+    })
+
+  def test_odd_data_size(self):
+    self._assert_equal_files(1, {
+        wave_creator.SoundFileOption.SAMPLE_FORMAT:
+            wave_format.SampleFormat.INT8,
+    })
+
+
+if __name__ == '__main__':
+  unittest.main()
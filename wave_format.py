@@ -0,0 +1,139 @@
+"""Sample formats of sound files, and conversion of samples into them.
+
+Waves are synthesized and mixed in a single working precision, the signed
+integers of wave_settings.BYTES_OF_DATA bytes. Samples are converted to the
+sample format of a file once, block by block, as they are written.
+"""
+
+import enum
+import numpy as np
+import wave_math
+import wave_reader
+import wave_settings
+from typing import Tuple
+
+
+class SampleFormat(enum.Enum):
+  """Represents how samples are stored in a sound file.
+
+  A sample format sets the container of the samples, not their resolution.
+  Waves are synthesized, mixed and clipped in WORKING_SAMPLE_FORMAT, int16,
+  and only then converted. INT24, INT32 and FLOAT32 add no resolution: their
+  samples are the int16 ones shifted or scaled up, with zeros in the low
+  bits, for tools that need those formats. INT8 drops the low 8 bits.
+  """
+  # 8-bit PCM. WAV files store it unsigned, offset by 128.
+  INT8 = 'int8'
+  INT16 = 'int16'
+  # Int16 samples in the top 16 bits of 24.
+  INT24 = 'int24'
+  # Int16 samples in the top 16 bits of 32.
+  INT32 = 'int32'
+  # 32-bit IEEE float, from -1 to 1. Int16 samples divided by 32768.
+  FLOAT32 = 'float32'
+
+
+# Bytes per sample of each sample format.
+_SAMPLE_WIDTHS = {
+    SampleFormat.INT8: 1,
+    SampleFormat.INT16: 2,
+    SampleFormat.INT24: 3,
+    SampleFormat.INT32: 4,
+    SampleFormat.FLOAT32: 4,
+}
+
+# Format that waves are synthesized and mixed in.
+WORKING_SAMPLE_FORMAT = {
+    1: SampleFormat.INT8,
+    2: SampleFormat.INT16,
+    3: SampleFormat.INT24,
+    4: SampleFormat.INT32,
+}[wave_settings.BYTES_OF_DATA]
+
+
+def get_sample_width(sample_format: SampleFormat) -> int:
+  """Gets the bytes per sample of a sample format.
+
+  Args:
+    sample_format: Sample format.
+
+  Raises:
+    ValueError: Unknown SampleFormat.
+
+  Returns:
+    Bytes per sample.
+  """
+  if sample_format not in _SAMPLE_WIDTHS:
+    raise ValueError(f'Unknown sample format: {sample_format}')
+  return _SAMPLE_WIDTHS[sample_format]
+
+
+def get_format_tag(sample_format: SampleFormat) -> int:
+  """Gets the WAV format tag of a sample format.
+
+  Args:
+    sample_format: Sample format.
+
+  Returns:
+    Format tag of the fmt chunk.
+  """
+  if sample_format == SampleFormat.FLOAT32:
+    return wave_reader.WAVE_FORMAT_IEEE_FLOAT
+  return wave_reader.WAVE_FORMAT_PCM
+
+
+def get_sample_range(
+        sample_format: SampleFormat) -> Tuple[wave_math.Number,
+                                              wave_math.Number]:
+  """Gets the min and max values that samples of a format can take.
+
+  Args:
+    sample_format: Sample format.
+
+  Returns:
+    Min and max sample values, as signed values for integer formats.
+  """
+  if sample_format == SampleFormat.FLOAT32:
+    return -1.0, 1.0
+  sample_width = get_sample_width(sample_format)
+  return (
+      wave_math.get_min_value_from_bytes(sample_width, True),
+      wave_math.get_max_value_from_bytes(sample_width, True) - 1)
+
+
+def encode_samples(
+        sample_values: np.ndarray, sample_format: SampleFormat) -> bytes:
+  """Converts working precision samples into the bytes of a sample format.
+
+  Integer formats keep the samples in their top bits, so a full scale
+  sample stays full scale in any format. 24-bit samples are packed as the
+  three low bytes of little-endian int32 values.
+
+  Args:
+    sample_values: Samples in the working precision, e.g. interleaved
+      frames of a mixed block.
+    sample_format: Sample format to convert the samples into.
+
+  Returns:
+    Little-endian samples, as stored in WAV files.
+  """
+  sample_values = np.asarray(sample_values)
+  if sample_format == SampleFormat.FLOAT32:
+    working_min_value, _ = get_sample_range(WORKING_SAMPLE_FORMAT)
+    return (sample_values / -working_min_value).astype('<f4').tobytes()
+
+  sample_width = get_sample_width(sample_format)
+  bit_shift = 8 * (
+      sample_width - get_sample_width(WORKING_SAMPLE_FORMAT))
+  if bit_shift >= 0:
+    sample_values = sample_values.astype(np.int64) << bit_shift
+  else:
+    # Drops the lowest bits, rounding towards negative infinity.
+    sample_values = sample_values.astype(np.int64) >> -bit_shift
+
+  if sample_format == SampleFormat.INT8:
+    return (sample_values + 128).astype(np.uint8).tobytes()
+  if sample_format == SampleFormat.INT24:
+    sample_bytes = sample_values.astype('<i4').view(np.uint8)
+    return sample_bytes.reshape(-1, 4)[:, :3].tobytes()
+  return sample_values.astype(f'<i{sample_width}').tobytes()
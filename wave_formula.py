@@ -0,0 +1,472 @@
+"""Compiles custom wave formulas into safe, reusable expressions."""
+
+import ast
+import functools
+import math
+import operator
+import types
+import numpy as np
+import wave_math
+from typing import Any, Callable, Mapping, Text
+
+
+# Variable of the formula that takes the sample frame.
+FRAME_VARIABLE = 'x'
+
+# Binary operators allowed in formulas.
+_ALLOWED_BINARY_OPERATORS = (
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+
+# Unary operators allowed in formulas.
+_ALLOWED_UNARY_OPERATORS = (ast.UAdd, ast.USub)
+
+# Largest magnitude of the integers computed in int64 blocks. Float
+# estimates of results are a few bits off, so beyond it they may overflow.
+_MAX_BLOCK_INTEGER = 2 ** 62
+# Largest magnitude of the integers that convert into floats exactly.
+_MAX_FLOAT_INTEGER = 2 ** 53
+
+
+# The ** operator of Python numbers, element by element on arrays.
+_PYTHON_POWER = np.frompyfunc(operator.pow, 2, 1)
+
+
+class _InexactBlockError(ArithmeticError):
+  """Block arithmetic cannot give the values that Python arithmetic gives."""
+
+
+def _is_block(value: Any) -> bool:
+  """Checks whether a value is a NumPy array or scalar."""
+  return isinstance(value, (np.ndarray, np.generic))
+
+
+def _is_integer(value: Any) -> bool:
+  """Checks whether a value is a Python or NumPy integer, or an array of."""
+  if _is_block(value):
+    return value.dtype.kind in 'iu'
+  return isinstance(value, int)
+
+
+def _check_magnitude(value: Any, max_magnitude: int):
+  """Checks that values are below a magnitude.
+
+  Args:
+    value: Values to check.
+    max_magnitude: Magnitude the values must be below.
+
+  Raises:
+    _InexactBlockError: Some value is not below the magnitude.
+  """
+  with np.errstate(over='ignore', invalid='ignore'):
+    magnitudes = np.abs(np.asarray(value, dtype=np.float64))
+  if not np.all(magnitudes < max_magnitude):
+    raise _InexactBlockError(f'Values reach {max_magnitude}.')
+
+
+def _to_int_block(value: Any) -> np.ndarray:
+  """Truncates values towards zero into integers, as int() does.
+
+  Raises:
+    _InexactBlockError: Values are not finite or too large for int64.
+  """
+  if _is_integer(value):
+    return value
+  _check_magnitude(value, _MAX_BLOCK_INTEGER)
+  return np.trunc(value).astype(np.int64)
+
+
+def _get_integer_block_function(
+        block_function: Callable[[Any], Any]) -> Callable[[Any], Any]:
+  """Gets a rounding function that gives integers, as math's ones do.
+
+  Args:
+    block_function: NumPy function that rounds into floats.
+
+  Returns:
+    Function that rounds into int64 values.
+  """
+  def integer_block_function(value: Any) -> Any:
+    """Rounds values into integers."""
+    if _is_integer(value):
+      return value
+    return _to_int_block(block_function(value))
+  return integer_block_function
+
+
+def _round_block(value: Any, *ndigits: Any) -> Any:
+  """Rounds values half to even, as round() does.
+
+  Raises:
+    _InexactBlockError: Rounding to digits, which round() does on the
+      decimal value and NumPy does not.
+  """
+  if ndigits:
+    raise _InexactBlockError('Rounding to digits is done frame by frame.')
+  if _is_integer(value):
+    return value
+  return _to_int_block(np.rint(value))
+
+
+def _get_extreme_block_function(
+        block_function: Callable[[Any, Any], Any]) -> Callable[..., Any]:
+  """Gets the max() or min() of any number of values, element by element.
+
+  Args:
+    block_function: np.maximum or np.minimum.
+
+  Returns:
+    Function of two or more values, as max() and min() take.
+  """
+  def extreme_block_function(*values: Any) -> Any:
+    """Gets the extreme of the values at each frame."""
+    if len(values) < 2:
+      raise TypeError('Formulas must give max() and min() 2 or more values.')
+    return functools.reduce(block_function, values)
+  return extreme_block_function
+
+
+def _power_block(base: Any, exponent: Any) -> Any:
+  """Raises values to powers, as the ** operator does.
+
+  Integer powers are computed in int64. Float powers, including integers
+  raised to negative powers, are computed by Python, since NumPy's power
+  rounds the last bit of many of them otherwise than C's pow.
+
+  Raises:
+    _InexactBlockError: Integer powers may not fit in int64, or powers are
+      complex.
+  """
+  if (_is_integer(base) and _is_integer(exponent) and
+      np.all(np.asarray(exponent) >= 0)):
+    with np.errstate(over='ignore'):
+      _check_magnitude(
+          np.power(_to_float_block(base), exponent), _MAX_BLOCK_INTEGER)
+    return np.power(base, exponent)
+  powers = np.asarray(_PYTHON_POWER(base, exponent))
+  try:
+    return powers.astype(np.float64)
+  except TypeError as error:
+    raise _InexactBlockError('Powers are complex.') from error
+
+
+def _get_block_operator(
+        binary_operator: Callable[[Any, Any], Any],
+        operator_type: type) -> Callable[[Any, Any], Any]:
+  """Gets a binary operator on blocks that keeps Python integer semantics.
+
+  Python integers do not overflow, and raised to negative powers they give
+  floats. Integer blocks are computed in int64, so results that may not fit
+  in it, or that int64 would compute differently, raise instead.
+
+  Args:
+    binary_operator: Operator, e.g. operator.add.
+    operator_type: Type of the operator node, e.g. ast.Add.
+
+  Returns:
+    Operator on blocks or scalars.
+  """
+  def block_operator(left: Any, right: Any) -> Any:
+    """Applies the operator.
+
+    Raises:
+      _InexactBlockError: The result in int64 may differ from Python's.
+    """
+    if not (_is_block(left) or _is_block(right)):
+      return binary_operator(left, right)
+    if operator_type == ast.Pow:
+      return _power_block(left, right)
+    if not (_is_integer(left) and _is_integer(right)):
+      return binary_operator(left, right)
+
+    if operator_type == ast.Div:
+      _check_magnitude(left, _MAX_FLOAT_INTEGER)
+      _check_magnitude(right, _MAX_FLOAT_INTEGER)
+    elif operator_type in (ast.Add, ast.Sub, ast.Mult):
+      _check_magnitude(
+          binary_operator(_to_float_block(left), _to_float_block(right)),
+          _MAX_BLOCK_INTEGER)
+    return binary_operator(left, right)
+  return block_operator
+
+
+# Binary operator functions, by operator node type.
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow,
+}
+
+# Name of each binary operator in the namespace of blocks. Formulas cannot
+# use names that are not allowed, so they cannot call them directly.
+_BLOCK_OPERATOR_NAMES = {
+    operator_type: f'__{operator_type.__name__.lower()}'
+    for operator_type in _BINARY_OPERATORS}
+
+
+def _to_float_block(value: Any) -> np.ndarray:
+  """Converts values into floats, as float() does."""
+  return np.asarray(value, dtype=np.float64)
+
+
+# Functions and constants allowed in formulas, for single frames.
+_FRAME_FUNCTIONS = {
+    'abs': abs,
+    'acos': math.acos,
+    'asin': math.asin,
+    'atan': math.atan,
+    'atan2': math.atan2,
+    'ceil': math.ceil,
+    'cos': math.cos,
+    'cosh': math.cosh,
+    'e': math.e,
+    'exp': math.exp,
+    'fabs': math.fabs,
+    'float': float,
+    'floor': math.floor,
+    'hypot': math.hypot,
+    'int': int,
+    'log': math.log,
+    'log10': math.log10,
+    'log2': math.log2,
+    'max': max,
+    'min': min,
+    'pi': math.pi,
+    'pow': math.pow,
+    'round': round,
+    'sin': math.sin,
+    'sinh': math.sinh,
+    'sqrt': math.sqrt,
+    'tan': math.tan,
+    'tanh': math.tanh,
+    'tau': math.tau,
+    'trunc': math.trunc,
+}
+
+# Functions and constants allowed in formulas, for arrays of frames.
+_BLOCK_FUNCTIONS = {
+    'abs': np.abs,
+    'acos': np.arccos,
+    'asin': np.arcsin,
+    'atan': np.arctan,
+    'atan2': np.arctan2,
+    'ceil': _get_integer_block_function(np.ceil),
+    'cos': np.cos,
+    'cosh': np.cosh,
+    'e': math.e,
+    'exp': np.exp,
+    'fabs': np.fabs,
+    'float': _to_float_block,
+    'floor': _get_integer_block_function(np.floor),
+    'hypot': np.hypot,
+    'int': _to_int_block,
+    'log': np.log,
+    'log10': np.log10,
+    'log2': np.log2,
+    'max': _get_extreme_block_function(np.maximum),
+    'min': _get_extreme_block_function(np.minimum),
+    'pi': math.pi,
+    'pow': lambda x, y: np.power(_to_float_block(x), y),
+    'round': _round_block,
+    'sin': np.sin,
+    'sinh': np.sinh,
+    'sqrt': np.sqrt,
+    'tan': np.tan,
+    'tanh': np.tanh,
+    'tau': math.tau,
+    'trunc': _get_integer_block_function(np.trunc),
+}
+
+# Module name under which functions can also be called, e.g. math.sin(x).
+_MATH_MODULE_NAME = 'math'
+
+
+class _BlockOperatorTransformer(ast.NodeTransformer):
+  """Replaces the binary operators of a formula by calls to block operators.
+  """
+
+  def visit_BinOp(self, node: ast.BinOp) -> ast.AST:
+    """Replaces a binary operator by a call to its block operator."""
+    self.generic_visit(node)
+    return ast.copy_location(ast.Call(
+        func=ast.Name(
+            id=_BLOCK_OPERATOR_NAMES[type(node.op)], ctx=ast.Load()),
+        args=[node.left, node.right], keywords=[]), node)
+
+
+def _validate_node(node: ast.AST):
+  """Checks that a formula node only uses allowed operations.
+
+  Args:
+    node: Parsed formula node.
+
+  Raises:
+    ValueError: Node is not allowed in formulas.
+  """
+  if isinstance(node, ast.Expression):
+    _validate_node(node.body)
+  elif isinstance(node, ast.Constant):
+    if isinstance(node.value, bool) or not isinstance(
+            node.value, (int, float)):
+      raise ValueError(f'Unsupported constant in formula: {node.value!r}')
+  elif isinstance(node, ast.Name):
+    if node.id != FRAME_VARIABLE and node.id not in _FRAME_FUNCTIONS:
+      raise ValueError(f'Unknown name in formula: {node.id}')
+  elif isinstance(node, ast.Attribute):
+    if (not isinstance(node.value, ast.Name) or
+            node.value.id != _MATH_MODULE_NAME or
+            node.attr not in _FRAME_FUNCTIONS):
+      raise ValueError(f'Unsupported attribute in formula: {node.attr}')
+  elif isinstance(node, ast.BinOp):
+    if not isinstance(node.op, _ALLOWED_BINARY_OPERATORS):
+      raise ValueError(f'Unsupported operator in formula: {node.op}')
+    _validate_node(node.left)
+    _validate_node(node.right)
+  elif isinstance(node, ast.UnaryOp):
+    if not isinstance(node.op, _ALLOWED_UNARY_OPERATORS):
+      raise ValueError(f'Unsupported operator in formula: {node.op}')
+    _validate_node(node.operand)
+  elif isinstance(node, ast.Call):
+    if node.keywords:
+      raise ValueError('Keyword arguments are not supported in formulas.')
+    if not isinstance(node.func, (ast.Name, ast.Attribute)):
+      raise ValueError('Only named functions can be called in formulas.')
+    _validate_node(node.func)
+    for argument in node.args:
+      _validate_node(argument)
+  else:
+    raise ValueError(
+        f'Unsupported expression in formula: {type(node).__name__}')
+
+
+class CompiledFormula(object):
+  """Custom wave formula, parsed and validated once.
+
+  Methods:
+    expression: Formula with its template values replaced.
+    evaluate: Evaluates the formula for a single frame.
+    evaluate_block: Evaluates the formula for an array of frames.
+  """
+
+  def __init__(self, expression: Text):
+    """Instantiates a CompiledFormula.
+
+    Args:
+      expression: Formula, with x as the only variable.
+
+    Raises:
+      ValueError: Formula is not valid or uses unsupported operations.
+    """
+    try:
+      expression_tree = ast.parse(expression.strip(), mode='eval')
+    except SyntaxError as error:
+      raise ValueError(f'Invalid formula: {expression}') from error
+    _validate_node(expression_tree)
+
+    self._expression = expression
+    self._code = compile(expression_tree, '<custom wave formula>', 'eval')
+    block_expression_tree = ast.fix_missing_locations(
+        _BlockOperatorTransformer().visit(expression_tree))
+    self._block_code = compile(
+        block_expression_tree, '<custom wave formula>', 'eval')
+    self._frame_namespace = self._get_namespace(_FRAME_FUNCTIONS)
+    self._block_namespace = self._get_namespace(_BLOCK_FUNCTIONS)
+    self._block_namespace.update({
+        _BLOCK_OPERATOR_NAMES[operator_type]: _get_block_operator(
+            binary_operator, operator_type)
+        for operator_type, binary_operator in _BINARY_OPERATORS.items()})
+
+  def _get_namespace(
+          self, functions: Mapping[Text, Any]) -> Mapping[Text, Any]:
+    """Gets the names available to the formula.
+
+    Args:
+      functions: Functions and constants by name.
+
+    Returns:
+      Namespace to evaluate the formula with.
+    """
+    namespace = {'__builtins__': {}}
+    namespace.update(functions)
+    namespace[_MATH_MODULE_NAME] = types.SimpleNamespace(**functions)
+    return namespace
+
+  @property
+  def expression(self) -> Text:
+    """Formula with its template values replaced."""
+    return self._expression
+
+  def evaluate(self, sample_frame: int) -> wave_math.Number:
+    """Evaluates the formula for a single frame.
+
+    Args:
+      sample_frame: Frame for which to evaluate the formula.
+
+    Returns:
+      Value of the formula.
+    """
+    self._frame_namespace[FRAME_VARIABLE] = sample_frame
+    return eval(self._code, self._frame_namespace)
+
+  def evaluate_block(self, sample_frames: np.ndarray) -> np.ndarray:
+    """Evaluates the formula for an array of frames.
+
+    Values are the ones evaluate gives. Integer operations are done in
+    int64, and blocks whose integers may not fit in it, or that NumPy would
+    compute otherwise, are evaluated frame by frame, with Python integers.
+    Float functions are NumPy's, which may round the last bit of some
+    results otherwise than math's. Blocks with a division by zero, overflow
+    or invalid operation are also evaluated frame by frame, so they raise
+    the errors that evaluate raises.
+
+    Args:
+      sample_frames: Frames for which to evaluate the formula.
+
+    Raises:
+      ArithmeticError: Division by zero or overflow, as evaluate raises it.
+      ValueError: Math function out of its domain, as evaluate raises it.
+
+    Returns:
+      Values of the formula, one per frame. Python numbers, in an object
+      array, if evaluated frame by frame.
+    """
+    self._block_namespace[FRAME_VARIABLE] = sample_frames
+    try:
+      with np.errstate(divide='raise', over='raise', invalid='raise'):
+        sample_values = eval(self._block_code, self._block_namespace)
+    except (_InexactBlockError, OverflowError, FloatingPointError):
+      # OverflowError: a Python integer too large for int64.
+      # FloatingPointError: NumPy error, raised otherwise or not by Python.
+      return np.array(
+          [self.evaluate(sample_frame)
+           for sample_frame in sample_frames.tolist()], dtype=object)
+    return np.broadcast_to(sample_values, sample_frames.shape)
+
+
+def compile_formula(
+        formula_template: Text, **template_values: Any) -> CompiledFormula:
+  """Compiles a formula template into a reusable formula.
+
+  Template values are replaced into the formula as text, as str.format would,
+  so they keep the same precedence they had when formulas were evaluated
+  frame by frame. {x} remains a variable.
+
+  Args:
+    formula_template: Formula with {variables} to replace.
+    **template_values: Values of the variables, other than x.
+
+  Raises:
+    ValueError: Formula is not valid or uses unsupported operations.
+
+  Returns:
+    Compiled formula.
+  """
+  template_values[FRAME_VARIABLE] = FRAME_VARIABLE
+  try:
+    expression = formula_template.format(**template_values)
+  except (KeyError, IndexError, ValueError) as error:
+    raise ValueError(f'Invalid formula template: {formula_template}') from error
+  return CompiledFormula(expression)
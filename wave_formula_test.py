@@ -0,0 +1,88 @@
+"""Tests that vectorized custom formulas give the samples of per-frame ones."""
+
+import numpy as np
+import unittest
+import wave_formula
+import wave_generator
+from typing import Text
+
+
+# Duration of the compared waves, in seconds.
+_DURATION = 3
+# Frames per second of the compared waves.
+_SAMPLE_RATE = 44100
+
+
+class CompiledFormulaTest(unittest.TestCase):
+  """Compares CompiledFormula block and frame evaluations.
+
+  Methods:
+    test_negative_power: Integers raised to negative powers give floats.
+    test_max_of_several_values: max() takes more than two values.
+    test_min_of_one_value: min() of a single value is rejected.
+    test_power_beyond_int64: Integer powers do not overflow.
+    test_product_beyond_int64: Integer products do not overflow.
+    test_division_by_zero: Blocks raise the error of frames.
+    test_math_domain_error: Blocks raise the error of frames.
+  """
+
+  def setUp(self):
+    self._wave_sound_generator = wave_generator.WaveSoundGenerator()
+    self._sample_frames = np.arange(
+        _DURATION * _SAMPLE_RATE, dtype=np.int64)
+
+  def _assert_same_samples(self, formula: Text):
+    """Asserts that a formula gives the same samples block by block.
+
+    Args:
+      formula: Custom wave formula template.
+    """
+    wave_options = {
+        wave_generator.SoundWaveOption.CUSTOM_WAVE_FORMULA: formula,
+        wave_generator.SoundWaveOption.SAMPLE_RATE: _SAMPLE_RATE,
+    }
+    wave_function = self._wave_sound_generator.get_wave_function(
+        wave_generator.SoundWaveType.CUSTOM_WAVE, wave_options)
+    wave_block_function = self._wave_sound_generator.get_wave_block_function(
+        wave_generator.SoundWaveType.CUSTOM_WAVE, wave_options)
+    frame_samples = [
+        wave_function(sample_frame)
+        for sample_frame in self._sample_frames.tolist()]
+    block_samples = wave_block_function(self._sample_frames)
+    np.testing.assert_array_equal(block_samples, frame_samples)
+
+  def test_negative_power(self):
+    self._assert_same_samples('({x} + 1) ** -1 * {max_sample}')
+
+  def test_max_of_several_values(self):
+    self._assert_same_samples('max({x}, 3, 5)')
+
+  def test_min_of_one_value(self):
+    compiled_formula = wave_formula.compile_formula('min({x})')
+    with self.assertRaises(TypeError):
+      compiled_formula.evaluate_block(self._sample_frames)
+
+  def test_power_beyond_int64(self):
+    self._assert_same_samples('{x} ** 4 - 10')
+
+  def test_product_beyond_int64(self):
+    self._assert_same_samples(
+        '({x} + 1) * ({x} + 2) * ({x} + 3) * ({x} + 4) * ({x} + 5) % 30000')
+
+  def test_division_by_zero(self):
+    compiled_formula = wave_formula.compile_formula('1 / ({x} - 100)')
+    with self.assertRaises(ZeroDivisionError):
+      compiled_formula.evaluate(100)
+    with self.assertRaises(ZeroDivisionError):
+      compiled_formula.evaluate_block(self._sample_frames)
+
+  def test_math_domain_error(self):
+    compiled_formula = wave_formula.compile_formula('sqrt({x} - 100)')
+    with self.assertRaises(ValueError):
+      compiled_formula.evaluate(0)
+    with self.assertRaises(ValueError):
+      compiled_formula.evaluate_block(self._sample_frames)
+
+
+if __name__ == '__main__':
+  unittest.main()
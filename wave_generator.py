@@ -1,12 +1,24 @@
 """Generates sound wave functions and values."""
 
 import array
+import concurrent.futures
 import enum
+import hashlib
 import math
+import multiprocessing
+import numpy as np
 import random
+import time
+import wave_cache
+import wave_formula
+import wave_instrumentation
 import wave_math
+import wave_noise
 import wave_settings
-from typing import Any, Callable, Mapping, Optional, Text, Tuple
+import wave_transformer
+from typing import (
+    Any, Callable, Iterator, List, Mapping, Optional, Sequence, Text, Tuple,
+    Union)
 
 
 class SoundWaveOption(enum.Enum):
@@ -15,32 +27,65 @@ class SoundWaveOption(enum.Enum):
   AMPLITUDE = 'amplitude'
   # Wave amplitude adjustment. Adjusts min and max value samples by a %.
   AMPLITUDE_ADJUSTMENT = 'amplitude_adjustment'
+  # Whether sawtooth, square and triangle waves are band-limited. Their sharp
+  # edges and corners get polynomial corrections (PolyBLEP and PolyBLAMP), so
+  # harmonics above half the sample rate do not alias.
+  BAND_LIMITED = 'band_limited'
   # If custom wave type is specified: this template formula is used.
   # Must be a string with {variables} that will be replaced into the actual
   # values.
   CUSTOM_WAVE_FORMULA = 'custom_wave_formula'
-  # Debug mode allows printing formulas and others.
+  # Debug mode prints the formula of each wave once, when its wave function
+  # is built. Use wave_instrumentation to measure rendering.
   DEBUG = 'debug'
+  # Frequency of periodic waves, in Hz. Wave functions repeat a whole number
+  # of frames per cycle, sample_rate / frequency rounded, so other
+  # frequencies are detuned, e.g. 440 Hz plays as 441 Hz at 44100 Hz. Use a
+  # wave_oscillator.Oscillator to play any frequency in tune.
   FREQUENCY = 'frequency'
   # Max value that the wave can take. Defaults to positive Amplitude.
   MAX_WAVE_VALUE = 'max_wave_value'
   # Min value that the wave can take. Defaults to negative Amplitude.
   MIN_WAVE_VALUE = 'min_wave_value'
+  # Color of random waves. Must be a wave_noise.NoiseColor. Pink and brown
+  # noise are generated from a counter-based hash, so each frame gets the
+  # same value in any block or segment.
+  NOISE_COLOR = 'noise_color'
+  # How samples are computed. Must be a RenderMode.
+  RENDER_MODE = 'render_mode'
   # Number of frames/samples per second.
   SAMPLE_RATE = 'sample_rate'
+  # Seed of random waves. When set, each frame gets the same value no matter
+  # how the wave is split into blocks or segments. When None, the global
+  # random module is used.
+  SEED = 'seed'
   # Volume of the sample. Floats from 0 to 1 are recommended values.
   VOLUME = 'volume'
   # A formula that is applied to transform the wave shape. This function gets
   # applied to each sample_value at the end of the calculation process.
-  # Signature must be Callable[[int], int].
+  # Signature must be Callable[[int], int], or a
+  # wave_transformer.TransformerPipeline, which transforms blocks at once.
   WAVE_TRANSFORMER = 'wave_transformer'
 
 
+class RenderMode(enum.Enum):
+  """Represents how sound samples are computed."""
+  # Calls the wave function once per frame.
+  PER_FRAME = 'per_frame'
+  # Computes blocks of frames at once as arrays. Output is identical to
+  # PER_FRAME; waves that cannot be vectorized fall back to it per block.
+  VECTORIZED = 'vectorized'
+  # Computes one cycle of periodic waves once, caches it and repeats it for
+  # every frame. Other waves fall back to VECTORIZED.
+  WAVETABLE = 'wavetable'
+
+
 _DEFAULT_WAVE_OPTIONS = {
     # Amplitude must be always half the total range.
     SoundWaveOption.AMPLITUDE: wave_math.get_max_value_from_bytes(
         wave_settings.BYTES_OF_DATA, True) / 2,
     SoundWaveOption.AMPLITUDE_ADJUSTMENT: 1,  # 100%
+    SoundWaveOption.BAND_LIMITED: False,
     SoundWaveOption.CUSTOM_WAVE_FORMULA: '',
     SoundWaveOption.DEBUG: False,
     SoundWaveOption.FREQUENCY: 440,
@@ -48,7 +93,10 @@ _DEFAULT_WAVE_OPTIONS = {
         wave_settings.BYTES_OF_DATA, wave_settings.SIGNED_INTEGER) - 1,
     SoundWaveOption.MIN_WAVE_VALUE: wave_math.get_min_value_from_bytes(
         wave_settings.BYTES_OF_DATA, wave_settings.SIGNED_INTEGER) + 1,
+    SoundWaveOption.NOISE_COLOR: wave_noise.NoiseColor.WHITE,
+    SoundWaveOption.RENDER_MODE: RenderMode.VECTORIZED,
     SoundWaveOption.SAMPLE_RATE: 44100,
+    SoundWaveOption.SEED: None,
     SoundWaveOption.VOLUME: 1,  # 100%
     SoundWaveOption.WAVE_TRANSFORMER: lambda x: x,
 }
@@ -60,6 +108,8 @@ class SoundWaveType(enum.Enum):
   X2_WAVE = 'x**2'
   RANDOM_WAVE = 'random'
   SAWTOOTH_WAVE = 'sawtooth'
+  SQUARE_WAVE = 'square'
+  TRIANGLE_WAVE = 'triangle'
   CUSTOM_WAVE = 'custom'
 
 
@@ -69,23 +119,414 @@ WaveOptions = Mapping[SoundWaveOption, Any]
 # A wave function takes the frame and outputs the sample for the frame.
 WaveFunction = Callable[[int], int]
 
+# A wave block function takes an array of frames and outputs their samples.
+WaveBlockFunction = Callable[[np.ndarray], np.ndarray]
+
+# Waves whose samples only depend on the frame position within its cycle.
+PERIODIC_WAVE_TYPES = frozenset([
+    SoundWaveType.SIN_WAVE,
+    SoundWaveType.X2_WAVE,
+])
+
+# Waves defined by their shape over the phase of each cycle, from 0 to 1. The
+# phase of a frame is frac(frame * frequency / sample_rate), so they play at
+# the exact frequency.
+PHASE_WAVE_TYPES = frozenset([
+    SoundWaveType.SAWTOOTH_WAVE,
+    SoundWaveType.SQUARE_WAVE,
+    SoundWaveType.TRIANGLE_WAVE,
+])
+
+# Version of the synthesis, part of render cache keys. Must change whenever
+# the samples rendered for the same options change.
+_RENDER_CACHE_VERSION = 2
+
+# One cycle of samples of periodic waves, by wave type and wave options.
+_WAVETABLE_CACHE = wave_cache.LruCache(wave_settings.WAVETABLE_CACHE_SIZE)
+
+
+def _get_random_integers(
+        min_value: int, max_value: int, count: int) -> np.ndarray:
+  """Gets random integers as consecutive random.randint calls would.
+
+  random.randint draws one 32-bit word per attempt, keeps its top bits and
+  rejects values outside of the range. Drawing the words in bulk and applying
+  the same rejection yields the same values and leaves the global random state
+  where the equivalent randint calls would. Never draws more words than the
+  values still needed, so no word is wasted.
+
+  Args:
+    min_value: Min value that a random integer can take.
+    max_value: Max value that a random integer can take.
+    count: Number of random integers to get.
+
+  Returns:
+    Random integers.
+  """
+  value_range = max_value - min_value + 1
+  range_bits = value_range.bit_length()
+  if range_bits > 32:
+    return np.array(
+        [random.randint(min_value, max_value) for _ in range(count)],
+        dtype=np.int64)
+
+  random_blocks = []
+  pending_count = count
+  while pending_count > 0:
+    random_words = random.getrandbits(32 * pending_count).to_bytes(
+        4 * pending_count, 'little')
+    candidates = np.frombuffer(random_words, dtype='<u4') >> (32 - range_bits)
+    accepted = candidates[candidates < value_range]
+    random_blocks.append(accepted)
+    pending_count -= len(accepted)
+
+  if not random_blocks:
+    return np.zeros(0, dtype=np.int64)
+  return np.concatenate(random_blocks).astype(np.int64) + min_value
+
+
+def _get_seeded_random_integers(
+        seed: int, min_value: int, max_value: int,
+        sample_frames: np.ndarray) -> np.ndarray:
+  """Gets random integers for the given frames, reproducible from a seed.
+
+  Frames are grouped in fixed-size random blocks, each with its own generator
+  derived from the seed and the block number. The value of a frame only
+  depends on the seed and the frame, so any segment can be generated alone.
+  Frames usually come in sorted ranges, so they are split into runs in the
+  same random block, and each run is filled at once.
+
+  Args:
+    seed: Seed of the random wave.
+    min_value: Min value that a random integer can take.
+    max_value: Max value that a random integer can take.
+    sample_frames: Frames for which to get random integers.
+
+  Returns:
+    Random integers, one per frame.
+  """
+  random_block_size = wave_settings.RANDOM_BLOCK_SIZE
+  random_integers = np.empty(len(sample_frames), dtype=np.int64)
+  random_blocks = sample_frames // random_block_size
+  run_starts = np.concatenate(
+      ([0], np.flatnonzero(np.diff(random_blocks)) + 1)).tolist()
+  run_ends = run_starts[1:] + [len(sample_frames)]
+  for run_start, run_end in zip(run_starts, run_ends):
+    if run_start == run_end:
+      continue
+    block_generator = np.random.default_rng(
+        [seed, int(random_blocks[run_start])])
+    block_integers = block_generator.integers(
+        min_value, max_value, size=random_block_size, endpoint=True)
+    random_integers[run_start:run_end] = block_integers[
+        sample_frames[run_start:run_end] % random_block_size]
+  return random_integers
+
+
+class WaveSpec(object):
+  """Snapshot of the wave options, merged with defaults and resolved.
+
+  Built once per wave function and shared by all its per-frame or per-block
+  computations, so no option is looked up while rendering. Immutable and
+  hashable so it can be used as a cache key. Wave transformers are compared
+  by identity.
+  """
+  __slots__ = (
+      'amplitude',
+      'band_limited',
+      'custom_wave_formula',
+      'debug_mode',
+      'frequency',
+      'max_sample_value',
+      'min_sample_value',
+      'noise_color',
+      'render_mode',
+      'sample_rate',
+      'sample_value_range',
+      'samples_per_cycle',
+      'seed',
+      'volume',
+      'wave_transformer',
+  )
+
+  def __init__(self, **spec_values: Any):
+    """Instantiates a WaveSpec.
+
+    Args:
+      **spec_values: Value of each of the resolved wave options.
+
+    Raises:
+      TypeError: Missing or unknown resolved wave option.
+    """
+    unknown_names = set(spec_values) - set(self.__slots__)
+    missing_names = set(self.__slots__) - set(spec_values)
+    if unknown_names or missing_names:
+      raise TypeError(
+          f'Unknown spec values: {sorted(unknown_names)}. '
+          f'Missing spec values: {sorted(missing_names)}.')
+    for name, value in spec_values.items():
+      object.__setattr__(self, name, value)
+
+  def __setattr__(self, name: Text, value: Any):
+    raise AttributeError('WaveSpec is immutable.')
+
+  def __delattr__(self, name: Text):
+    raise AttributeError('WaveSpec is immutable.')
+
+  def __setstate__(self, state: Tuple[Any, Mapping[Text, Any]]):
+    _, spec_values = state
+    for name, value in spec_values.items():
+      object.__setattr__(self, name, value)
+
+  def _get_values(self) -> Tuple[Any, ...]:
+    """Gets the values of the spec, in slot order."""
+    return tuple(getattr(self, name) for name in self.__slots__)
+
+  def __eq__(self, other: Any) -> bool:
+    if not isinstance(other, WaveSpec):
+      return NotImplemented
+    return self._get_values() == other._get_values()
+
+  def __hash__(self) -> int:
+    return hash(self._get_values())
+
+  def __repr__(self) -> Text:
+    spec_values = ', '.join(
+        f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+    return f'WaveSpec({spec_values})'
+
+
+def normalize_sample_block(
+        wave_spec: WaveSpec, sample_values: np.ndarray,
+        sample_frames: np.ndarray) -> np.ndarray:
+  """Applies common normalization operations to a block of samples.
+
+  Same normalizations as wave functions apply to a single sample value,
+  applied to all the values in one array operation.
+
+  Args:
+    wave_spec: Resolved wave options.
+    sample_values: Values of the samples.
+    sample_frames: Frame of each sample.
+
+  Raises:
+    OverflowError: Wave transformer gave a value out of int16.
+
+  Returns:
+    Values of the samples as int16, after normalization opperations.
+  """
+  sample_values = sample_values * wave_spec.volume
+  profiler = wave_instrumentation.get_profiler()
+  if profiler is not None:
+    profiler.count(
+        wave_instrumentation.Stage.SYNTHESIS,
+        wave_instrumentation.Counter.CLIPPED_SAMPLES,
+        int(np.count_nonzero(
+            (sample_values > wave_spec.max_sample_value) |
+            (sample_values < wave_spec.min_sample_value))))
+  sample_values = np.clip(
+      sample_values, wave_spec.min_sample_value, wave_spec.max_sample_value)
+  # Casting truncates towards zero, as int() does.
+  sample_values = sample_values.astype(np.int64)
+
+  default_transformer = _DEFAULT_WAVE_OPTIONS[SoundWaveOption.WAVE_TRANSFORMER]
+  if wave_spec.wave_transformer is not default_transformer:
+    with wave_instrumentation.measure(wave_instrumentation.Stage.TRANSFORMER):
+      if isinstance(
+              wave_spec.wave_transformer,
+              wave_transformer.TransformerPipeline):
+        sample_values = wave_spec.wave_transformer.transform_block(
+            sample_values, sample_frames)
+      else:
+        sample_values = np.fromiter(
+            map(wave_spec.wave_transformer, sample_values.tolist()),
+            dtype=np.int64, count=len(sample_values))
+    if len(sample_values) and (
+            sample_values.min() < np.iinfo(np.int16).min or
+            sample_values.max() > np.iinfo(np.int16).max):
+      raise OverflowError('Wave transformer gave a value out of int16.')
+  return sample_values.astype(np.int16)
+
+
+def _get_polyblep(
+        phases: np.ndarray,
+        phase_increments: Union[wave_math.Number, np.ndarray]) -> np.ndarray:
+  """Gets the PolyBLEP corrections of a step from 1 to -1 at phase 0.
+
+  Frames within one phase increment of the step get a polynomial residual
+  that smooths it into a band-limited step.
+
+  Args:
+    phases: Phase of each frame, from 0 to 1.
+    phase_increments: How much the phase advances per frame, for all frames
+      or for each frame.
+
+  Returns:
+    Correction of each frame, to subtract from the stepped wave.
+  """
+  phase_increments = np.broadcast_to(phase_increments, phases.shape)
+  corrections = np.zeros_like(phases)
+  after_step = phases < phase_increments
+  x = phases[after_step] / phase_increments[after_step]
+  corrections[after_step] = 2 * x - x * x - 1
+  before_step = phases > 1 - phase_increments
+  x = (phases[before_step] - 1) / phase_increments[before_step]
+  corrections[before_step] = x * x + 2 * x + 1
+  return corrections
+
+
+def _get_polyblamp(
+        phases: np.ndarray,
+        phase_increments: Union[wave_math.Number, np.ndarray]) -> np.ndarray:
+  """Gets the PolyBLAMP corrections of a corner at phase 0.
+
+  The integral of PolyBLEP, for waves whose slope, not value, steps.
+
+  Args:
+    phases: Phase of each frame, from 0 to 1.
+    phase_increments: How much the phase advances per frame, for all frames
+      or for each frame.
+
+  Returns:
+    Correction of each frame, per unit of slope change per frame.
+  """
+  phase_increments = np.broadcast_to(phase_increments, phases.shape)
+  corrections = np.zeros_like(phases)
+  after_corner = phases < phase_increments
+  x = phases[after_corner] / phase_increments[after_corner] - 1
+  corrections[after_corner] = -x ** 3 / 3
+  before_corner = phases > 1 - phase_increments
+  x = (phases[before_corner] - 1) / phase_increments[before_corner] + 1
+  corrections[before_corner] = x ** 3 / 3
+  return corrections
+
+
+def get_phase_wave_values(
+        sound_wave_type: SoundWaveType, wave_spec: WaveSpec,
+        phases: np.ndarray,
+        phase_increments: Union[wave_math.Number, np.ndarray]) -> np.ndarray:
+  """Gets the sample values of a sawtooth, square or triangle wave.
+
+  Values are not normalized. Waves are band-limited if the wave spec says
+  so, which needs how much the phase advances per frame.
+
+  Args:
+    sound_wave_type: SAWTOOTH_WAVE, SQUARE_WAVE or TRIANGLE_WAVE.
+    wave_spec: Resolved wave options.
+    phases: Phase of each frame, from 0 to 1.
+    phase_increments: How much the phase advances per frame, for all frames
+      or for each frame.
+
+  Raises:
+    ValueError: Wave type is not defined by phase.
+
+  Returns:
+    Sample value of each frame, from the min to the max sample value.
+  """
+  if sound_wave_type == SoundWaveType.SAWTOOTH_WAVE:
+    # Rises from -1 to 1, then steps down.
+    shape_values = 2 * phases - 1
+    if wave_spec.band_limited:
+      shape_values -= _get_polyblep(phases, phase_increments)
+  elif sound_wave_type == SoundWaveType.SQUARE_WAVE:
+    # 1 for the first half of the cycle, -1 for the second.
+    shape_values = np.where(phases < 0.5, 1.0, -1.0)
+    if wave_spec.band_limited:
+      shape_values += _get_polyblep(phases, phase_increments)
+      shape_values -= _get_polyblep(
+          np.mod(phases + 0.5, 1), phase_increments)
+  elif sound_wave_type == SoundWaveType.TRIANGLE_WAVE:
+    # Rises from 0 to 1 at phase 0.25, falls to -1 at phase 0.75.
+    shape_values = 1 - 4 * np.abs(np.mod(phases + 0.25, 1) - 0.5)
+    if wave_spec.band_limited:
+      # The slope changes by 8 per cycle, 8 * increment per frame, at
+      # both corners.
+      shape_values += 4 * np.asarray(phase_increments) * (
+          _get_polyblamp(np.mod(phases + 0.25, 1), phase_increments) -
+          _get_polyblamp(np.mod(phases + 0.75, 1), phase_increments))
+  else:
+    raise ValueError(f'Not a phase wave type: {sound_wave_type}')
+
+  middle_value = (wave_spec.max_sample_value + wave_spec.min_sample_value) / 2
+  half_span = (wave_spec.max_sample_value - wave_spec.min_sample_value) / 2
+  return middle_value + half_span * shape_values
+
+
+# Wave sound generator of the current render worker process.
+_render_worker_state = {}
+
+
+def _get_render_process_context() -> multiprocessing.context.BaseContext:
+  """Gets the process context to render in parallel.
+
+  Forking is preferred, as it shares the generator with the workers without
+  pickling it, so wave options can hold lambdas. Other start methods require
+  picklable wave options.
+
+  Returns:
+    Process context.
+  """
+  if 'fork' in multiprocessing.get_all_start_methods():
+    return multiprocessing.get_context('fork')
+  return multiprocessing.get_context()
+
+
+def _init_render_worker(wave_sound_generator: 'WaveSoundGenerator'):
+  """Initializes a render worker process.
+
+  Args:
+    wave_sound_generator: Generator to render with.
+  """
+  _render_worker_state['generator'] = wave_sound_generator
+
+
+def _render_wave_segment(
+        sound_wave_type: 'SoundWaveType',
+        wave_specific_options: Optional['WaveOptions'],
+        start_frame: int, end_frame: int) -> bytes:
+  """Renders a segment of a sound wave in a render worker process.
+
+  Args:
+    sound_wave_type: Type of sound wave to generate.
+    wave_specific_options: Modifiers to the specific wave.
+    start_frame: First frame of the segment.
+    end_frame: Frame after the last frame of the segment.
+
+  Returns:
+    Int16 samples of the segment, as bytes.
+  """
+  wave_sound_generator = _render_worker_state['generator']
+  segment_blocks = wave_sound_generator._get_wave_sound_segment_blocks(
+      sound_wave_type, wave_specific_options, start_frame, end_frame)
+  return b''.join(segment_block.tobytes() for segment_block in segment_blocks)
+
 
 class WaveSoundGenerator(object):
   """Generator of wave functions.
 
   Methods:
     get_wave_function: Gets a wave function that gives values for each frame.
+    get_wave_block_function: Gets a wave function that gives values for
+      blocks of frames.
+    get_render_cache_key: Gets the content key of rendered samples.
+    get_wave_sound_blocks: Gets data for sound wave, one block at a time.
     get_wave_sound_samples: Gets data for sound wave.
+    get_parallel_wave_sound_samples: Gets data for many sound waves, using
+      many processes.
   """
 
-  def __init__(self, wave_options: Optional[WaveOptions] = None):
+  def __init__(
+          self, wave_options: Optional[WaveOptions] = None,
+          render_cache: Optional[wave_cache.RenderCache] = None):
     """Instantiates a WaveFunctionBuilder.
 
     Args:
       wave_options: Wave configuration.
+      render_cache: Cache of rendered samples. None to always render.
     """
     # Make first, so other functions can rely on is self reference.
     self._wave_options = wave_options or {}
+    self._render_cache = render_cache
 
   def _get_merged_wave_options(
           self, wave_options: Optional[WaveOptions]) -> WaveOptions:
@@ -119,6 +560,18 @@ class WaveSoundGenerator(object):
     default_value = _DEFAULT_WAVE_OPTIONS[option]
     return wave_options.get(option, default_value)
 
+  def _get_band_limited(self, wave_options: WaveOptions) -> bool:
+    """Gets whether to band-limit sawtooth, square and triangle waves.
+
+    Args:
+      wave_options: Wave configuration.
+
+    Returns:
+      Whether to band-limit the wave.
+    """
+    return self._get_wave_option_value(
+        wave_options, SoundWaveOption.BAND_LIMITED)
+
   def _get_debug_mode(self, wave_options: WaveOptions) -> bool:
     """Gets whether to debug wave or not.
 
@@ -130,6 +583,42 @@ class WaveSoundGenerator(object):
     """
     return self._get_wave_option_value(wave_options, SoundWaveOption.DEBUG)
 
+  def _get_noise_color(
+          self, wave_options: WaveOptions) -> wave_noise.NoiseColor:
+    """Gets the color of random waves.
+
+    Args:
+      wave_options: Wave configuration.
+
+    Returns:
+      Noise color.
+    """
+    return self._get_wave_option_value(
+        wave_options, SoundWaveOption.NOISE_COLOR)
+
+  def _get_render_mode(self, wave_options: WaveOptions) -> RenderMode:
+    """Gets how to compute the wave samples.
+
+    Args:
+      wave_options: Wave configuration.
+
+    Returns:
+      Render mode.
+    """
+    return self._get_wave_option_value(
+        wave_options, SoundWaveOption.RENDER_MODE)
+
+  def _get_seed(self, wave_options: WaveOptions) -> Optional[int]:
+    """Gets the seed of random waves.
+
+    Args:
+      wave_options: Wave configuration.
+
+    Returns:
+      Seed, or None to use the global random module.
+    """
+    return self._get_wave_option_value(wave_options, SoundWaveOption.SEED)
+
   def _get_custom_wave_formula(self, wave_options: WaveOptions) -> Text:
     """Gets custom formula template for custom wave formula type.
 
@@ -142,6 +631,27 @@ class WaveSoundGenerator(object):
     return self._get_wave_option_value(
         wave_options, SoundWaveOption.CUSTOM_WAVE_FORMULA)
 
+  def _get_compiled_custom_wave_formula(
+          self, wave_spec: WaveSpec) -> wave_formula.CompiledFormula:
+    """Gets the custom wave formula, compiled with the wave values replaced.
+
+    Args:
+      wave_spec: Resolved wave options.
+
+    Raises:
+      ValueError: Invalid custom wave formula.
+
+    Returns:
+      Compiled custom wave formula.
+    """
+    return wave_formula.compile_formula(
+        wave_spec.custom_wave_formula,
+        min_sample=wave_spec.min_sample_value,
+        max_sample=wave_spec.max_sample_value,
+        sample_range=wave_spec.sample_value_range,
+        samples_per_cycle=wave_spec.samples_per_cycle,
+    )
+
   def _get_volume(self, wave_options: WaveOptions) -> float:
     """Gets the volume based on wave options.
 
@@ -253,6 +763,9 @@ class WaveSoundGenerator(object):
   def _get_samples_per_cycle(self, wave_options: WaveOptions) -> int:
     """Gets number of samples that will be generated per wave cycle.
 
+    Rounded to whole frames, so waves play at sample_rate / samples per
+    cycle rather than at their exact frequency.
+
     Args:
       wave_options: Wave configuration.
 
@@ -266,18 +779,181 @@ class WaveSoundGenerator(object):
       return samples_per_cycle
     return 1
 
-  def _get_sample_frame_frequency(
-          self, sample_frame: int, wave_options: WaveOptions) -> float:
-    """Gets the frequency for a given sample frame.
+  def get_wave_spec(
+          self, wave_specific_options: Optional[WaveOptions] = None
+  ) -> WaveSpec:
+    """Gets the resolved wave options, merged with generator and defaults.
+
+    Args:
+      wave_specific_options: Modifiers to the specific wave.
+
+    Returns:
+      Resolved wave options.
+    """
+    wave_options = self._get_merged_wave_options(wave_specific_options)
+    return WaveSpec(
+        amplitude=self._get_wave_amplitude(wave_options),
+        band_limited=self._get_band_limited(wave_options),
+        custom_wave_formula=self._get_custom_wave_formula(wave_options),
+        debug_mode=self._get_debug_mode(wave_options),
+        frequency=self._get_wave_frequency(wave_options),
+        max_sample_value=self._get_max_wave_value(wave_options),
+        min_sample_value=self._get_min_wave_value(wave_options),
+        noise_color=self._get_noise_color(wave_options),
+        render_mode=self._get_render_mode(wave_options),
+        sample_rate=self._get_wave_sample_rate(wave_options),
+        sample_value_range=self._get_wave_value_range(wave_options),
+        samples_per_cycle=self._get_samples_per_cycle(wave_options),
+        seed=self._get_seed(wave_options),
+        volume=self._get_volume(wave_options),
+        wave_transformer=self._get_wave_transformer(wave_options),
+    )
+
+  def _get_x2_wave_coefficients(
+          self, wave_spec: WaveSpec) -> Tuple[float, float, int]:
+    """Gets the coefficients of the x**2 wave, y = a (x+b)^2 + c.
 
     Args:
-      sample_frame: Frame for which to obtain frequency.
+      wave_spec: Resolved wave options.
 
     Returns:
-      Frequency for given sample frame and wave options.
+      Coefficients a, b and c.
     """
-    samples_per_cycle = self._get_samples_per_cycle(wave_options)
-    return (sample_frame % samples_per_cycle) / samples_per_cycle
+    samples_per_cycle = wave_spec.samples_per_cycle
+    a = 4 * (wave_spec.max_sample_value - wave_spec.min_sample_value) / (
+        samples_per_cycle ** 2)
+    b = -samples_per_cycle / 2
+    c = wave_spec.min_sample_value
+    return a, b, c
+
+  def _get_wavetable(
+          self, sound_wave_type: SoundWaveType,
+          wave_specific_options: Optional[WaveOptions]) -> np.ndarray:
+    """Gets one cycle of samples of a periodic wave, from cache if available.
+
+    Args:
+      sound_wave_type: Type of periodic sound wave.
+      wave_specific_options: Modifiers to the specific wave.
+
+    Returns:
+      Read-only int16 samples of the first cycle of the wave.
+    """
+    wave_spec = self.get_wave_spec(wave_specific_options)
+    wavetable_key = (sound_wave_type, wave_spec)
+    try:
+      wavetable = _WAVETABLE_CACHE.get(wavetable_key)
+    except TypeError:
+      # Some option value is not hashable, so the cycle cannot be cached.
+      wavetable_key = None
+      wavetable = None
+    if wavetable is not None:
+      return wavetable
+
+    cycle_options = dict(wave_specific_options or {})
+    cycle_options[SoundWaveOption.RENDER_MODE] = RenderMode.VECTORIZED
+    # The formula was already printed, if debugging, for the whole wave.
+    cycle_options[SoundWaveOption.DEBUG] = False
+    sound_wave_block_function = self.get_wave_block_function(
+        sound_wave_type, cycle_options)
+    wavetable = sound_wave_block_function(
+        np.arange(wave_spec.samples_per_cycle, dtype=np.int64))
+    wavetable.flags.writeable = False
+
+    if wavetable_key is not None:
+      _WAVETABLE_CACHE.put(wavetable_key, wavetable)
+    return wavetable
+
+  def _get_phase_wave_block_function(
+          self, sound_wave_type: SoundWaveType,
+          wave_spec: WaveSpec) -> WaveBlockFunction:
+    """Gets the block function of a sawtooth, square or triangle wave.
+
+    Args:
+      sound_wave_type: SAWTOOTH_WAVE, SQUARE_WAVE or TRIANGLE_WAVE.
+      wave_spec: Resolved wave options.
+
+    Returns:
+      Function that generates the wave for an array of frames.
+    """
+    phase_increment = wave_spec.frequency / wave_spec.sample_rate
+
+    def phase_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+      """Sawtooth, square or triangle wave function for a block of frames.
+
+      The phase of each frame is computed from the frame alone, not
+      accumulated, so any block or segment can be generated alone.
+      """
+      phases = np.mod(
+          sample_frames * wave_spec.frequency,
+          wave_spec.sample_rate) / wave_spec.sample_rate
+      sample_values = get_phase_wave_values(
+          sound_wave_type, wave_spec, phases, phase_increment)
+      return normalize_sample_block(wave_spec, sample_values, sample_frames)
+    return phase_sound_wave
+
+  def _get_colored_noise_block_function(
+          self, wave_spec: WaveSpec) -> WaveBlockFunction:
+    """Gets the block function of a pink or brown random wave.
+
+    Args:
+      wave_spec: Resolved wave options, of a noise color other than WHITE.
+
+    Returns:
+      Function that generates the wave for an array of frames.
+    """
+    # Unseeded noise draws its seed from the global random module once.
+    seed = wave_spec.seed
+    if seed is None:
+      seed = random.getrandbits(64)
+    middle_value = (wave_spec.max_sample_value + wave_spec.min_sample_value) / 2
+    half_value_span = (
+        wave_spec.max_sample_value - wave_spec.min_sample_value) / 2
+
+    def colored_noise_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+      """Pink or brown noise function for a block of frames."""
+      noise_values = wave_noise.get_noise_values(
+          wave_spec.noise_color, seed, sample_frames)
+      sample_values = middle_value + half_value_span * noise_values
+      return normalize_sample_block(wave_spec, sample_values, sample_frames)
+    return colored_noise_sound_wave
+
+  def _print_wave_formula(
+          self, sound_wave_type: SoundWaveType, wave_spec: WaveSpec):
+    """Prints the formula of a wave, for debug mode.
+
+    Args:
+      sound_wave_type: Type of sound wave.
+      wave_spec: Resolved wave options.
+    """
+    samples_per_cycle = wave_spec.samples_per_cycle
+    if sound_wave_type == SoundWaveType.SIN_WAVE:
+      formula = (
+          f'{wave_spec.max_sample_value} * '
+          f'sin(2π (x % {samples_per_cycle}) / {samples_per_cycle})')
+    elif sound_wave_type in PHASE_WAVE_TYPES:
+      band_limited = ', band-limited' if wave_spec.band_limited else ''
+      formula = (
+          f'{sound_wave_type.value}(frac(x * {wave_spec.frequency} / '
+          f'{wave_spec.sample_rate})){band_limited}')
+    elif (sound_wave_type == SoundWaveType.RANDOM_WAVE and
+          wave_spec.noise_color != wave_noise.NoiseColor.WHITE):
+      formula = (
+          f'{wave_spec.noise_color.value}_noise(x), seed {wave_spec.seed}')
+    elif sound_wave_type == SoundWaveType.RANDOM_WAVE:
+      formula = (
+          f'randint({wave_spec.min_sample_value}, '
+          f'{wave_spec.max_sample_value}), seed {wave_spec.seed}')
+    elif sound_wave_type == SoundWaveType.X2_WAVE:
+      a, b, c = self._get_x2_wave_coefficients(wave_spec)
+      formula = f'{a} * ((x % {samples_per_cycle}) + {b})^2 + {c}'
+    elif sound_wave_type == SoundWaveType.CUSTOM_WAVE:
+      formula = self._get_compiled_custom_wave_formula(wave_spec).expression
+    else:
+      raise ValueError(f'Unknown wave type: {sound_wave_type}')
+    print(f'{sound_wave_type.value}: y = {formula}, '
+          f'volume {wave_spec.volume}, '
+          f'limited to [{wave_spec.min_sample_value}, '
+          f'{wave_spec.max_sample_value}]')
 
   def get_wave_function(
           self, sound_wave_type: SoundWaveType,
@@ -295,18 +971,21 @@ class WaveSoundGenerator(object):
     Returns:
       Function that generates requested sound wave.
     """
-    wave_options = self._get_merged_wave_options(wave_specific_options)
-
-    debug_mode = self._get_debug_mode(wave_options)
-    volume_adjustment = self._get_volume(wave_options)
-
-    min_sample_value = self._get_min_wave_value(wave_options)
-    max_sample_value = self._get_max_wave_value(wave_options)
-    sample_value_range = self._get_wave_value_range(wave_options)
-
-    samples_per_cycle = self._get_samples_per_cycle(wave_options)
-
-    def _normalize_sample_value(sample_value: wave_math.Number) -> int:
+    wave_spec = self.get_wave_spec(wave_specific_options)
+    if wave_spec.debug_mode:
+      self._print_wave_formula(sound_wave_type, wave_spec)
+
+    default_transformer = _DEFAULT_WAVE_OPTIONS[
+        SoundWaveOption.WAVE_TRANSFORMER]
+    transform_sample_value = wave_spec.wave_transformer
+    if isinstance(
+            wave_spec.wave_transformer, wave_transformer.TransformerPipeline):
+      transform_sample_value = None
+    # Looked up once, so frames are not slowed down when not profiling.
+    profiler = wave_instrumentation.get_profiler()
+
+    def _normalize_sample_value(
+            sample_value: wave_math.Number, sample_frame: int) -> int:
       """Applies common normalization operations to sample value.
 
       Normalizations:
@@ -317,17 +996,30 @@ class WaveSoundGenerator(object):
 
       Args:
         sample_value: Value of the sample.
+        sample_frame: Frame of the sample.
 
       Returns:
         Value of the sample, after normalization opperations are applied.
       """
-      sample_value = sample_value * volume_adjustment
-      sample_value = wave_math.limit_value_to_range(
-          sample_value, min_sample_value, max_sample_value)
-      sample_value = int(sample_value)
-
-      custom_transformer = self._get_wave_transformer(wave_options)
-      sample_value = custom_transformer(sample_value)
+      sample_value = sample_value * wave_spec.volume
+      limited_sample_value = wave_math.limit_value_to_range(
+          sample_value, wave_spec.min_sample_value, wave_spec.max_sample_value)
+      if profiler is not None and limited_sample_value != sample_value:
+        profiler.count(
+            wave_instrumentation.Stage.SYNTHESIS,
+            wave_instrumentation.Counter.CLIPPED_SAMPLES, 1)
+      sample_value = int(limited_sample_value)
+
+      if transform_sample_value is None:
+        return wave_spec.wave_transformer.transform_frame(
+            sample_value, sample_frame)
+      if profiler is None or wave_spec.wave_transformer is default_transformer:
+        return transform_sample_value(sample_value)
+      start_time = time.perf_counter()
+      sample_value = transform_sample_value(sample_value)
+      profiler.add_run(
+          wave_instrumentation.Stage.TRANSFORMER,
+          time.perf_counter() - start_time)
       return sample_value
 
     if sound_wave_type == SoundWaveType.SIN_WAVE:
@@ -339,59 +1031,85 @@ class WaveSoundGenerator(object):
           y = Asin(2πfx+θ)
         where x is time and y is the amplitude of the sound wave at time x.
         """
-        sample_frequency = self._get_sample_frame_frequency(
-            sample_frame, wave_options)
+        samples_per_cycle = wave_spec.samples_per_cycle
+        sample_frequency = (
+            (sample_frame % samples_per_cycle) / samples_per_cycle)
         sample_value = (
-            max_sample_value * math.sin(2 * math.pi * sample_frequency))
-        if debug_mode:
-          print(
-              f'{sample_frame}: {max_sample_value} * sin(2π{sample_frequency})'
-              f' = {sample_value}')
-        return _normalize_sample_value(sample_value)
+            wave_spec.max_sample_value *
+            math.sin(2 * math.pi * sample_frequency))
+        return _normalize_sample_value(sample_value, sample_frame)
       return sin_sound_wave
 
-    if sound_wave_type == SoundWaveType.SAWTOOTH_WAVE:
-      def sawtooth_sound_wave(sample_frame: int) -> int:
-        """Sawtooth wave function."""
-        spike_cycle = int(sample_frame / sample_value_range)
-        sample_value = (
-            sample_frame + min_sample_value - spike_cycle * sample_value_range)
-        if debug_mode:
-          print(
-              f'{sample_frame}: {sample_frame} + {min_sample_value} '
-              f'- {spike_cycle} * {sample_value_range} = {sample_value}')
-        return _normalize_sample_value(sample_value)
-      return sawtooth_sound_wave
+    if sound_wave_type in PHASE_WAVE_TYPES:
+      phase_sound_wave_block = self._get_phase_wave_block_function(
+          sound_wave_type, wave_spec)
+
+      def phase_sound_wave(sample_frame: int) -> int:
+        """Sawtooth, square or triangle wave function.
+
+        Computed as a block of one frame, so samples are the same as those of
+        block functions.
+        """
+        return int(phase_sound_wave_block(
+            np.array([sample_frame], dtype=np.int64))[0])
+      return phase_sound_wave
+
+    if (sound_wave_type == SoundWaveType.RANDOM_WAVE and
+            wave_spec.noise_color != wave_noise.NoiseColor.WHITE):
+      colored_noise_sound_wave_block = self._get_colored_noise_block_function(
+          wave_spec)
+
+      def colored_noise_sound_wave(sample_frame: int) -> int:
+        """Pink or brown noise function.
+
+        Computed as a block of one frame, so samples are the same as those of
+        block functions.
+        """
+        return int(colored_noise_sound_wave_block(
+            np.array([sample_frame], dtype=np.int64))[0])
+      return colored_noise_sound_wave
 
     if sound_wave_type == SoundWaveType.RANDOM_WAVE:
+      random_block_size = wave_settings.RANDOM_BLOCK_SIZE
+      # Last seeded random block, by block number.
+      seeded_random_blocks = {}
+
       def random_sound_wave(sample_frame: int) -> int:
         """Gets a random value wave."""
-        random_sample = random.randint(min_sample_value, max_sample_value)
-        if debug_mode:
-          print(f'{sample_frame}: {random_sample}')
-        return _normalize_sample_value(random_sample)
+        if wave_spec.seed is None:
+          random_sample = random.randint(
+              wave_spec.min_sample_value, wave_spec.max_sample_value)
+        else:
+          random_block = sample_frame // random_block_size
+          if random_block not in seeded_random_blocks:
+            block_start = random_block * random_block_size
+            seeded_random_blocks.clear()
+            seeded_random_blocks[random_block] = _get_seeded_random_integers(
+                wave_spec.seed, wave_spec.min_sample_value,
+                wave_spec.max_sample_value,
+                np.arange(block_start, block_start + random_block_size))
+          random_sample = int(seeded_random_blocks[random_block][
+              sample_frame % random_block_size])
+        return _normalize_sample_value(random_sample, sample_frame)
       return random_sound_wave
 
     if sound_wave_type == SoundWaveType.X2_WAVE:
+      a, b, c = self._get_x2_wave_coefficients(wave_spec)
+
       def x2_sound_wave(sample_frame: int) -> int:
         """Creates a sound wave with x**2 function.
 
         X^2 function in the shape of:
           y = a (x+b)^2 + c
         """
-        a = 4 * (
-            max_sample_value - min_sample_value) / (samples_per_cycle ** 2)
-        b = -samples_per_cycle / 2
-        c = min_sample_value
-        x = sample_frame % samples_per_cycle
+        x = sample_frame % wave_spec.samples_per_cycle
         sample_value = a * ((x + b) ** 2) + c
-        if debug_mode:
-          print(
-              f'{sample_frame}: ({a} * ({x} + {b})^2 + {c}) = {sample_value}')
-        return _normalize_sample_value(sample_value)
+        return _normalize_sample_value(sample_value, sample_frame)
       return x2_sound_wave
 
     if sound_wave_type == SoundWaveType.CUSTOM_WAVE:
+      compiled_formula = self._get_compiled_custom_wave_formula(wave_spec)
+
       def custom_sound_wave(sample_frame: int) -> int:
         """Creates a sound wave with given templated formula.
 
@@ -404,24 +1122,256 @@ class WaveSoundGenerator(object):
           {max_sample}: Maximum value a frame can take.
           {sample_range}: Difference between max and minimum value.
           {samples_per_cycle}: Samples per cycle.
+
+        The formula is parsed once and may only use arithmetic operators and
+        the math functions and constants allowed by wave_formula.
         """
-        custom_formula = self._get_custom_wave_formula(wave_options)
-        replaced_formula = custom_formula.format(
-            x=sample_frame,
-            min_sample=min_sample_value,
-            max_sample=max_sample_value,
-            sample_range=sample_value_range,
-            samples_per_cycle=samples_per_cycle,
-        )
-        # This is an unsafe operation. Use and support at your own risk.
-        sample_value = eval(replaced_formula)
-        if debug_mode:
-          print(f'{sample_frame}: {replaced_formula} = {sample_value}')
-        return _normalize_sample_value(sample_value)
+        sample_value = compiled_formula.evaluate(sample_frame)
+        return _normalize_sample_value(sample_value, sample_frame)
+      return custom_sound_wave
+
+    raise ValueError(f'Unknown wave type: {sound_wave_type}')
+
+  def get_wave_block_function(
+          self, sound_wave_type: SoundWaveType,
+          wave_specific_options: Optional[SoundWaveOption] = None
+  ) -> WaveBlockFunction:
+    """Gets a sound wave generator that computes blocks of frames at once.
+
+    Samples are the same that get_wave_function would give for each frame.
+    Wave types that cannot be vectorized fall back to calling the wave
+    function once per frame. In WAVETABLE render mode, periodic waves
+    repeat a cached cycle instead of computing every frame.
+
+    Args:
+      sound_wave_type: Type of sound wave to generate.
+      wave_specific_options: Modifiers to the specific wave.
+
+    Raises:
+      ValueError: Unknown SoundWaveType.
+
+    Returns:
+      Function that generates requested sound wave for an array of frames.
+    """
+    wave_spec = self.get_wave_spec(wave_specific_options)
+    if wave_spec.debug_mode:
+      self._print_wave_formula(sound_wave_type, wave_spec)
+
+    # Cycles repeat only if the transformer is the same for every frame.
+    if (wave_spec.render_mode == RenderMode.WAVETABLE and
+            sound_wave_type in PERIODIC_WAVE_TYPES and
+            not getattr(wave_spec.wave_transformer, 'depends_on_frame', False)):
+      wavetable = self._get_wavetable(sound_wave_type, wave_specific_options)
+
+      def wavetable_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+        """Repeats the wave cycle for a block of frames."""
+        return wavetable[sample_frames % wave_spec.samples_per_cycle]
+      return wavetable_sound_wave
+
+    if sound_wave_type == SoundWaveType.SIN_WAVE:
+      def sin_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+        """Sin wave function for a block of frames."""
+        samples_per_cycle = wave_spec.samples_per_cycle
+        sample_frequencies = (
+            (sample_frames % samples_per_cycle) / samples_per_cycle)
+        sample_values = (
+            wave_spec.max_sample_value *
+            np.sin(2 * math.pi * sample_frequencies))
+        return normalize_sample_block(wave_spec, sample_values, sample_frames)
+      return sin_sound_wave
+
+    if sound_wave_type in PHASE_WAVE_TYPES:
+      return self._get_phase_wave_block_function(sound_wave_type, wave_spec)
+
+    if (sound_wave_type == SoundWaveType.RANDOM_WAVE and
+            wave_spec.noise_color != wave_noise.NoiseColor.WHITE):
+      return self._get_colored_noise_block_function(wave_spec)
+
+    if sound_wave_type == SoundWaveType.RANDOM_WAVE:
+      def random_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+        """Gets a random value wave for a block of frames."""
+        if wave_spec.seed is None:
+          random_samples = _get_random_integers(
+              wave_spec.min_sample_value, wave_spec.max_sample_value,
+              len(sample_frames))
+        else:
+          random_samples = _get_seeded_random_integers(
+              wave_spec.seed, wave_spec.min_sample_value,
+              wave_spec.max_sample_value, sample_frames)
+        return normalize_sample_block(
+            wave_spec, random_samples, sample_frames)
+      return random_sound_wave
+
+    if sound_wave_type == SoundWaveType.X2_WAVE:
+      a, b, c = self._get_x2_wave_coefficients(wave_spec)
+
+      def x2_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+        """Creates a sound wave with x**2 function for a block of frames."""
+        x = sample_frames % wave_spec.samples_per_cycle
+        sample_values = a * ((x + b) ** 2) + c
+        return normalize_sample_block(wave_spec, sample_values, sample_frames)
+      return x2_sound_wave
+
+    if sound_wave_type == SoundWaveType.CUSTOM_WAVE:
+      compiled_formula = self._get_compiled_custom_wave_formula(wave_spec)
+
+      def custom_sound_wave(sample_frames: np.ndarray) -> np.ndarray:
+        """Creates a sound wave with given templated formula for a block."""
+        sample_values = compiled_formula.evaluate_block(sample_frames)
+        return normalize_sample_block(wave_spec, sample_values, sample_frames)
       return custom_sound_wave
 
     raise ValueError(f'Unknown wave type: {sound_wave_type}')
 
+  def get_render_cache_key(
+          self, duration: int, sound_wave_type: SoundWaveType,
+          wave_specific_options: Optional[WaveOptions] = None
+  ) -> Optional[Text]:
+    """Gets a stable content key for the samples of a sound wave.
+
+    Samples with the same key are the same, in any process. Waves whose
+    samples cannot be keyed deterministically get no key: random waves
+    without seed, and waves with a custom wave transformer other than a
+    transformer pipeline of deterministic stages.
+
+    Args:
+      duration: Duration of the sound wave.
+      sound_wave_type: Type of sound wave to generate.
+      wave_specific_options: Modifiers to the specific wave.
+
+    Returns:
+      Hex digest of the rendered content, or None if it cannot be cached.
+    """
+    wave_spec = self.get_wave_spec(wave_specific_options)
+    if sound_wave_type == SoundWaveType.RANDOM_WAVE and wave_spec.seed is None:
+      return None
+    default_transformer = _DEFAULT_WAVE_OPTIONS[
+        SoundWaveOption.WAVE_TRANSFORMER]
+    wave_transformer_key = None
+    if isinstance(
+            wave_spec.wave_transformer, wave_transformer.TransformerPipeline):
+      wave_transformer_key = wave_spec.wave_transformer.cache_key
+      if wave_transformer_key is None:
+        return None
+    elif wave_spec.wave_transformer is not default_transformer:
+      return None
+
+    # Render and debug modes do not change the samples.
+    key_values = (
+        _RENDER_CACHE_VERSION,
+        sound_wave_type.value,
+        int(duration * wave_spec.sample_rate),
+        wave_spec.amplitude,
+        wave_spec.band_limited,
+        wave_spec.custom_wave_formula,
+        wave_spec.frequency,
+        wave_spec.max_sample_value,
+        wave_spec.min_sample_value,
+        wave_spec.noise_color.value,
+        wave_spec.sample_rate,
+        wave_spec.seed,
+        wave_spec.volume,
+        wave_transformer_key,
+    )
+    return hashlib.sha256(repr(key_values).encode('utf-8')).hexdigest()
+
+  def _get_cached_samples(
+          self, render_cache_key: Optional[Text]) -> Optional[np.ndarray]:
+    """Gets rendered samples from the render cache.
+
+    Args:
+      render_cache_key: Content key of the samples.
+
+    Returns:
+      Int16 samples, or None if not cached or cache is disabled.
+    """
+    if self._render_cache is None or render_cache_key is None:
+      return None
+    return self._render_cache.get(render_cache_key)
+
+  def _get_wave_sound_segment_blocks(
+          self, sound_wave_type: SoundWaveType,
+          wave_specific_options: Optional[WaveOptions],
+          start_frame: int, end_frame: int,
+          block_size: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Gets the sound wave values of a segment of frames, in blocks.
+
+    Args:
+      sound_wave_type: Type of sound wave to generate.
+      wave_specific_options: Modifiers to the specific wave.
+      start_frame: First frame of the segment.
+      end_frame: Frame after the last frame of the segment.
+      block_size: Max number of frames per block.
+
+    Yields:
+      Int16 values generated by requested sound wave, block by block.
+    """
+    wave_spec = self.get_wave_spec(wave_specific_options)
+    block_size = block_size or wave_settings.RENDER_BLOCK_SIZE
+
+    if wave_spec.render_mode != RenderMode.PER_FRAME:
+      with wave_instrumentation.measure(wave_instrumentation.Stage.SETUP):
+        sound_wave_block_function = self.get_wave_block_function(
+            sound_wave_type, wave_specific_options)
+      for block_start in range(start_frame, end_frame, block_size):
+        block_end = min(block_start + block_size, end_frame)
+        with wave_instrumentation.measure(
+                wave_instrumentation.Stage.SYNTHESIS) as counters:
+          sample_frames = np.arange(block_start, block_end, dtype=np.int64)
+          sound_block = sound_wave_block_function(sample_frames)
+          counters[wave_instrumentation.Counter.FRAMES] += len(sound_block)
+        yield sound_block
+      return
+
+    with wave_instrumentation.measure(wave_instrumentation.Stage.SETUP):
+      sound_wave_function = self.get_wave_function(
+          sound_wave_type, wave_specific_options)
+    for block_start in range(start_frame, end_frame, block_size):
+      block_end = min(block_start + block_size, end_frame)
+      with wave_instrumentation.measure(
+              wave_instrumentation.Stage.SYNTHESIS) as counters:
+        sound_samples = array.array('h')
+        for sample_frame in range(block_start, block_end):
+          sound_sample = sound_wave_function(sample_frame)
+          sound_samples.append(sound_sample)
+        counters[wave_instrumentation.Counter.FRAMES] += len(sound_samples)
+      yield np.frombuffer(sound_samples, dtype=np.int16)
+
+  def get_wave_sound_blocks(
+          self, duration: int, sound_wave_type: SoundWaveType,
+          wave_specific_options: Optional[SoundWaveOption] = None,
+          block_size: Optional[int] = None
+  ) -> Iterator[np.ndarray]:
+    """Gets the sound wave values in blocks, computing them as they are read.
+
+    Only one block is held in memory at a time, so long durations can be
+    rendered with constant memory.
+
+    Args:
+      duration: Duration of the sound wave.
+      sound_wave_type: Type of sound wave to generate.
+      wave_specific_options: Modifiers to the specific wave.
+      block_size: Max number of frames per block.
+
+    Returns:
+      Int16 values generated by requested sound wave, block by block.
+    """
+    wave_spec = self.get_wave_spec(wave_specific_options)
+    num_samples = int(duration * wave_spec.sample_rate)
+
+    if self._render_cache is not None:
+      render_cache_key = self.get_render_cache_key(
+          duration, sound_wave_type, wave_specific_options)
+      cached_samples = self._get_cached_samples(render_cache_key)
+      if cached_samples is not None:
+        block_size = block_size or wave_settings.RENDER_BLOCK_SIZE
+        return (
+            cached_samples[block_start:block_start + block_size]
+            for block_start in range(0, num_samples, block_size))
+
+    return self._get_wave_sound_segment_blocks(
+        sound_wave_type, wave_specific_options, 0, num_samples, block_size)
+
   def get_wave_sound_samples(
           self, duration: int, sound_wave_type: SoundWaveType,
           wave_specific_options: Optional[SoundWaveOption] = None
@@ -436,15 +1386,150 @@ class WaveSoundGenerator(object):
     Returns:
       Values generated by requested sound wave for requested duration.
     """
-    sound_wave_function = self.get_wave_function(
-        sound_wave_type, wave_specific_options)
-
-    wave_options = self._get_merged_wave_options(wave_specific_options)
-    sample_rate = self._get_wave_sample_rate(wave_options)
-    num_samples = int(duration * sample_rate)
+    render_cache_key = None
+    if self._render_cache is not None:
+      render_cache_key = self.get_render_cache_key(
+          duration, sound_wave_type, wave_specific_options)
 
     sound_samples = array.array('h')
-    for sample_frame in range(num_samples):
-      sound_sample = sound_wave_function(sample_frame)
-      sound_samples.append(sound_sample)
+    cached_samples = self._get_cached_samples(render_cache_key)
+    if cached_samples is not None:
+      sound_samples.frombytes(cached_samples.tobytes())
+      return sound_samples
+
+    for sound_block in self.get_wave_sound_blocks(
+            duration, sound_wave_type, wave_specific_options):
+      sound_samples.frombytes(sound_block.tobytes())
+
+    if render_cache_key is not None:
+      self._render_cache.put(
+          render_cache_key, np.frombuffer(sound_samples, dtype=np.int16))
     return sound_samples
+
+  def get_parallel_wave_sound_samples(
+          self, duration: int, sound_wave_types: Sequence[SoundWaveType],
+          wave_specific_options: Optional[
+              Sequence[Optional[WaveOptions]]] = None,
+          max_workers: Optional[int] = None,
+          segment_size: Optional[int] = None
+  ) -> List[array.array]:
+    """Gets the sound wave values of many channels, using many processes.
+
+    Each channel is split into segments of frames that are rendered by a pool
+    of processes and stitched back in order. Channels in the render cache are
+    not rendered. Frames are rendered by their
+    absolute position, so waves keep their phase across segments. Seeded
+    random waves give the same values for any number of workers. Random waves
+    without seed use the global random module, so they are rendered in this
+    process, in channel order, to give the same values as rendering serially.
+
+    Args:
+      duration: Duration of the sound waves.
+      sound_wave_types: Type of sound wave to generate for each channel.
+      wave_specific_options: Modifiers to the wave of each channel.
+      max_workers: Max number of processes. Defaults to the number of CPUs.
+      segment_size: Number of frames per segment.
+
+    Raises:
+      ValueError: Must provide as many wave options as wave types.
+
+    Returns:
+      Values generated by requested sound waves, one array per channel.
+    """
+    wave_specific_options = (
+        wave_specific_options or [None] * len(sound_wave_types))
+    if len(wave_specific_options) != len(sound_wave_types):
+      raise ValueError('Must provide wave options for each wave type.')
+    segment_size = segment_size or wave_settings.PARALLEL_SEGMENT_SIZE
+
+    channels_data = [array.array('h') for _ in sound_wave_types]
+    # Segments to render in parallel, as (channel, wave type, options, frames).
+    segment_tasks = []
+    serial_channels = []
+    # Content keys of the channels to cache once rendered, by channel.
+    render_cache_keys = {}
+    for channel, (sound_wave_type, channel_options) in enumerate(
+            zip(sound_wave_types, wave_specific_options)):
+      if self._render_cache is not None:
+        render_cache_key = self.get_render_cache_key(
+            duration, sound_wave_type, channel_options)
+        cached_samples = self._get_cached_samples(render_cache_key)
+        if cached_samples is not None:
+          channels_data[channel].frombytes(cached_samples.tobytes())
+          continue
+        if render_cache_key is not None:
+          render_cache_keys[channel] = render_cache_key
+
+      wave_spec = self.get_wave_spec(channel_options)
+      if (sound_wave_type == SoundWaveType.RANDOM_WAVE and
+              wave_spec.seed is None):
+        serial_channels.append(channel)
+        continue
+      num_samples = int(duration * wave_spec.sample_rate)
+      for start_frame in range(0, num_samples, segment_size):
+        end_frame = min(start_frame + segment_size, num_samples)
+        segment_tasks.append(
+            (channel, sound_wave_type, channel_options, start_frame,
+             end_frame))
+
+    if max_workers == 1 or len(segment_tasks) <= 1:
+      for channel, sound_wave_type, channel_options, start_frame, end_frame in (
+              segment_tasks):
+        with wave_instrumentation.channel(channel):
+          for segment_block in self._get_wave_sound_segment_blocks(
+                  sound_wave_type, channel_options, start_frame, end_frame):
+            channels_data[channel].frombytes(segment_block.tobytes())
+      for channel in serial_channels:
+        with wave_instrumentation.channel(channel):
+          channels_data[channel] = self.get_wave_sound_samples(
+              duration, sound_wave_types[channel],
+              wave_specific_options[channel])
+      self._cache_channels_data(channels_data, render_cache_keys)
+      return channels_data
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=_get_render_process_context(),
+            initializer=_init_render_worker,
+            initargs=(self,)) as executor:
+      segment_futures = [
+          (channel, executor.submit(
+              _render_wave_segment, sound_wave_type, channel_options,
+              start_frame, end_frame))
+          for channel, sound_wave_type, channel_options, start_frame, end_frame
+          in segment_tasks]
+
+      # Workers keep rendering while random waves are rendered here.
+      for channel in serial_channels:
+        with wave_instrumentation.channel(channel):
+          channels_data[channel] = self.get_wave_sound_samples(
+              duration, sound_wave_types[channel],
+              wave_specific_options[channel])
+
+      profiler = wave_instrumentation.get_profiler()
+      for channel, segment_future in segment_futures:
+        segment_data = segment_future.result()
+        channels_data[channel].frombytes(segment_data)
+        if profiler is not None:
+          # Workers measure in their own process, so only frames are known.
+          profiler.count(
+              wave_instrumentation.Stage.SYNTHESIS,
+              wave_instrumentation.Counter.FRAMES,
+              len(segment_data) // wave_settings.BYTES_OF_DATA,
+              channel=channel)
+    self._cache_channels_data(channels_data, render_cache_keys)
+    return channels_data
+
+  def _cache_channels_data(
+          self, channels_data: Sequence[array.array],
+          render_cache_keys: Mapping[int, Text]):
+    """Puts rendered channels into the render cache.
+
+    Args:
+      channels_data: Samples of each channel.
+      render_cache_keys: Content key of the channels to cache, by channel.
+    """
+    for channel, render_cache_key in render_cache_keys.items():
+      self._render_cache.put(
+          render_cache_key,
+          np.frombuffer(channels_data[channel], dtype=np.int16))
@@ -0,0 +1,216 @@
+"""Tests that rendered sound waves do not depend on how they are computed."""
+
+import array
+import math
+import numpy as np
+import unittest
+import wave_generator
+import wave_math
+from typing import Optional, Text
+
+
+# Duration of the compared waves, in seconds.
+_DURATION = 1
+# Duration of the waves also rendered one frame at a time, in seconds.
+_FRAME_DURATION = 0.25
+# Frames per block of the renders split into many blocks.
+_SMALL_BLOCK_SIZE = 1000
+# Seed of the compared random waves.
+_SEED = 1234
+# Custom wave formulas compared, with ints, floats, math and large values.
+_CUSTOM_WAVE_FORMULAS = (
+    '{max_sample} * math.sin(2 * math.pi * {x} / {samples_per_cycle})',
+    '{x} % {samples_per_cycle} * {sample_range} // {samples_per_cycle}'
+    ' + {min_sample}',
+    '({x} ** 3 - {x} * 7) % 65536 - 32768',
+    'abs({x} % 200 - 100) * 300.5 - 15000',
+)
+
+
+class RenderModeTest(unittest.TestCase):
+  """Compares the render modes with each other and the per-frame generator.
+
+  Methods:
+    test_wave_types: Every wave type gives the same samples in every mode.
+    test_band_limited_wave_types: Band-limited waves are equal in every mode.
+    test_custom_wave_formulas: Custom formulas give the samples of eval.
+    test_periodic_waves: Sin and x**2 waves give the original samples.
+  """
+
+  def setUp(self):
+    self._wave_sound_generator = wave_generator.WaveSoundGenerator()
+    self._sample_rate = self._wave_sound_generator.get_wave_spec(
+        None).sample_rate
+
+  def _get_frame_samples(
+          self, sound_wave_type: wave_generator.SoundWaveType,
+          wave_options: wave_generator.WaveOptions) -> array.array:
+    """Gets the samples of a wave function, one frame at a time.
+
+    Args:
+      sound_wave_type: Type of sound wave to generate.
+      wave_options: Modifiers to the wave.
+
+    Returns:
+      Int16 samples, as the original get_wave_sound_samples gave them.
+    """
+    sound_wave_function = self._wave_sound_generator.get_wave_function(
+        sound_wave_type, wave_options)
+    sound_samples = array.array('h')
+    for sample_frame in range(int(_FRAME_DURATION * self._sample_rate)):
+      sound_samples.append(sound_wave_function(sample_frame))
+    return sound_samples
+
+  def _assert_same_samples(
+          self, sound_wave_type: wave_generator.SoundWaveType,
+          wave_options: Optional[wave_generator.WaveOptions] = None
+  ) -> np.ndarray:
+    """Asserts that every render mode gives the per-frame samples.
+
+    Each mode renders the wave whole and in many small blocks.
+
+    Args:
+      sound_wave_type: Type of sound wave to generate.
+      wave_options: Modifiers to the wave.
+
+    Returns:
+      Int16 samples of the wave.
+    """
+    wave_options = dict(wave_options or {})
+    expected_samples = np.array(
+        self._get_frame_samples(sound_wave_type, wave_options),
+        dtype=np.int16)
+    for render_mode in wave_generator.RenderMode:
+      wave_options[wave_generator.SoundWaveOption.RENDER_MODE] = render_mode
+      sound_samples = self._wave_sound_generator.get_wave_sound_samples(
+          _FRAME_DURATION, sound_wave_type, wave_options)
+      np.testing.assert_array_equal(
+          np.array(sound_samples, dtype=np.int16), expected_samples,
+          err_msg=f'{sound_wave_type} in {render_mode}')
+      sound_blocks = self._wave_sound_generator.get_wave_sound_blocks(
+          _FRAME_DURATION, sound_wave_type, wave_options, _SMALL_BLOCK_SIZE)
+      np.testing.assert_array_equal(
+          np.concatenate(list(sound_blocks)), expected_samples,
+          err_msg=f'{sound_wave_type} in {render_mode}, in small blocks')
+    return expected_samples
+
+  def _get_original_samples(self, sample_formula: Text) -> np.ndarray:
+    """Gets the samples of a formula evaluated as the original generator did.
+
+    Args:
+      sample_formula: Formula template of the sample of each frame.
+
+    Returns:
+      Int16 samples of the formula, limited to the default range.
+    """
+    wave_spec = self._wave_sound_generator.get_wave_spec(None)
+    sound_samples = []
+    for sample_frame in range(int(_FRAME_DURATION * self._sample_rate)):
+      sample_value = eval(sample_formula.format(
+          x=sample_frame,
+          min_sample=wave_spec.min_sample_value,
+          max_sample=wave_spec.max_sample_value,
+          sample_range=wave_spec.sample_value_range,
+          samples_per_cycle=wave_spec.samples_per_cycle,
+      ), {'math': math})
+      sound_samples.append(int(wave_math.limit_value_to_range(
+          sample_value, wave_spec.min_sample_value,
+          wave_spec.max_sample_value)))
+    return np.array(sound_samples, dtype=np.int16)
+
+  def test_wave_types(self):
+    for sound_wave_type in wave_generator.SoundWaveType:
+      wave_options = {wave_generator.SoundWaveOption.SEED: _SEED}
+      if sound_wave_type == wave_generator.SoundWaveType.CUSTOM_WAVE:
+        wave_options[wave_generator.SoundWaveOption.CUSTOM_WAVE_FORMULA] = (
+            _CUSTOM_WAVE_FORMULAS[0])
+      self._assert_same_samples(sound_wave_type, wave_options)
+
+  def test_band_limited_wave_types(self):
+    for sound_wave_type in wave_generator.PHASE_WAVE_TYPES:
+      self._assert_same_samples(sound_wave_type, {
+          wave_generator.SoundWaveOption.BAND_LIMITED: True,
+          wave_generator.SoundWaveOption.FREQUENCY: 1000,
+      })
+
+  def test_custom_wave_formulas(self):
+    for custom_wave_formula in _CUSTOM_WAVE_FORMULAS:
+      sound_samples = self._assert_same_samples(
+          wave_generator.SoundWaveType.CUSTOM_WAVE, {
+              wave_generator.SoundWaveOption.CUSTOM_WAVE_FORMULA: (
+                  custom_wave_formula),
+          })
+      np.testing.assert_array_equal(
+          sound_samples, self._get_original_samples(custom_wave_formula))
+
+  def test_periodic_waves(self):
+    wave_spec = self._wave_sound_generator.get_wave_spec(None)
+    sin_samples = self._assert_same_samples(
+        wave_generator.SoundWaveType.SIN_WAVE)
+    np.testing.assert_array_equal(sin_samples, self._get_original_samples(
+        '{max_sample} * math.sin(2 * math.pi * '
+        '(({x} % {samples_per_cycle}) / {samples_per_cycle}))'))
+    x2_samples = self._assert_same_samples(
+        wave_generator.SoundWaveType.X2_WAVE)
+    a = 4 * (wave_spec.max_sample_value - wave_spec.min_sample_value) / (
+        wave_spec.samples_per_cycle ** 2)
+    np.testing.assert_array_equal(x2_samples, self._get_original_samples(
+        f'{a!r} * (({{x}} % {{samples_per_cycle}} + '
+        f'-{{samples_per_cycle}} / 2) ** 2) + {{min_sample}}'))
+
+
+class ParallelRenderTest(unittest.TestCase):
+  """Compares serial and parallel renders of seeded waves.
+
+  Methods:
+    test_seeded_random_any_workers: Any number of workers gives the samples.
+    test_seeded_random_any_segment_size: Any segment size gives the samples.
+    test_seeded_random_per_frame: Per-frame and block samples are equal.
+  """
+
+  def setUp(self):
+    self._wave_sound_generator = wave_generator.WaveSoundGenerator()
+    self._wave_options = {wave_generator.SoundWaveOption.SEED: _SEED}
+    self._expected_samples = self._render_parallel(1)
+
+  def _render_parallel(
+          self, max_workers: int, segment_size: int = 10000) -> np.ndarray:
+    """Renders a seeded random wave and a sin wave in parallel.
+
+    Args:
+      max_workers: Max number of processes.
+      segment_size: Number of frames per segment.
+
+    Returns:
+      Int16 samples of both channels, one row per channel.
+    """
+    channels_data = (
+        self._wave_sound_generator.get_parallel_wave_sound_samples(
+            _DURATION, [
+                wave_generator.SoundWaveType.RANDOM_WAVE,
+                wave_generator.SoundWaveType.SIN_WAVE,
+            ], [self._wave_options, None], max_workers, segment_size))
+    return np.array(channels_data, dtype=np.int16)
+
+  def test_seeded_random_any_workers(self):
+    for max_workers in (2, 4):
+      np.testing.assert_array_equal(
+          self._render_parallel(max_workers), self._expected_samples)
+
+  def test_seeded_random_any_segment_size(self):
+    for segment_size in (1000, 4096, 5000):
+      np.testing.assert_array_equal(
+          self._render_parallel(3, segment_size), self._expected_samples)
+
+  def test_seeded_random_per_frame(self):
+    wave_options = dict(self._wave_options)
+    wave_options[wave_generator.SoundWaveOption.RENDER_MODE] = (
+        wave_generator.RenderMode.PER_FRAME)
+    random_samples = self._wave_sound_generator.get_wave_sound_samples(
+        _DURATION, wave_generator.SoundWaveType.RANDOM_WAVE, wave_options)
+    np.testing.assert_array_equal(
+        np.array(random_samples, dtype=np.int16), self._expected_samples[0])
+
+
+if __name__ == '__main__':
+  unittest.main()
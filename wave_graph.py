@@ -0,0 +1,481 @@
+"""Builds sound waves as lazy graphs of signal nodes.
+
+Nodes only describe signals; nothing is computed until a SignalGraph of
+them is rendered or written:
+
+  generator = wave_generator.WaveSoundGenerator()
+  tone = wave_graph.wave(generator, wave_generator.SoundWaveType.SIN_WAVE)
+  hum = wave_graph.gain(tone, 0.5)
+  graph = wave_graph.SignalGraph([
+      wave_graph.mix([hum, wave_graph.transform(tone, [
+          wave_transformer.FadeIn(4410)])]),
+  ])
+  graph.write(3, {wave_creator.SoundFileOption.FILE_NAME: 'sound.wav'})
+
+The graph is evaluated block by block, so no buffer is longer than a block
+whatever the duration. Chains of transforms and gains are fused into a
+single transformer pipeline that works in place on the block of their
+input, and equal subgraphs, e.g. the same wave built twice, are computed
+once per block however many nodes use them. Values stay floating point
+between nodes, and are clipped and truncated to int16 once, at the outputs.
+"""
+
+import numpy as np
+import wave_creator
+import wave_generator
+import wave_instrumentation
+import wave_mixer
+import wave_settings
+import wave_transformer
+import wave_writer
+from typing import Dict, Hashable, Iterator, List, Optional, Sequence
+
+
+class SignalNode(object):
+  """Signal of a graph, computed only when the graph is rendered.
+
+  Methods:
+    inputs: Nodes whose signals this node is computed from.
+    get_key: Identity of the signal, for computing equal nodes once.
+  """
+
+  @property
+  def inputs(self) -> Sequence['SignalNode']:
+    """Nodes whose signals this node is computed from."""
+    return ()
+
+  def get_key(self, input_signals: Sequence[Hashable]) -> Optional[Hashable]:
+    """Gets the identity of the signal of the node.
+
+    Args:
+      input_signals: Identity of the signal of each input, not its key.
+        Inputs computing the same signal have the same identity, and inputs
+        without key have one of their own.
+
+    Returns:
+      Key equal for nodes that compute the same signal, or None if the node
+      is only equal to itself.
+    """
+    return None
+
+
+class WaveNode(SignalNode):
+  """Sound wave of a WaveSoundGenerator."""
+
+  def __init__(
+          self, wave_sound_generator: wave_generator.WaveSoundGenerator,
+          sound_wave_type: wave_generator.SoundWaveType,
+          wave_specific_options: Optional[wave_generator.WaveOptions] = None):
+    """Instantiates a WaveNode.
+
+    Args:
+      wave_sound_generator: Generator of the sound wave.
+      sound_wave_type: Type of sound wave to generate.
+      wave_specific_options: Modifiers to the specific wave.
+    """
+    self.wave_sound_generator = wave_sound_generator
+    self.sound_wave_type = sound_wave_type
+    self.wave_specific_options = wave_specific_options
+
+  def get_wave_spec(self) -> wave_generator.WaveSpec:
+    """Gets the resolved options of the wave."""
+    return self.wave_sound_generator.get_wave_spec(self.wave_specific_options)
+
+  def get_key(self, input_signals: Sequence[Hashable]) -> Optional[Hashable]:
+    wave_spec = self.get_wave_spec()
+    # Unseeded random waves differ every time they are rendered.
+    if (self.sound_wave_type == wave_generator.SoundWaveType.RANDOM_WAVE and
+            wave_spec.seed is None):
+      return None
+    return ('wave', self.sound_wave_type, wave_spec)
+
+
+class TransformNode(SignalNode):
+  """Signal of another node, transformed by a pipeline of stages."""
+
+  def __init__(
+          self, input_node: SignalNode,
+          pipeline: wave_transformer.TransformerPipeline):
+    """Instantiates a TransformNode.
+
+    Args:
+      input_node: Node to transform.
+      pipeline: Stages to transform it with.
+    """
+    self.input_node = input_node
+    self.pipeline = pipeline
+
+  @property
+  def inputs(self) -> Sequence[SignalNode]:
+    return (self.input_node,)
+
+  def get_key(self, input_signals: Sequence[Hashable]) -> Optional[Hashable]:
+    pipeline_key = self.pipeline.cache_key
+    if pipeline_key is None:
+      return None
+    return ('transform', input_signals[0], pipeline_key)
+
+
+class MixNode(SignalNode):
+  """Signals of other nodes, added or averaged into one."""
+
+  def __init__(
+          self, input_nodes: Sequence[SignalNode],
+          mix_mode: wave_mixer.MixMode = wave_mixer.MixMode.AVERAGE,
+          gains: Optional[Sequence[float]] = None):
+    """Instantiates a MixNode.
+
+    Args:
+      input_nodes: Nodes to mix.
+      mix_mode: How nodes are mixed, AVERAGE or SUM.
+      gains: Gain of each node. Defaults to 1 for every node.
+
+    Raises:
+      ValueError: Must provide at least one node, a mix mode into a single
+        signal and one gain per node.
+    """
+    if not input_nodes:
+      raise ValueError('Must provide at least one node to mix.')
+    if mix_mode not in (wave_mixer.MixMode.AVERAGE, wave_mixer.MixMode.SUM):
+      raise ValueError(f'Cannot mix nodes into one signal with {mix_mode}.')
+    if gains is not None and len(gains) != len(input_nodes):
+      raise ValueError(
+          f'Expected {len(input_nodes)} gains, got {len(gains)}.')
+    self.input_nodes = tuple(input_nodes)
+    self.mix_mode = mix_mode
+    gains = gains or [1.0] * len(input_nodes)
+    if mix_mode == wave_mixer.MixMode.AVERAGE:
+      gains = [gain / len(input_nodes) for gain in gains]
+    self.gains = tuple(float(gain) for gain in gains)
+
+  @property
+  def inputs(self) -> Sequence[SignalNode]:
+    return self.input_nodes
+
+  def get_key(self, input_signals: Sequence[Hashable]) -> Optional[Hashable]:
+    return ('mix', tuple(input_signals), self.gains)
+
+
+def wave(
+        wave_sound_generator: wave_generator.WaveSoundGenerator,
+        sound_wave_type: wave_generator.SoundWaveType,
+        wave_specific_options: Optional[wave_generator.WaveOptions] = None
+) -> WaveNode:
+  """Gets a node of a sound wave.
+
+  Args:
+    wave_sound_generator: Generator of the sound wave.
+    sound_wave_type: Type of sound wave to generate.
+    wave_specific_options: Modifiers to the specific wave.
+
+  Returns:
+    Wave node.
+  """
+  return WaveNode(wave_sound_generator, sound_wave_type, wave_specific_options)
+
+
+def transform(
+        input_node: SignalNode,
+        stages: Sequence[wave_transformer.TransformerStage]) -> TransformNode:
+  """Gets a node that transforms another node.
+
+  Args:
+    input_node: Node to transform.
+    stages: Stages to apply, in order.
+
+  Raises:
+    ValueError: Stages must be TransformerStages.
+
+  Returns:
+    Transform node.
+  """
+  return TransformNode(
+      input_node, wave_transformer.TransformerPipeline(stages))
+
+
+def gain(input_node: SignalNode, factor: float) -> TransformNode:
+  """Gets a node that multiplies another node by a factor.
+
+  Args:
+    input_node: Node to scale.
+    factor: Factor to multiply the node by.
+
+  Returns:
+    Transform node.
+  """
+  return transform(input_node, [wave_transformer.Gain(factor)])
+
+
+def mix(
+        input_nodes: Sequence[SignalNode],
+        mix_mode: wave_mixer.MixMode = wave_mixer.MixMode.AVERAGE,
+        gains: Optional[Sequence[float]] = None) -> MixNode:
+  """Gets a node that mixes other nodes into one.
+
+  Args:
+    input_nodes: Nodes to mix.
+    mix_mode: How nodes are mixed, AVERAGE or SUM.
+    gains: Gain of each node. Defaults to 1 for every node.
+
+  Raises:
+    ValueError: Must provide at least one node, a mix mode into a single
+      signal and one gain per node.
+
+  Returns:
+    Mix node.
+  """
+  return MixNode(input_nodes, mix_mode, gains)
+
+
+class _Step(object):
+  """Computation of one distinct node of a graph, for every block.
+
+  Methods:
+    node: Node computed.
+    inputs: Steps whose blocks the node is computed from.
+    in_place: Whether the step works on the buffer of its input.
+    pipeline: Fused pipeline of transform steps.
+    wave_block_function: Block function of wave steps.
+    buffer: Float64 values of the current block.
+  """
+
+  def __init__(self, node: SignalNode, inputs: Sequence['_Step']):
+    """Instantiates a _Step.
+
+    Args:
+      node: Node computed.
+      inputs: Steps of the inputs of the node.
+    """
+    self.node = node
+    self.inputs = list(inputs)
+    self.in_place = False
+    self.pipeline = None
+    self.wave_block_function = None
+    self.buffer = None
+
+
+class SignalGraph(object):
+  """Output signals of a graph of nodes, rendered block by block.
+
+  Methods:
+    sample_rate: Number of frames per second of the signals.
+    number_steps: Number of node computations per block.
+    get_blocks: Renders the outputs block by block.
+    render: Renders the outputs whole.
+    write: Renders the outputs into a sound file.
+  """
+
+  def __init__(self, outputs: Sequence[SignalNode]):
+    """Instantiates a SignalGraph, planning its evaluation.
+
+    No signal is computed until the graph is rendered.
+
+    Args:
+      outputs: Nodes of each output channel.
+
+    Raises:
+      ValueError: Must provide at least one output, and waves of the same
+        sample rate.
+    """
+    if not outputs:
+      raise ValueError('Must provide at least one output node.')
+    self._steps = []
+    steps_by_key = {}
+    steps_by_node = {}
+    for output in outputs:
+      self._add_steps(output, steps_by_key, steps_by_node)
+    self._output_steps = [steps_by_node[id(output)] for output in outputs]
+
+    sample_rates = {
+        step.node.get_wave_spec().sample_rate for step in self._steps
+        if isinstance(step.node, WaveNode)}
+    if len(sample_rates) != 1:
+      raise ValueError('All waves of a graph must have the same sample rate.')
+    self._sample_rate = sample_rates.pop()
+    self._fuse_transforms()
+    self._gained_buffer = None
+
+  def _add_steps(
+          self, node: SignalNode, steps_by_key: Dict[Hashable, _Step],
+          steps_by_node: Dict[int, _Step]) -> _Step:
+    """Adds the steps of a node and its inputs, once per distinct signal.
+
+    Args:
+      node: Node to compute.
+      steps_by_key: Step of each node key so far.
+      steps_by_node: Step of each node so far, by id.
+
+    Returns:
+      Step that computes the node.
+    """
+    if id(node) in steps_by_node:
+      return steps_by_node[id(node)]
+    input_steps = [
+        self._add_steps(input_node, steps_by_key, steps_by_node)
+        for input_node in node.inputs]
+    # Input steps identify the signals of inputs, keyed or not: each step
+    # computes one distinct signal.
+    node_key = node.get_key(input_steps)
+    step = steps_by_key.get(node_key) if node_key is not None else None
+    if step is None:
+      step = _Step(node, input_steps)
+      self._steps.append(step)
+      if node_key is not None:
+        steps_by_key[node_key] = step
+    steps_by_node[id(node)] = step
+    return step
+
+  def _fuse_transforms(self):
+    """Merges chains of transforms and decides which work in place."""
+    consumers = {id(step): 0 for step in self._steps}
+    for step in self._steps:
+      for input_step in step.inputs:
+        consumers[id(input_step)] += 1
+    for output_step in self._output_steps:
+      consumers[id(output_step)] += 1
+
+    fused_steps = []
+    for step in self._steps:
+      if isinstance(step.node, TransformNode):
+        stages = list(step.node.pipeline.stages)
+        input_step = step.inputs[0]
+        # Transforms that only feed this one are applied along with it.
+        while (isinstance(input_step.node, TransformNode) and
+               consumers[id(input_step)] == 1):
+          fused_steps.remove(input_step)
+          stages = list(input_step.pipeline.stages) + stages
+          input_step = input_step.inputs[0]
+        step.inputs = [input_step]
+        step.pipeline = wave_transformer.TransformerPipeline(stages)
+        step.in_place = consumers[id(input_step)] == 1
+      fused_steps.append(step)
+    self._steps = fused_steps
+
+  @property
+  def sample_rate(self) -> int:
+    """Number of frames per second of the signals."""
+    return self._sample_rate
+
+  @property
+  def number_steps(self) -> int:
+    """Number of node computations per block, after fusing and sharing."""
+    return len(self._steps)
+
+  def _prepare_steps(self, block_size: int):
+    """Builds the wave functions and block buffers of the steps.
+
+    Args:
+      block_size: Max number of frames per block.
+    """
+    with wave_instrumentation.measure(wave_instrumentation.Stage.SETUP):
+      for step in self._steps:
+        if isinstance(step.node, WaveNode):
+          step.wave_block_function = (
+              step.node.wave_sound_generator.get_wave_block_function(
+                  step.node.sound_wave_type,
+                  step.node.wave_specific_options))
+        if not step.in_place:
+          step.buffer = np.empty(block_size, dtype=np.float64)
+      self._gained_buffer = np.empty(block_size, dtype=np.float64)
+
+  def _evaluate_step(self, step: _Step, sample_frames: np.ndarray):
+    """Computes the block of a step, after the blocks of its inputs.
+
+    Args:
+      step: Step to compute.
+      sample_frames: Frames of the block.
+    """
+    number_frames = len(sample_frames)
+    if isinstance(step.node, WaveNode):
+      with wave_instrumentation.measure(
+              wave_instrumentation.Stage.SYNTHESIS) as counters:
+        step.buffer[:number_frames] = step.wave_block_function(sample_frames)
+        counters[wave_instrumentation.Counter.FRAMES] += number_frames
+      return
+
+    if isinstance(step.node, TransformNode):
+      input_step = step.inputs[0]
+      if step.in_place:
+        step.buffer = input_step.buffer
+      else:
+        step.buffer[:number_frames] = input_step.buffer[:number_frames]
+      with wave_instrumentation.measure(
+              wave_instrumentation.Stage.TRANSFORMER):
+        step.pipeline.apply(step.buffer[:number_frames], sample_frames)
+      return
+
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.MIXDOWN) as counters:
+      mixed_values = step.buffer[:number_frames]
+      mixed_values.fill(0)
+      for input_step, input_gain in zip(step.inputs, step.node.gains):
+        input_values = input_step.buffer[:number_frames]
+        if input_gain != 1:
+          input_values = np.multiply(
+              input_values, input_gain,
+              out=self._gained_buffer[:number_frames])
+        np.add(mixed_values, input_values, out=mixed_values)
+      counters[wave_instrumentation.Counter.FRAMES] += number_frames
+
+  def get_blocks(
+          self, duration: float,
+          block_size: int = wave_settings.RENDER_BLOCK_SIZE
+  ) -> Iterator[List[np.ndarray]]:
+    """Renders the outputs block by block, as they are read.
+
+    Args:
+      duration: Duration of the signals, in seconds.
+      block_size: Max number of frames per block.
+
+    Yields:
+      Int16 block of each output.
+    """
+    number_frames = int(duration * self._sample_rate)
+    self._prepare_steps(block_size)
+    for block_start in range(0, number_frames, block_size):
+      block_end = min(block_start + block_size, number_frames)
+      sample_frames = np.arange(block_start, block_end, dtype=np.int64)
+      for step in self._steps:
+        self._evaluate_step(step, sample_frames)
+      yield [
+          wave_mixer.limit_to_sample_range(
+              output_step.buffer[:block_end - block_start].copy())
+          for output_step in self._output_steps]
+
+  def render(self, duration: float) -> List[np.ndarray]:
+    """Renders the outputs whole.
+
+    Args:
+      duration: Duration of the signals, in seconds.
+
+    Returns:
+      Int16 samples of each output.
+    """
+    outputs_blocks = list(self.get_blocks(duration))
+    if not outputs_blocks:
+      return [np.zeros(0, dtype=np.int16) for _ in self._output_steps]
+    return [
+        np.concatenate(output_blocks)
+        for output_blocks in zip(*outputs_blocks)]
+
+  def write(
+          self, duration: float,
+          file_options: Optional[wave_creator.SoundFileOptions] = None,
+          block_size: int = wave_settings.RENDER_BLOCK_SIZE
+  ) -> wave_writer.WavWriter:
+    """Renders the outputs into a sound file, one channel each.
+
+    Args:
+      duration: Duration of the sound, in seconds.
+      file_options: File configuration.
+      block_size: Number of frames per block.
+
+    Returns:
+      Sound file.
+    """
+    with wave_creator.SoundFileWriter(
+            self._sample_rate, len(self._output_steps),
+            file_options) as sound_writer:
+      for outputs_block in self.get_blocks(duration, block_size):
+        sound_writer.write_block(outputs_block)
+    return sound_writer.sound_file
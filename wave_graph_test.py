@@ -0,0 +1,56 @@
+"""Tests that signal graphs fuse transform chains and share subgraphs."""
+
+import numpy as np
+import unittest
+import wave_generator
+import wave_graph
+import wave_transformer
+
+
+# Duration of the rendered graphs, in seconds.
+_DURATION = 1
+
+
+class SignalGraphTest(unittest.TestCase):
+  """Checks the steps planned by SignalGraph.
+
+  Methods:
+    test_chained_output_is_fused: Transforms ending at an output are fused.
+    test_chained_output_samples: Fused transforms give the unfused samples.
+    test_shared_subgraph_is_computed_once: Equal waves are one step.
+  """
+
+  def setUp(self):
+    self._wave_sound_generator = wave_generator.WaveSoundGenerator()
+
+  def _wave(self) -> wave_graph.WaveNode:
+    """Gets a node of a sin wave."""
+    return wave_graph.wave(
+        self._wave_sound_generator, wave_generator.SoundWaveType.SIN_WAVE)
+
+  def test_chained_output_is_fused(self):
+    output = wave_graph.gain(wave_graph.gain(wave_graph.gain(
+        self._wave(), 0.5), 0.5), 2)
+    graph = wave_graph.SignalGraph([output])
+    self.assertEqual(graph.number_steps, 2)
+
+  def test_chained_output_samples(self):
+    output = wave_graph.transform(wave_graph.gain(self._wave(), 0.5), [
+        wave_transformer.DcOffset(100)])
+    [samples] = wave_graph.SignalGraph([output]).render(_DURATION)
+    [wave_samples] = wave_graph.SignalGraph([self._wave()]).render(_DURATION)
+    expected_samples = np.clip(
+        wave_samples.astype(np.float64) * 0.5 + 100, -32768, 32767)
+    np.testing.assert_array_equal(
+        samples, np.trunc(expected_samples).astype(np.int16))
+
+  def test_shared_subgraph_is_computed_once(self):
+    louder = wave_graph.gain(wave_graph.gain(self._wave(), 2), 2)
+    quieter = wave_graph.gain(self._wave(), 0.5)
+    graph = wave_graph.SignalGraph([louder, quieter, self._wave()])
+    # One wave, shared by the outputs, and one fused transform per branch.
+    self.assertEqual(graph.number_steps, 3)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,293 @@
+"""Opt-in timings and counters of the stages that create sound files.
+
+Nothing is measured unless a profiler is active:
+
+  with wave_instrumentation.profile() as profiler:
+    channels_data = wave_sound_generator.get_wave_sound_samples(...)
+    wave_creator.create_sound_file(...)
+  print(profiler.format_report())
+
+Instrumented code looks up the active profiler once per block or per wave
+function, so rendering costs the same as without instrumentation when no
+profiler is active.
+"""
+
+import contextlib
+import contextvars
+import enum
+import time
+from typing import (
+    Callable, ContextManager, Iterator, Mapping, MutableMapping,
+    NamedTuple, Optional, Text, Tuple)
+
+
+class Stage(enum.Enum):
+  """Represents a stage of creating a sound file."""
+  # Resolving options and building wave functions.
+  SETUP = 'setup'
+  # Computing samples. Includes the time in the wave transformer.
+  SYNTHESIS = 'synthesis'
+  # Calling the custom wave transformer.
+  TRANSFORMER = 'transformer'
+  # Converting channels to the sample rate of the file.
+  RESAMPLE = 'resample'
+  # Mixing channels into the file samples.
+  MIXDOWN = 'mixdown'
+  # Writing the sound file.
+  WRITE = 'write'
+  # Plotting the wave graph.
+  PLOT = 'plot'
+
+
+class Counter(enum.Enum):
+  """Represents a quantity counted during a stage."""
+  # Frames computed, mixed or plotted.
+  FRAMES = 'frames'
+  # Samples limited to the min or max sample value.
+  CLIPPED_SAMPLES = 'clipped_samples'
+  # Bytes of samples written to the sound file.
+  BYTES_WRITTEN = 'bytes_written'
+
+
+# Counters of a stage, by counter.
+Counters = MutableMapping[Counter, int]
+
+
+class StageEvent(NamedTuple):
+  """Measurement of one run of a stage, as given to profiler callbacks."""
+  stage: Stage
+  # Channel the stage ran for, or None if not for a specific channel.
+  channel: Optional[int]
+  seconds: float
+  counters: Mapping[Counter, int]
+
+
+class StageStats(object):
+  """Accumulated measurements of a stage.
+
+  Methods:
+    calls: Number of runs of the stage.
+    seconds: Total time of the runs.
+    counters: Total of each counter.
+  """
+
+  def __init__(self):
+    """Instantiates an empty StageStats."""
+    self.calls = 0
+    self.seconds = 0.0
+    self.counters = dict.fromkeys(Counter, 0)
+
+  def add(self, calls: int, seconds: float, counters: Mapping[Counter, int]):
+    """Adds measurements to the stats.
+
+    Args:
+      calls: Number of runs of the stage.
+      seconds: Time of the runs.
+      counters: Value of each counter.
+    """
+    self.calls += calls
+    self.seconds += seconds
+    for counter, value in counters.items():
+      self.counters[counter] += value
+
+
+class Profiler(object):
+  """Collects timings and counters of stages, per stage and channel.
+
+  Methods:
+    measure: Times a run of a stage.
+    add_run: Adds a run of a stage timed by the caller.
+    count: Adds to a counter of a stage, without timing it.
+    get_stats: Gets the stats of each stage and channel.
+    get_stage_stats: Gets the stats of a stage, for all channels.
+    format_report: Formats the stats as text.
+  """
+
+  def __init__(self, callback: Optional[Callable[[StageEvent], None]] = None):
+    """Instantiates a Profiler.
+
+    Args:
+      callback: Called with each measured run of a stage, as it ends.
+    """
+    self._callback = callback
+    self._stats = {}
+
+  def _get_stats(
+          self, stage: Stage, channel: Optional[int]) -> StageStats:
+    """Gets the stats of a stage and channel, creating them if needed."""
+    if channel is None:
+      channel = _CURRENT_CHANNEL.get()
+    stats_key = (stage, channel)
+    if stats_key not in self._stats:
+      self._stats[stats_key] = StageStats()
+    return self._stats[stats_key]
+
+  @contextlib.contextmanager
+  def measure(
+          self, stage: Stage,
+          channel: Optional[int] = None) -> Iterator[Counters]:
+    """Times a run of a stage.
+
+    Args:
+      stage: Stage that runs.
+      channel: Channel the stage runs for. Defaults to the current channel.
+
+    Yields:
+      Counters of the run, to add to.
+    """
+    if channel is None:
+      channel = _CURRENT_CHANNEL.get()
+    counters = dict.fromkeys(Counter, 0)
+    start_time = time.perf_counter()
+    try:
+      yield counters
+    finally:
+      elapsed_time = time.perf_counter() - start_time
+      self._get_stats(stage, channel).add(1, elapsed_time, counters)
+      if self._callback is not None:
+        self._callback(StageEvent(stage, channel, elapsed_time, counters))
+
+  def add_run(
+          self, stage: Stage, seconds: float, channel: Optional[int] = None):
+    """Adds a run of a stage timed by the caller.
+
+    For runs too short and many to report one by one, e.g. per frame, so the
+    callback is not called.
+
+    Args:
+      stage: Stage that ran.
+      seconds: Time of the run.
+      channel: Channel the stage ran for. Defaults to the current channel.
+    """
+    self._get_stats(stage, channel).add(1, seconds, {})
+
+  def count(
+          self, stage: Stage, counter: Counter, value: int,
+          channel: Optional[int] = None):
+    """Adds to a counter of a stage, without timing it.
+
+    Args:
+      stage: Stage the counter belongs to.
+      counter: Counter to add to.
+      value: Value to add.
+      channel: Channel the value is for. Defaults to the current channel.
+    """
+    self._get_stats(stage, channel).add(0, 0.0, {counter: value})
+
+  def get_stats(self) -> Mapping[Tuple[Stage, Optional[int]], StageStats]:
+    """Gets the stats of each stage and channel.
+
+    Returns:
+      Stats by stage and channel. Channel is None for stages that did not
+      run for a specific channel.
+    """
+    return dict(self._stats)
+
+  def get_stage_stats(self, stage: Stage) -> StageStats:
+    """Gets the stats of a stage, for all channels.
+
+    Args:
+      stage: Stage to get.
+
+    Returns:
+      Stats of the stage.
+    """
+    stage_stats = StageStats()
+    for (stats_stage, _), stats in self._stats.items():
+      if stats_stage == stage:
+        stage_stats.add(stats.calls, stats.seconds, stats.counters)
+    return stage_stats
+
+  def format_report(self) -> Text:
+    """Formats the stats of each stage and channel as text.
+
+    Returns:
+      One line per stage and channel.
+    """
+    lines = []
+    for stage in Stage:
+      channels = sorted(
+          (channel for stats_stage, channel in self._stats
+           if stats_stage == stage),
+          key=lambda channel: -1 if channel is None else channel)
+      for channel in channels:
+        stats = self._stats[(stage, channel)]
+        description = stage.value
+        if channel is not None:
+          description += f'[{channel}]'
+        counters = ', '.join(
+            f'{counter.value}={value}'
+            for counter, value in stats.counters.items() if value)
+        lines.append(
+            f'{description}: {stats.calls} calls, '
+            f'{stats.seconds * 1000:.1f} ms'
+            + (f', {counters}' if counters else ''))
+    return '\n'.join(lines)
+
+
+# Profiler that collects measurements, if any.
+_ACTIVE_PROFILER = contextvars.ContextVar('active_profiler', default=None)
+# Channel being processed, if any.
+_CURRENT_CHANNEL = contextvars.ContextVar('current_channel', default=None)
+
+# Counters of runs that are not measured. Written to, never read.
+_UNMEASURED_COUNTERS = dict.fromkeys(Counter, 0)
+
+
+def get_profiler() -> Optional[Profiler]:
+  """Gets the active profiler.
+
+  Returns:
+    Active profiler, or None if instrumentation is disabled.
+  """
+  return _ACTIVE_PROFILER.get()
+
+
+@contextlib.contextmanager
+def profile(
+        callback: Optional[Callable[[StageEvent], None]] = None
+) -> Iterator[Profiler]:
+  """Enables instrumentation within a context.
+
+  Args:
+    callback: Called with each measured run of a stage, as it ends.
+
+  Yields:
+    Profiler that collects the measurements.
+  """
+  profiler = Profiler(callback)
+  token = _ACTIVE_PROFILER.set(profiler)
+  try:
+    yield profiler
+  finally:
+    _ACTIVE_PROFILER.reset(token)
+
+
+@contextlib.contextmanager
+def channel(channel_number: int) -> Iterator[None]:
+  """Attributes the stages that run within a context to a channel.
+
+  Args:
+    channel_number: Index of the channel.
+  """
+  token = _CURRENT_CHANNEL.set(channel_number)
+  try:
+    yield
+  finally:
+    _CURRENT_CHANNEL.reset(token)
+
+
+def measure(stage: Stage) -> ContextManager[Counters]:
+  """Times a run of a stage, if a profiler is active.
+
+  Args:
+    stage: Stage that runs.
+
+  Returns:
+    Context manager giving the counters of the run, to add to. When no
+    profiler is active, counters are discarded and nothing is timed.
+  """
+  profiler = _ACTIVE_PROFILER.get()
+  if profiler is None:
+    return contextlib.nullcontext(_UNMEASURED_COUNTERS)
+  return profiler.measure(stage)
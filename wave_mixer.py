@@ -0,0 +1,142 @@
+"""Mixes sound samples of many channels."""
+
+import array
+import enum
+import numpy as np
+import wave_format
+import wave_instrumentation
+from typing import Optional, Sequence, Union
+
+
+class MixMode(enum.Enum):
+  """Represents how channels are mixed into the sound file."""
+  # Averages all channels into a single channel.
+  AVERAGE = 'average'
+  # Adds all channels into a single channel.
+  SUM = 'sum'
+  # Keeps each channel as its own channel, interleaving their frames.
+  INTERLEAVED = 'interleaved'
+
+
+# Sound samples of a channel, as an array or any sequence of int16 values.
+ChannelSamples = Union[array.array, np.ndarray, Sequence[int]]
+
+
+def get_number_output_channels(
+        mix_mode: MixMode, number_channels: int) -> int:
+  """Gets the number of channels that a mix outputs.
+
+  Args:
+    mix_mode: How channels are mixed.
+    number_channels: Number of channels to mix.
+
+  Raises:
+    ValueError: Unknown MixMode.
+
+  Returns:
+    Number of output channels.
+  """
+  if mix_mode in (MixMode.AVERAGE, MixMode.SUM):
+    return 1
+  if mix_mode == MixMode.INTERLEAVED:
+    return number_channels
+  raise ValueError(f'Unknown mix mode: {mix_mode}')
+
+
+def _get_channel_view(channel_samples: ChannelSamples) -> np.ndarray:
+  """Gets int16 samples of a channel without copying them when possible.
+
+  Args:
+    channel_samples: Samples of the channel.
+
+  Returns:
+    Int16 samples, sharing memory with the input if it is an int16 buffer.
+  """
+  if (isinstance(channel_samples, array.array) and
+          channel_samples.typecode == 'h'):
+    return np.frombuffer(channel_samples, dtype=np.int16)
+  return np.asarray(channel_samples, dtype=np.int16)
+
+
+def limit_to_sample_range(sample_values: np.ndarray) -> np.ndarray:
+  """Limits sample values to the sample range and converts them to int16.
+
+  Args:
+    sample_values: Float values of the samples. Clipped in place.
+
+  Returns:
+    Int16 samples, clipped and truncated towards zero.
+  """
+  min_value, max_value = wave_format.get_sample_range(
+      wave_format.WORKING_SAMPLE_FORMAT)
+  profiler = wave_instrumentation.get_profiler()
+  if profiler is not None:
+    profiler.count(
+        wave_instrumentation.Stage.MIXDOWN,
+        wave_instrumentation.Counter.CLIPPED_SAMPLES,
+        int(np.count_nonzero(
+            (sample_values > max_value) | (sample_values < min_value))))
+  np.clip(sample_values, min_value, max_value, out=sample_values)
+  # Casting truncates towards zero, as int() does.
+  return sample_values.astype(np.int16)
+
+
+def mix_channels(
+        channels_data: Sequence[ChannelSamples],
+        mix_mode: MixMode = MixMode.AVERAGE,
+        channel_gains: Optional[Sequence[float]] = None) -> np.ndarray:
+  """Mixes the samples of many channels.
+
+  Input samples are read in place. Gains are applied to each channel before
+  mixing, and the result is clipped once at the end.
+
+  Args:
+    channels_data: Int16 samples of each channel. All of the same length.
+    mix_mode: How channels are mixed.
+    channel_gains: Gain of each channel. Defaults to 1 for every channel.
+
+  Raises:
+    ValueError: Must provide at least one channel, all channels of the same
+      length and one gain per channel.
+
+  Returns:
+    Int16 mixed samples. Frames of interleaved channels are consecutive.
+  """
+  if not len(channels_data):
+    raise ValueError('Must provide samples for at least one channel.')
+  channels = [
+      _get_channel_view(channel_samples) for channel_samples in channels_data]
+  number_samples = len(channels[0])
+  if any(len(channel) != number_samples for channel in channels):
+    raise ValueError('All channels must have the same number of samples.')
+  if channel_gains is not None and len(channel_gains) != len(channels):
+    raise ValueError(
+        f'Expected {len(channels)} channel gains, got {len(channel_gains)}.')
+
+  if mix_mode == MixMode.INTERLEAVED:
+    mixed_samples = np.empty((number_samples, len(channels)), dtype=np.int16)
+    for channel_index, channel in enumerate(channels):
+      if channel_gains is None:
+        mixed_samples[:, channel_index] = channel
+      else:
+        mixed_samples[:, channel_index] = limit_to_sample_range(
+            channel * float(channel_gains[channel_index]))
+    return mixed_samples.reshape(-1)
+
+  if mix_mode not in (MixMode.AVERAGE, MixMode.SUM):
+    raise ValueError(f'Unknown mix mode: {mix_mode}')
+
+  if channel_gains is None:
+    sample_total = np.zeros(number_samples, dtype=np.int64)
+    for channel in channels:
+      sample_total += channel
+  else:
+    sample_total = np.zeros(number_samples, dtype=np.float64)
+    gained_channel = np.empty(number_samples, dtype=np.float64)
+    for channel, channel_gain in zip(channels, channel_gains):
+      np.multiply(channel, float(channel_gain), out=gained_channel)
+      sample_total += gained_channel
+
+  if mix_mode == MixMode.AVERAGE:
+    sample_total = sample_total / len(channels)
+  return limit_to_sample_range(sample_total)
@@ -0,0 +1,176 @@
+"""Generates white, pink and brown noise at any frame, from a seed.
+
+Noise is counter-based: the random values of a frame are a hash of the
+seed and the frame, so any segment of a noise can be generated on its own,
+in any order or process, and always gets the same values.
+
+Pink and brown noise are sums of octaves of white noise. Octave r draws a
+random value every 2^r frames and interpolates linearly between them, so it
+holds its power below sample_rate / 2^r. Giving every octave the same power
+makes the power of the sum fall by 3 dB per octave, pink noise, and doubling
+the power of each octave makes it fall by 6 dB per octave, brown noise.
+"""
+
+import enum
+import numpy as np
+import wave_cache
+from typing import Sequence
+
+# Multiplier of the Weyl sequence of splitmix64, the golden ratio * 2^64.
+_GOLDEN_GAMMA = 0x9E3779B97F4A7C15
+
+_MASK_64 = (1 << 64) - 1
+
+# Octaves of pink and brown noise. The lowest one changes every 2^15 frames,
+# below 1.5 Hz at 44100 Hz.
+_NOISE_OCTAVES = 16
+
+# RMS of pink and brown noise, relative to their max value. Values beyond
+# the max are clipped, about 1 in 15000 at 4 standard deviations.
+_COLORED_NOISE_RMS = 0.25
+
+# Weight of each octave, by noise color.
+_OCTAVE_WEIGHTS_CACHE = wave_cache.LruCache(4)
+
+
+class NoiseColor(enum.Enum):
+  """Represents how the power of a noise spreads over frequencies."""
+  # Same power at every frequency.
+  WHITE = 'white'
+  # Power falls by 3 dB per octave, the same power in every octave.
+  PINK = 'pink'
+  # Power falls by 6 dB per octave, as a random walk.
+  BROWN = 'brown'
+
+
+def _mix_bits(values: np.ndarray) -> np.ndarray:
+  """Scrambles 64-bit values with the finalizer of splitmix64.
+
+  Args:
+    values: Uint64 values. Modified in place.
+
+  Returns:
+    Uint64 scrambled values, each bit depending on every input bit.
+  """
+  values ^= values >> np.uint64(30)
+  values *= np.uint64(0xBF58476D1CE4E5B9)
+  values ^= values >> np.uint64(27)
+  values *= np.uint64(0x94D049BB133111EB)
+  values ^= values >> np.uint64(31)
+  return values
+
+
+def _get_stream_key(seed: int, stream: int) -> np.uint64:
+  """Gets the key of an independent stream of random values of a seed.
+
+  Args:
+    seed: Seed of the noise.
+    stream: Number of the stream, e.g. the octave.
+
+  Returns:
+    Key of the stream.
+  """
+  stream_key = np.array(
+      [(seed * _GOLDEN_GAMMA + stream) & _MASK_64], dtype=np.uint64)
+  return _mix_bits(stream_key)[0]
+
+
+def get_uniform_values(
+        seed: int, stream: int, counters: np.ndarray) -> np.ndarray:
+  """Gets uniform random values, one per counter.
+
+  Each value is the splitmix64 output of the stream key at the counter, so
+  it only depends on the seed, the stream and the counter.
+
+  Args:
+    seed: Seed of the noise.
+    stream: Number of the stream of values.
+    counters: Positions in the stream, e.g. frames.
+
+  Returns:
+    Float64 values from -1 to 1, excluding 1.
+  """
+  random_bits = np.asarray(counters, dtype=np.int64).astype(np.uint64)
+  random_bits *= np.uint64(_GOLDEN_GAMMA)
+  random_bits += _get_stream_key(seed, stream)
+  _mix_bits(random_bits)
+  # Top 53 bits give every float64 multiple of 2^-53 from 0 to 1.
+  uniform_values = (random_bits >> np.uint64(11)).astype(np.float64)
+  return uniform_values * 2.0 ** -52 - 1
+
+
+def _get_octave_weights(noise_color: NoiseColor) -> Sequence[float]:
+  """Gets the weight of each octave of a colored noise, from cache.
+
+  Weights are scaled so the noise has an RMS of _COLORED_NOISE_RMS.
+
+  Args:
+    noise_color: PINK or BROWN.
+
+  Returns:
+    Weight of each octave, from the one changing every frame on.
+  """
+  octave_weights = _OCTAVE_WEIGHTS_CACHE.get(noise_color)
+  if octave_weights is not None:
+    return octave_weights
+
+  octave_powers = {
+      NoiseColor.PINK: 1.0,
+      NoiseColor.BROWN: 2.0,
+  }[noise_color]
+  octave_weights = np.sqrt(octave_powers ** np.arange(_NOISE_OCTAVES))
+  # Uniform values from -1 to 1 have a variance of 1/3. Interpolating
+  # between two of them lowers it by (1-t)^2 + t^2 on average.
+  total_variance = 0
+  for octave, octave_weight in enumerate(octave_weights):
+    interpolation_steps = np.arange(2 ** octave) / 2 ** octave
+    total_variance += octave_weight ** 2 / 3 * np.mean(
+        (1 - interpolation_steps) ** 2 + interpolation_steps ** 2)
+  octave_weights *= _COLORED_NOISE_RMS / np.sqrt(total_variance)
+  octave_weights = tuple(octave_weights.tolist())
+
+  _OCTAVE_WEIGHTS_CACHE.put(noise_color, octave_weights)
+  return octave_weights
+
+
+def get_noise_values(
+        noise_color: NoiseColor, seed: int,
+        sample_frames: np.ndarray) -> np.ndarray:
+  """Gets the noise values of some frames.
+
+  Args:
+    noise_color: Color of the noise.
+    seed: Seed of the noise.
+    sample_frames: Non-negative frames to get the noise of.
+
+  Raises:
+    ValueError: Unknown NoiseColor.
+
+  Returns:
+    Float64 values from -1 to 1, one per frame.
+  """
+  sample_frames = np.asarray(sample_frames, dtype=np.int64)
+  if noise_color == NoiseColor.WHITE:
+    return get_uniform_values(seed, 0, sample_frames)
+  if noise_color not in (NoiseColor.PINK, NoiseColor.BROWN):
+    raise ValueError(f'Unknown noise color: {noise_color}')
+
+  noise_values = np.zeros(len(sample_frames), dtype=np.float64)
+  if not len(sample_frames):
+    return noise_values
+  for octave, octave_weight in enumerate(_get_octave_weights(noise_color)):
+    # Random values of the octave at every point around the frames.
+    point_indexes = sample_frames >> octave
+    first_point = int(point_indexes.min())
+    point_values = get_uniform_values(
+        seed, octave,
+        np.arange(first_point, int(point_indexes.max()) + 2, dtype=np.int64))
+    point_indexes -= first_point
+    interpolation_steps = (
+        (sample_frames & ((1 << octave) - 1)) / (1 << octave))
+    start_values = point_values[point_indexes]
+    noise_values += octave_weight * (
+        start_values + interpolation_steps *
+        (point_values[point_indexes + 1] - start_values))
+  np.clip(noise_values, -1, 1, out=noise_values)
+  return noise_values
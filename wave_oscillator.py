@@ -0,0 +1,288 @@
+"""Oscillators that accumulate phase, for exact and swept frequencies.
+
+Wave functions of wave_generator repeat a whole number of frames per cycle,
+so frequencies that do not divide the sample rate are detuned, e.g. 440 Hz
+plays as 441 Hz at 44100 Hz. Oscillators advance a floating point phase by
+frequency / sample_rate every frame instead, so any frequency plays in tune,
+and the frequency can change on every frame.
+"""
+
+import array
+import math
+import numpy as np
+import wave_generator
+import wave_settings
+from typing import Callable, Iterator, Optional, Sequence, Tuple, Union
+
+
+# A frequency envelope takes times in seconds and outputs their frequencies.
+FrequencyEnvelope = Callable[[np.ndarray], np.ndarray]
+
+# Frequency of an oscillator: constant, one per frame, or an envelope.
+Frequency = Union[float, Sequence[float], np.ndarray, FrequencyEnvelope]
+
+
+def _get_sin_values(
+        wave_spec: wave_generator.WaveSpec, phases: np.ndarray) -> np.ndarray:
+  """Gets the values of the sin wave at some phases."""
+  return wave_spec.max_sample_value * np.sin(2 * math.pi * phases)
+
+
+def _get_x2_values(
+        wave_spec: wave_generator.WaveSpec, phases: np.ndarray) -> np.ndarray:
+  """Gets the values of the x**2 wave at some phases.
+
+  Same parabola as the x**2 wave function, y = a (x+b)^2 + c, over a cycle
+  of length 1.
+  """
+  sample_value_span = wave_spec.max_sample_value - wave_spec.min_sample_value
+  return (
+      4 * sample_value_span * (phases - 0.5) ** 2 + wave_spec.min_sample_value)
+
+
+# Sample values of each periodic wave, by phase from 0 to 1. Sawtooth, square
+# and triangle waves use wave_generator.get_phase_wave_values, which can
+# band-limit them.
+_WAVE_SHAPES = {
+    wave_generator.SoundWaveType.SIN_WAVE: _get_sin_values,
+    wave_generator.SoundWaveType.X2_WAVE: _get_x2_values,
+}
+
+
+def get_linear_sweep(
+        start_frequency: float, end_frequency: float,
+        duration: float) -> FrequencyEnvelope:
+  """Gets an envelope that moves linearly from one frequency to another.
+
+  Args:
+    start_frequency: Frequency at time 0.
+    end_frequency: Frequency at duration and after.
+    duration: Seconds of the sweep.
+
+  Returns:
+    Frequency envelope.
+  """
+  def linear_sweep(times: np.ndarray) -> np.ndarray:
+    """Gets the frequencies of a linear sweep."""
+    progress = np.minimum(times / duration, 1)
+    return start_frequency + (end_frequency - start_frequency) * progress
+  return linear_sweep
+
+
+def get_exponential_sweep(
+        start_frequency: float, end_frequency: float,
+        duration: float) -> FrequencyEnvelope:
+  """Gets an envelope that moves exponentially from one frequency to another.
+
+  Every octave takes the same time, so pitch rises evenly to the ear.
+
+  Args:
+    start_frequency: Frequency at time 0. Must be positive.
+    end_frequency: Frequency at duration and after. Must be positive.
+    duration: Seconds of the sweep.
+
+  Raises:
+    ValueError: Frequencies must be positive.
+
+  Returns:
+    Frequency envelope.
+  """
+  if start_frequency <= 0 or end_frequency <= 0:
+    raise ValueError(
+        f'Exponential sweep frequencies must be positive, got '
+        f'{start_frequency} and {end_frequency}.')
+  frequency_ratio = end_frequency / start_frequency
+
+  def exponential_sweep(times: np.ndarray) -> np.ndarray:
+    """Gets the frequencies of an exponential sweep."""
+    progress = np.minimum(times / duration, 1)
+    return start_frequency * frequency_ratio ** progress
+  return exponential_sweep
+
+
+class Oscillator(object):
+  """Renders a periodic wave by accumulating its phase, block by block.
+
+  The phase carries over from one block to the next, so consecutive blocks
+  are continuous even when the frequency changes.
+
+  Methods:
+    phase: Phase of the next frame, from 0 to 1.
+    frames_rendered: Number of frames rendered.
+    get_block: Renders the next frames.
+    get_blocks: Renders the next frames, one block at a time.
+    get_samples: Renders the next frames into an array.
+  """
+
+  def __init__(
+          self, sound_wave_type: wave_generator.SoundWaveType,
+          wave_spec: wave_generator.WaveSpec,
+          frequency: Optional[Frequency] = None,
+          phase: float = 0.0):
+    """Instantiates an Oscillator.
+
+    Args:
+      sound_wave_type: Type of periodic sound wave to render.
+      wave_spec: Resolved wave options. Samples get the same volume, limits
+        and wave transformer as wave functions.
+      frequency: Frequency in Hz. A number, an array or sequence with the
+        frequency of each frame, or an envelope of the time. Defaults to the
+        frequency of the wave spec.
+      phase: Phase of the first frame, from 0 to 1.
+
+    Raises:
+      ValueError: Wave type cannot be rendered by an oscillator.
+    """
+    if (sound_wave_type not in _WAVE_SHAPES and
+            sound_wave_type not in wave_generator.PHASE_WAVE_TYPES):
+      raise ValueError(f'Unsupported oscillator wave type: {sound_wave_type}')
+    self._sound_wave_type = sound_wave_type
+    self._wave_spec = wave_spec
+    if frequency is None:
+      frequency = wave_spec.frequency
+    elif not callable(frequency) and np.ndim(frequency) > 0:
+      # Lists and other sequences hold the frequency of each frame too.
+      frequency = np.asarray(frequency, dtype=np.float64)
+    self._frequency = frequency
+    self._phase = phase % 1
+    self._frames_rendered = 0
+
+  @property
+  def phase(self) -> float:
+    """Phase of the next frame, from 0 to 1."""
+    return self._phase
+
+  @property
+  def frames_rendered(self) -> int:
+    """Number of frames rendered."""
+    return self._frames_rendered
+
+  def _get_phase_increments(self, number_frames: int) -> np.ndarray:
+    """Gets how much the phase advances on each of the next frames.
+
+    Args:
+      number_frames: Number of frames.
+
+    Raises:
+      ValueError: Frequency array is too short.
+
+    Returns:
+      Phase increment of each frame.
+    """
+    sample_rate = self._wave_spec.sample_rate
+    block_start = self._frames_rendered
+    block_end = block_start + number_frames
+
+    if isinstance(self._frequency, np.ndarray):
+      if block_end > len(self._frequency):
+        raise ValueError(
+            f'Frequency array has {len(self._frequency)} frames, '
+            f'{block_end} needed.')
+      frequencies = self._frequency[block_start:block_end]
+    else:
+      times = np.arange(block_start, block_end, dtype=np.float64) / sample_rate
+      frequencies = np.asarray(self._frequency(times), dtype=np.float64)
+    return frequencies / sample_rate
+
+  def _get_phases(
+          self, number_frames: int
+  ) -> Tuple[np.ndarray, Union[float, np.ndarray]]:
+    """Gets the phase of each of the next frames, advancing the phase.
+
+    Args:
+      number_frames: Number of frames.
+
+    Returns:
+      Phases, from 0 to 1, and the phase increment of every frame, or of
+      each frame if the frequency changes.
+    """
+    if callable(self._frequency) or isinstance(self._frequency, np.ndarray):
+      phase_increment = self._get_phase_increments(number_frames)
+      phase_totals = np.cumsum(phase_increment)
+      # Each frame is at the phase before its own increment.
+      phases = self._phase + phase_totals - phase_increment
+      next_phase = self._phase + (phase_totals[-1] if number_frames else 0)
+    else:
+      phase_increment = self._frequency / self._wave_spec.sample_rate
+      phases = self._phase + (
+          np.arange(number_frames, dtype=np.float64) * phase_increment)
+      next_phase = self._phase + number_frames * phase_increment
+
+    self._phase = next_phase % 1
+    self._frames_rendered += number_frames
+    return np.mod(phases, 1, out=phases), phase_increment
+
+  def get_block(self, number_frames: int) -> np.ndarray:
+    """Renders the next frames.
+
+    Args:
+      number_frames: Number of frames to render.
+
+    Returns:
+      Int16 samples of the frames.
+    """
+    sample_frames = np.arange(
+        self._frames_rendered, self._frames_rendered + number_frames,
+        dtype=np.int64)
+    phases, phase_increment = self._get_phases(number_frames)
+    if self._sound_wave_type in _WAVE_SHAPES:
+      sample_values = _WAVE_SHAPES[self._sound_wave_type](
+          self._wave_spec, phases)
+    else:
+      sample_values = wave_generator.get_phase_wave_values(
+          self._sound_wave_type, self._wave_spec, phases, phase_increment)
+    return wave_generator.normalize_sample_block(
+        self._wave_spec, sample_values, sample_frames)
+
+  def get_blocks(
+          self, duration: float,
+          block_size: Optional[int] = None) -> Iterator[np.ndarray]:
+    """Renders the next frames, one block at a time.
+
+    Args:
+      duration: Seconds to render.
+      block_size: Max number of frames per block.
+
+    Yields:
+      Int16 samples, block by block.
+    """
+    block_size = block_size or wave_settings.RENDER_BLOCK_SIZE
+    number_frames = int(duration * self._wave_spec.sample_rate)
+    for block_start in range(0, number_frames, block_size):
+      yield self.get_block(min(block_size, number_frames - block_start))
+
+  def get_samples(self, duration: float) -> array.array:
+    """Renders the next frames into an array.
+
+    Args:
+      duration: Seconds to render.
+
+    Returns:
+      Int16 samples of the frames.
+    """
+    sound_samples = array.array('h')
+    for sound_block in self.get_blocks(duration):
+      sound_samples.frombytes(sound_block.tobytes())
+    return sound_samples
+
+
+def create_oscillator(
+        wave_sound_generator: wave_generator.WaveSoundGenerator,
+        sound_wave_type: wave_generator.SoundWaveType,
+        wave_specific_options: Optional[wave_generator.WaveOptions] = None,
+        frequency: Optional[Frequency] = None) -> Oscillator:
+  """Creates an oscillator with the options of a wave sound generator.
+
+  Args:
+    wave_sound_generator: Generator whose wave options to use.
+    sound_wave_type: Type of periodic sound wave to render.
+    wave_specific_options: Modifiers to the specific wave.
+    frequency: Frequency in Hz. A number, an array or sequence with the
+      frequency of each frame, or an envelope of the time. Defaults to the
+      FREQUENCY option.
+
+  Returns:
+    Oscillator.
+  """
+  wave_spec = wave_sound_generator.get_wave_spec(wave_specific_options)
+  return Oscillator(sound_wave_type, wave_spec, frequency)
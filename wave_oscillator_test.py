@@ -0,0 +1,118 @@
+"""Tests that oscillators play in tune and stay continuous across blocks."""
+
+import math
+import numpy as np
+import unittest
+import wave_generator
+import wave_oscillator
+
+
+# Frequency that does not divide the sample rate into whole frames.
+_FREQUENCY = 440
+# Largest difference allowed from the expected frequency, in Hz.
+_MAX_FREQUENCY_ERROR = 0.01
+# Seconds of the rendered waves.
+_DURATION = 1
+# Frames per block of the renders split into many blocks.
+_BLOCK_SIZES = (1000, 4096, 12345)
+# Start and end frequencies of the sweeps.
+_SWEEP_FREQUENCIES = (100, 4000)
+
+
+def _get_zero_crossing_frequency(
+        sample_values: np.ndarray, sample_rate: int) -> float:
+  """Gets the frequency of a wave from its rising zero crossings.
+
+  Args:
+    sample_values: Samples of the wave.
+    sample_rate: Number of frames per second.
+
+  Returns:
+    Cycles per second between the first and last rising zero crossings,
+    each interpolated between its frames.
+  """
+  sample_values = np.asarray(sample_values, dtype=np.float64)
+  crossing_frames = np.flatnonzero(
+      (sample_values[:-1] < 0) & (sample_values[1:] >= 0))
+  before_values = sample_values[crossing_frames]
+  after_values = sample_values[crossing_frames + 1]
+  crossing_times = (
+      crossing_frames + before_values / (before_values - after_values)
+  ) / sample_rate
+  return (len(crossing_times) - 1) / (crossing_times[-1] - crossing_times[0])
+
+
+class OscillatorTest(unittest.TestCase):
+  """Checks the frequency and continuity of oscillators.
+
+  Methods:
+    test_zero_crossing_rate: A 440 Hz sin wave crosses zero at 440 Hz.
+    test_sweep_continuity: Sweeps render the same in blocks as whole.
+  """
+
+  def setUp(self):
+    self._wave_sound_generator = wave_generator.WaveSoundGenerator()
+    self._sample_rate = self._wave_sound_generator.get_wave_spec(
+        None).sample_rate
+
+  def _get_oscillator(
+          self, sound_wave_type: wave_generator.SoundWaveType,
+          frequency: wave_oscillator.Frequency) -> wave_oscillator.Oscillator:
+    """Gets an oscillator of the generator's wave options."""
+    return wave_oscillator.create_oscillator(
+        self._wave_sound_generator, sound_wave_type, frequency=frequency)
+
+  def test_zero_crossing_rate(self):
+    oscillator = self._get_oscillator(
+        wave_generator.SoundWaveType.SIN_WAVE, _FREQUENCY)
+    self.assertAlmostEqual(
+        _get_zero_crossing_frequency(
+            oscillator.get_samples(_DURATION), self._sample_rate),
+        _FREQUENCY, delta=_MAX_FREQUENCY_ERROR)
+
+    # Wave functions round the cycle to whole frames, and are detuned.
+    sin_samples = self._wave_sound_generator.get_wave_sound_samples(
+        _DURATION, wave_generator.SoundWaveType.SIN_WAVE,
+        {wave_generator.SoundWaveOption.FREQUENCY: _FREQUENCY})
+    self.assertAlmostEqual(
+        _get_zero_crossing_frequency(sin_samples, self._sample_rate),
+        self._sample_rate / round(self._sample_rate / _FREQUENCY),
+        delta=_MAX_FREQUENCY_ERROR)
+
+  def test_sweep_continuity(self):
+    sweeps = (
+        wave_oscillator.get_linear_sweep(*_SWEEP_FREQUENCIES, _DURATION),
+        wave_oscillator.get_exponential_sweep(*_SWEEP_FREQUENCIES, _DURATION),
+    )
+    # A sin wave changes by at most 2π f / sample_rate of its amplitude per
+    # frame, plus rounding.
+    max_sample_value = self._wave_sound_generator.get_wave_spec(
+        None).max_sample_value
+    max_step = (
+        2 * math.pi * max(_SWEEP_FREQUENCIES) / self._sample_rate *
+        max_sample_value + 1)
+    for sweep in sweeps:
+      whole_oscillator = self._get_oscillator(
+          wave_generator.SoundWaveType.SIN_WAVE, sweep)
+      whole_samples = whole_oscillator.get_block(
+          int(_DURATION * self._sample_rate)).astype(np.int64)
+
+      for block_size in _BLOCK_SIZES:
+        oscillator = self._get_oscillator(
+            wave_generator.SoundWaveType.SIN_WAVE, sweep)
+        block_samples = np.concatenate(list(
+            oscillator.get_blocks(_DURATION, block_size))).astype(np.int64)
+        self.assertLessEqual(
+            np.abs(np.diff(block_samples)).max(), max_step,
+            msg=f'Block size {block_size}')
+        # Phase totals are summed per block, so the phases may differ in
+        # their last bits, and the samples by 1.
+        self.assertLessEqual(
+            np.abs(block_samples - whole_samples).max(), 1,
+            msg=f'Block size {block_size}')
+        self.assertAlmostEqual(oscillator.phase, whole_oscillator.phase)
+        self.assertEqual(
+            oscillator.frames_rendered, whole_oscillator.frames_rendered)
+
+if __name__ == '__main__':
+  unittest.main()
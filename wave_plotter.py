@@ -1,11 +1,26 @@
-"""Plots sound waves."""
+"""Plots sound waves.
+
+matplotlib takes longer to import than the rest of the program, so pyplot
+is only imported by the first graph. It draws with the non-interactive Agg
+backend, unless another backend was chosen, e.g. by MPLBACKEND, so graphs
+can be written without a display.
+"""
 
 import enum
-from matplotlib import pyplot
+import os
+import sys
+import types
 import numpy as np
-import wave
+import wave_instrumentation
+import wave_reader
+
+from typing import Text, Tuple
+
 
-from typing import Text
+# Size of the graph, in inches.
+_FIGURE_SIZE = (16, 12)
+# Resolution of the graph, in pixels per inch.
+_FIGURE_DPI = 72
 
 
 class WaveGraphType(enum.Enum):
@@ -14,6 +29,20 @@ class WaveGraphType(enum.Enum):
   PER_SECOND = 'seconds'
 
 
+def _get_pyplot() -> types.ModuleType:
+  """Imports pyplot, with the Agg backend if no other one was chosen.
+
+  Returns:
+    matplotlib.pyplot module.
+  """
+  if ('matplotlib.pyplot' not in sys.modules and
+          not os.environ.get('MPLBACKEND')):
+    import matplotlib
+    matplotlib.use('Agg')
+  from matplotlib import pyplot
+  return pyplot
+
+
 def _get_image_file_name(sound_wave_file_name: Text) -> Text:
   """Gets a PNG file name for given sound wave file name.
 
@@ -26,37 +55,79 @@ def _get_image_file_name(sound_wave_file_name: Text) -> Text:
   return sound_wave_file_name.replace('.wav', '.png')
 
 
-def create_sound_wave_graph(sound_wave_file_name: Text,
-                            wave_graph_type: WaveGraphType):
-  """Creates a wave graph for given sound wav file.
+def _get_peak_envelope(
+        channel: np.ndarray, number_buckets: int
+) -> Tuple[np.ndarray, np.ndarray]:
+  """Gets the min and max peaks of a channel over buckets of frames.
+
+  A line through the min and max of each bucket covers the same pixels as a
+  line through every sample when each bucket spans about one pixel.
 
   Args:
-    sound_wave_file_name: Wav file to plot.
-    wave_graph_type: Type of plot to create.
+    channel: Samples of the channel.
+    number_buckets: Max number of buckets, usually the plot width in pixels.
+
+  Returns:
+    Frame of each point and its sample value. If there are fewer than two
+    samples per bucket, the samples themselves.
   """
-  sound_wave_file = wave.open(sound_wave_file_name, 'r')
+  number_frames = len(channel)
+  if number_frames <= 2 * number_buckets:
+    return np.arange(number_frames), channel
+
+  bucket_size = number_frames // number_buckets
+  bucketed_frames = bucket_size * number_buckets
+  buckets = channel[:bucketed_frames].reshape(number_buckets, bucket_size)
+  # Samples past the last whole bucket are merged into the last bucket.
+  remainder = channel[bucketed_frames:]
 
-  pyplot.figure(1, figsize=(16, 12), dpi=72)
-  pyplot.title('Signal Wave')
+  peaks = np.empty((number_buckets, 2), dtype=channel.dtype)
+  peaks[:, 0] = buckets.min(axis=1)
+  peaks[:, 1] = buckets.max(axis=1)
+  if len(remainder):
+    peaks[-1, 0] = min(peaks[-1, 0], remainder.min())
+    peaks[-1, 1] = max(peaks[-1, 1], remainder.max())
 
-  signal = sound_wave_file.readframes(-1)
-  signal = np.fromstring(signal, 'Int16')
+  bucket_frames = np.arange(number_buckets) * bucket_size
+  peak_frames = np.repeat(bucket_frames, 2)
+  return peak_frames, peaks.reshape(-1)
 
-  channels = [[] for channel in range(sound_wave_file.getnchannels())]
-  for index, datum in enumerate(signal):
-    channels[index % len(channels)].append(datum)
 
-  frame_rate = sound_wave_file.getframerate()
-  Time = np.linspace(0, frame_rate * len(signal) / len(channels),
-                     num=len(signal) / len(channels))
+def create_sound_wave_graph(sound_wave_file_name: Text,
+                            wave_graph_type: WaveGraphType):
+  """Creates a wave graph for given sound wav file.
 
-  for channel in channels:
-    if wave_graph_type == WaveGraphType.PER_SECOND:
-      pyplot.plot(Time, channel)
-    elif wave_graph_type == WaveGraphType.PER_FRAME:
-      pyplot.plot(channel)
-    else:
-      raise ValueError(f'Unsupported graph type: {wave_graph_type}.')
+  Long files are drawn as the min and max peaks of each pixel column, so plot
+  time does not depend on the file length. Samples are memory-mapped, not
+  loaded.
 
-  wave_graph_file_name = _get_image_file_name(sound_wave_file_name)
-  pyplot.savefig(wave_graph_file_name)
+  Args:
+    sound_wave_file_name: Wav file to plot.
+    wave_graph_type: Type of plot to create.
+  """
+  if wave_graph_type not in (
+          WaveGraphType.PER_FRAME, WaveGraphType.PER_SECOND):
+    raise ValueError(f'Unsupported graph type: {wave_graph_type}.')
+
+  pyplot = _get_pyplot()
+  with wave_instrumentation.measure(
+          wave_instrumentation.Stage.PLOT) as counters:
+    pyplot.figure(1, figsize=_FIGURE_SIZE, dpi=_FIGURE_DPI)
+    pyplot.title('Signal Wave')
+
+    number_buckets = _FIGURE_SIZE[0] * _FIGURE_DPI
+
+    with wave_reader.open_wav_file(sound_wave_file_name) as sound_wave_file:
+      frame_rate = sound_wave_file.sample_rate
+      counters[wave_instrumentation.Counter.FRAMES] += (
+          sound_wave_file.number_frames)
+      for channel in sound_wave_file.get_channels():
+        peak_frames, peak_values = _get_peak_envelope(channel, number_buckets)
+        if wave_graph_type == WaveGraphType.PER_SECOND:
+          pyplot.plot(peak_frames / frame_rate, peak_values)
+        else:
+          pyplot.plot(peak_frames, peak_values)
+
+    wave_graph_file_name = _get_image_file_name(sound_wave_file_name)
+    pyplot.savefig(wave_graph_file_name)
+    pyplot.close(1)
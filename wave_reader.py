@@ -0,0 +1,296 @@
+"""Reads sound wave files without loading them into memory.
+
+Samples are memory-mapped and viewed in place, except 24-bit samples, which
+NumPy has no type for, and unsigned 8-bit samples. They are decoded into
+signed int32 and int16 when read, so every format is centered around 0.
+"""
+
+import numpy as np
+import os
+import struct
+from typing import BinaryIO, List, Optional, Text, Tuple
+
+
+# Format tags of the WAV fmt chunk.
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_ALAW = 0x0006
+WAVE_FORMAT_MULAW = 0x0007
+WAVE_FORMAT_IMA_ADPCM = 0x0011
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Size of a RIFF chunk header: 4 bytes of id and 4 bytes of size.
+_CHUNK_HEADER_SIZE = 8
+
+# Bytes of the packed 24-bit samples.
+_INT24_WIDTH = 3
+
+
+def _get_sample_dtype(format_tag: int, sample_width: int) -> np.dtype:
+  """Gets the NumPy type of the samples stored in a WAV file.
+
+  Args:
+    format_tag: Format tag of the samples.
+    sample_width: Bytes per sample.
+
+  Raises:
+    ValueError: Sample format cannot be viewed as a NumPy type.
+
+  Returns:
+    Little-endian NumPy type of each sample, once decoded. Int32 for 24-bit
+    samples and int16 for 8-bit samples.
+  """
+  if format_tag == WAVE_FORMAT_PCM:
+    if sample_width == 1:
+      return np.dtype('<i2')
+    if sample_width == _INT24_WIDTH:
+      return np.dtype('<i4')
+    if sample_width in (2, 4):
+      return np.dtype(f'<i{sample_width}')
+  if format_tag == WAVE_FORMAT_IEEE_FLOAT and sample_width in (4, 8):
+    return np.dtype(f'<f{sample_width}')
+  raise ValueError(
+      f'Unsupported sample format: tag {format_tag}, {sample_width} bytes.')
+
+
+def _decode_int24(packed_samples: np.ndarray) -> np.ndarray:
+  """Decodes packed 24-bit samples.
+
+  Args:
+    packed_samples: Bytes of the samples, 3 little-endian bytes per sample
+      in the last axis.
+
+  Returns:
+    Int32 samples, one per group of 3 bytes.
+  """
+  sample_values = packed_samples[..., 0].astype(np.int32)
+  sample_values |= packed_samples[..., 1].astype(np.int32) << 8
+  sample_values |= packed_samples[..., 2].astype(np.int32) << 16
+  # Moves the sign bit to the top and back, extending it.
+  sample_values <<= 8
+  sample_values >>= 8
+  return sample_values
+
+
+def _decode_uint8(unsigned_samples: np.ndarray) -> np.ndarray:
+  """Decodes 8-bit samples, which WAV files store unsigned, offset by 128.
+
+  Args:
+    unsigned_samples: Unsigned samples, from 0 to 255.
+
+  Returns:
+    Int16 samples, from -128 to 127.
+  """
+  return unsigned_samples.astype(np.int16) - 128
+
+
+def _read_chunk_header(
+        wav_file: BinaryIO) -> Optional[Tuple[bytes, int]]:
+  """Reads the header of the next RIFF chunk.
+
+  Args:
+    wav_file: File positioned at the start of a chunk.
+
+  Returns:
+    Chunk id and chunk size, or None at the end of the file.
+  """
+  chunk_header = wav_file.read(_CHUNK_HEADER_SIZE)
+  if len(chunk_header) < _CHUNK_HEADER_SIZE:
+    return None
+  chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+  return chunk_id, chunk_size
+
+
+class WavFile(object):
+  """WAV file whose samples are memory-mapped instead of loaded.
+
+  Methods:
+    number_channels: Number of channels.
+    sample_rate: Number of frames per second.
+    sample_width: Bytes per sample.
+    number_frames: Number of frames.
+    format_tag: Format tag of the samples.
+    get_frames: Gets all the frames as a frames x channels array.
+    get_channel: Gets the samples of a channel.
+    get_channels: Gets the samples of every channel.
+    close: Releases the memory map.
+  """
+
+  def __init__(self, file_name: Text):
+    """Instantiates a WavFile, parsing its header.
+
+    Args:
+      file_name: WAV file to read.
+
+    Raises:
+      ValueError: File is not a supported WAV file.
+    """
+    self._file_name = file_name
+    format_chunk = None
+    data_offset = None
+    data_size = None
+
+    with open(file_name, 'rb') as wav_file:
+      riff_header = wav_file.read(12)
+      if (len(riff_header) < 12 or riff_header[:4] != b'RIFF' or
+              riff_header[8:12] != b'WAVE'):
+        raise ValueError(f'Not a WAV file: {file_name}')
+
+      while True:
+        chunk_header = _read_chunk_header(wav_file)
+        if chunk_header is None:
+          break
+        chunk_id, chunk_size = chunk_header
+        if chunk_id == b'fmt ':
+          format_chunk = wav_file.read(chunk_size)
+        elif chunk_id == b'data':
+          data_offset = wav_file.tell()
+          data_size = chunk_size
+          break
+        else:
+          wav_file.seek(chunk_size, os.SEEK_CUR)
+        # Chunks are padded to an even size.
+        if chunk_size % 2:
+          wav_file.seek(1, os.SEEK_CUR)
+
+    if format_chunk is None or len(format_chunk) < 16:
+      raise ValueError(f'Missing fmt chunk: {file_name}')
+    if data_offset is None:
+      raise ValueError(f'Missing data chunk: {file_name}')
+
+    (format_tag, self._number_channels, self._sample_rate, _, block_align,
+     bits_per_sample) = struct.unpack('<HHIIHH', format_chunk[:16])
+    if format_tag == WAVE_FORMAT_EXTENSIBLE and len(format_chunk) >= 26:
+      # Sub-format GUID starts with the actual format tag.
+      format_tag, = struct.unpack('<H', format_chunk[24:26])
+    self._format_tag = format_tag
+    self._sample_width = bits_per_sample // 8
+    self._dtype = _get_sample_dtype(format_tag, self._sample_width)
+
+    # Files whose header was not patched, e.g. still being written, declare
+    # less data than they hold, and truncated files more.
+    available_size = os.path.getsize(file_name) - data_offset
+    if data_size == 0 or data_size > available_size:
+      data_size = available_size
+    self._number_frames = data_size // block_align
+
+    self._is_packed = self._sample_width == _INT24_WIDTH
+    self._is_unsigned = self._sample_width == 1
+    if self._is_packed:
+      frames_shape = (self._number_frames, self._number_channels, _INT24_WIDTH)
+      frames_dtype = np.dtype('u1')
+    else:
+      frames_shape = (self._number_frames, self._number_channels)
+      frames_dtype = np.dtype('u1') if self._is_unsigned else self._dtype
+    if self._number_frames:
+      self._frames = np.memmap(
+          file_name, dtype=frames_dtype, mode='r', offset=data_offset,
+          shape=frames_shape)
+    else:
+      self._frames = np.zeros(frames_shape, dtype=frames_dtype)
+
+  def __enter__(self) -> 'WavFile':
+    return self
+
+  def __exit__(self, *unused_exception_info):
+    self.close()
+
+  @property
+  def number_channels(self) -> int:
+    """Number of channels."""
+    return self._number_channels
+
+  @property
+  def sample_rate(self) -> int:
+    """Number of frames per second."""
+    return self._sample_rate
+
+  @property
+  def sample_width(self) -> int:
+    """Bytes per sample."""
+    return self._sample_width
+
+  @property
+  def number_frames(self) -> int:
+    """Number of frames."""
+    return self._number_frames
+
+  @property
+  def format_tag(self) -> int:
+    """Format tag of the samples."""
+    return self._format_tag
+
+  def _decode_samples(self, samples: np.ndarray) -> np.ndarray:
+    """Decodes samples that cannot be viewed in place.
+
+    Args:
+      samples: Samples as stored, packed 24-bit ones with a last axis of bytes.
+
+    Returns:
+      Decoded copy of 24-bit and 8-bit samples, else the samples themselves.
+    """
+    if self._is_packed:
+      return _decode_int24(samples)
+    if self._is_unsigned:
+      return _decode_uint8(samples)
+    return samples
+
+  def get_frames(self) -> np.ndarray:
+    """Gets all the frames, copying only 24-bit and 8-bit ones.
+
+    Returns:
+      Read-only frames x channels array, backed by the file. Decoded int32
+      copy for 24-bit samples, and int16 copy for 8-bit samples.
+    """
+    return self._decode_samples(self._frames)
+
+  def get_channel(self, channel: int) -> np.ndarray:
+    """Gets the samples of a channel, copying only 24-bit and 8-bit ones.
+
+    Args:
+      channel: Index of the channel.
+
+    Raises:
+      IndexError: Unknown channel.
+
+    Returns:
+      Read-only strided view of the channel samples, backed by the file.
+      Decoded int32 copy for 24-bit samples, and int16 copy for 8-bit
+      samples.
+    """
+    if not 0 <= channel < self._number_channels:
+      raise IndexError(f'Unknown channel: {channel}')
+    return self._decode_samples(self._frames[:, channel])
+
+  def get_channels(self) -> List[np.ndarray]:
+    """Gets the samples of every channel, copying only 24-bit and 8-bit ones.
+
+    Returns:
+      Read-only strided view of each channel, backed by the file. Decoded
+      int32 copies for 24-bit samples, and int16 copies for 8-bit samples.
+    """
+    return [
+        self.get_channel(channel) for channel in range(self._number_channels)]
+
+  def close(self):
+    """Releases the memory map.
+
+    Views obtained before closing keep the file mapped until released.
+    """
+    self._frames = np.zeros(
+        (0,) + self._frames.shape[1:], dtype=self._frames.dtype)
+
+
+def open_wav_file(file_name: Text) -> WavFile:
+  """Opens a WAV file with memory-mapped samples.
+
+  Args:
+    file_name: WAV file to read.
+
+  Raises:
+    ValueError: File is not a supported WAV file.
+
+  Returns:
+    WAV file.
+  """
+  return WavFile(file_name)
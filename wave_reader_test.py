@@ -0,0 +1,110 @@
+"""Tests that memory-mapped WAV files read back the samples written."""
+
+import numpy as np
+import os
+import struct
+import tempfile
+import unittest
+import wave_format
+import wave_reader
+import wave_writer
+
+
+# Frames per second of the written files.
+_SAMPLE_RATE = 8000
+# Number of channels of the written files.
+_NUMBER_CHANNELS = 2
+
+
+class WavFileTest(unittest.TestCase):
+  """Writes files in every sample format and reads them back.
+
+  Methods:
+    test_int8: 8-bit samples are signed, around 0.
+    test_int16: 16-bit samples are the samples written.
+    test_int24: 24-bit samples are decoded into int32.
+    test_int32: 32-bit samples keep the samples in their top bits.
+    test_float32: Float samples are scaled to [-1, 1].
+    test_unpatched_data_size: A zero data size reads all of the data.
+  """
+
+  def setUp(self):
+    self._directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self._directory.cleanup)
+    self._file_name = os.path.join(self._directory.name, 'sound.wav')
+    # Full scale, zero and odd values, one row per frame.
+    self._frames_values = np.array(
+        [[-32768, 32767], [0, -1], [1, -129], [12345, -255], [256, 128]],
+        dtype=np.int16)
+
+  def _write(self, sample_format: wave_format.SampleFormat):
+    """Writes the test frames in a sample format."""
+    with wave_writer.open_wav_writer(
+            self._file_name, _NUMBER_CHANNELS, _SAMPLE_RATE,
+            sample_format) as sound_writer:
+      sound_writer.write_samples(self._frames_values.reshape(-1))
+
+  def _assert_read_back(
+          self, sample_format: wave_format.SampleFormat,
+          expected_frames: np.ndarray, expected_dtype: np.dtype):
+    """Asserts that the written frames read back as expected.
+
+    Args:
+      sample_format: Sample format to write.
+      expected_frames: Expected samples, one row per frame.
+      expected_dtype: Expected type of the samples read.
+    """
+    self._write(sample_format)
+    with wave_reader.open_wav_file(self._file_name) as sound_file:
+      self.assertEqual(sound_file.number_channels, _NUMBER_CHANNELS)
+      self.assertEqual(sound_file.sample_rate, _SAMPLE_RATE)
+      self.assertEqual(
+          sound_file.sample_width,
+          wave_format.get_sample_width(sample_format))
+      self.assertEqual(sound_file.number_frames, len(expected_frames))
+      frames = sound_file.get_frames()
+      self.assertEqual(frames.dtype, expected_dtype)
+      np.testing.assert_array_equal(frames, expected_frames)
+      for channel, channel_samples in enumerate(sound_file.get_channels()):
+        np.testing.assert_array_equal(
+            channel_samples, expected_frames[:, channel])
+
+  def test_int8(self):
+    self._assert_read_back(
+        wave_format.SampleFormat.INT8,
+        self._frames_values.astype(np.int64) >> 8, np.dtype(np.int16))
+
+  def test_int16(self):
+    self._assert_read_back(
+        wave_format.SampleFormat.INT16, self._frames_values,
+        np.dtype('<i2'))
+
+  def test_int24(self):
+    self._assert_read_back(
+        wave_format.SampleFormat.INT24,
+        self._frames_values.astype(np.int64) << 8, np.dtype(np.int32))
+
+  def test_int32(self):
+    self._assert_read_back(
+        wave_format.SampleFormat.INT32,
+        self._frames_values.astype(np.int64) << 16, np.dtype('<i4'))
+
+  def test_float32(self):
+    self._assert_read_back(
+        wave_format.SampleFormat.FLOAT32,
+        (self._frames_values / 32768).astype(np.float32), np.dtype('<f4'))
+
+  def test_unpatched_data_size(self):
+    self._write(wave_format.SampleFormat.INT16)
+    with open(self._file_name, 'r+b') as sound_file:
+      data_size_position = sound_file.read().index(b'data') + 4
+      sound_file.seek(data_size_position)
+      sound_file.write(struct.pack('<I', 0))
+    with wave_reader.open_wav_file(self._file_name) as sound_file:
+      self.assertEqual(sound_file.number_frames, len(self._frames_values))
+      np.testing.assert_array_equal(
+          sound_file.get_frames(), self._frames_values)
+
+
+if __name__ == '__main__':
+  unittest.main()
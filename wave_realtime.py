@@ -0,0 +1,280 @@
+"""Streams sound waves in real time, in small buffers, to a live sink."""
+
+import threading
+import time
+import numpy as np
+import wave_format
+import wave_generator
+import wave_instrumentation
+import wave_mixer
+import wave_settings
+from typing import BinaryIO, Optional, Sequence
+
+
+class RealtimeStream(object):
+  """Renders sound waves buffer by buffer, paced as a live sink plays them.
+
+  Samples are written to the sink as raw little-endian frames of the sample
+  format, int16 by default, e.g. to stdout, a pipe or a file-like object
+  standing in for a device. When paced, the sink is assumed to play frames
+  at the sample rate from the first buffer on, and at most max_buffers
+  buffers are queued ahead of it, so changes of wave options are heard
+  within latency seconds. A buffer that is written after the sink ran out
+  of frames counts as an underrun.
+
+  Frames are rendered by their position in the stream, so waves are
+  continuous across buffers. When the cycle of a periodic wave changes,
+  e.g. its frequency, it continues from the same phase.
+
+  Methods:
+    sample_rate: Number of frames per second.
+    latency: Max seconds from a change of wave options to hearing it.
+    frames_written: Number of frames written to the sink.
+    underruns: Number of times the sink ran out of frames.
+    set_wave_options: Changes the wave options of a channel.
+    write_buffer: Renders and writes the next buffer.
+    run: Streams buffers until stopped.
+    stop: Stops streaming.
+  """
+
+  def __init__(
+          self,
+          wave_sound_generator: wave_generator.WaveSoundGenerator,
+          sound_wave_types: Sequence[wave_generator.SoundWaveType],
+          sink: BinaryIO,
+          wave_specific_options: Optional[
+              Sequence[Optional[wave_generator.WaveOptions]]] = None,
+          buffer_size: int = wave_settings.REALTIME_BUFFER_SIZE,
+          max_buffers: int = wave_settings.REALTIME_MAX_BUFFERS,
+          mix_mode: wave_mixer.MixMode = wave_mixer.MixMode.INTERLEAVED,
+          channel_gains: Optional[Sequence[float]] = None,
+          sample_format: wave_format.SampleFormat = (
+              wave_format.SampleFormat.INT16)):
+    """Instantiates a RealtimeStream.
+
+    Args:
+      wave_sound_generator: Generator of the wave functions.
+      sound_wave_types: Type of sound wave of each channel.
+      sink: Writable binary file-like object that plays the frames.
+      wave_specific_options: Modifiers to the wave of each channel.
+      buffer_size: Number of frames per buffer.
+      max_buffers: Max number of buffers queued ahead of the sink.
+      mix_mode: How channels are mixed into the frames.
+      channel_gains: Gain of each channel when mixing.
+      sample_format: Format of the samples written to the sink.
+
+    Raises:
+      ValueError: Must provide at least one channel, as many wave options as
+        wave types, positive buffer sizes and the same sample rate for
+        every channel.
+    """
+    if not sound_wave_types:
+      raise ValueError('Must provide at least one channel.')
+    wave_specific_options = (
+        wave_specific_options or [None] * len(sound_wave_types))
+    if len(wave_specific_options) != len(sound_wave_types):
+      raise ValueError('Must provide wave options for each wave type.')
+    if buffer_size < 1 or max_buffers < 1:
+      raise ValueError(
+          f'Buffer size and max buffers must be positive, got {buffer_size} '
+          f'and {max_buffers}.')
+
+    self._wave_sound_generator = wave_sound_generator
+    self._sound_wave_types = list(sound_wave_types)
+    self._sink = sink
+    self._buffer_size = buffer_size
+    self._max_buffers = max_buffers
+    self._mix_mode = mix_mode
+    self._channel_gains = channel_gains
+    self._sample_format = sample_format
+
+    self._wave_specs = [
+        wave_sound_generator.get_wave_spec(channel_options)
+        for channel_options in wave_specific_options]
+    self._sample_rate = self._wave_specs[0].sample_rate
+    if any(wave_spec.sample_rate != self._sample_rate
+           for wave_spec in self._wave_specs):
+      raise ValueError('All channels must have the same sample rate.')
+    self._wave_block_functions = [
+        wave_sound_generator.get_wave_block_function(
+            sound_wave_type, channel_options)
+        for sound_wave_type, channel_options in zip(
+            sound_wave_types, wave_specific_options)]
+    # Frame of each channel's wave at stream frame 0. Moves when the phase of
+    # a wave is kept across a change of its cycle.
+    self._frame_offsets = [0] * len(sound_wave_types)
+
+    # Changes of wave options to apply before the next buffer, by channel.
+    self._pending_options = {}
+    self._lock = threading.Lock()
+    self._stopped = threading.Event()
+
+    self._frames_written = 0
+    self._underruns = 0
+    # Time at which the sink started playing frame 0, once writing started.
+    self._playback_start_time = None
+
+  @property
+  def sample_rate(self) -> int:
+    """Number of frames per second."""
+    return self._sample_rate
+
+  @property
+  def latency(self) -> float:
+    """Max seconds from a change of wave options to hearing it, if paced."""
+    return self._max_buffers * self._buffer_size / self._sample_rate
+
+  @property
+  def frames_written(self) -> int:
+    """Number of frames written to the sink."""
+    return self._frames_written
+
+  @property
+  def underruns(self) -> int:
+    """Number of times the sink ran out of frames before the next buffer."""
+    return self._underruns
+
+  def set_wave_options(
+          self, channel: int,
+          wave_specific_options: Optional[wave_generator.WaveOptions]):
+    """Changes the wave options of a channel, from the next buffer on.
+
+    Can be called from any thread while streaming.
+
+    Args:
+      channel: Index of the channel.
+      wave_specific_options: New modifiers to the wave of the channel.
+
+    Raises:
+      IndexError: Unknown channel.
+      ValueError: Sample rate cannot change while streaming.
+    """
+    if not 0 <= channel < len(self._sound_wave_types):
+      raise IndexError(f'Unknown channel: {channel}')
+    wave_spec = self._wave_sound_generator.get_wave_spec(wave_specific_options)
+    if wave_spec.sample_rate != self._sample_rate:
+      raise ValueError('Sample rate cannot change while streaming.')
+    wave_block_function = self._wave_sound_generator.get_wave_block_function(
+        self._sound_wave_types[channel], wave_specific_options)
+    with self._lock:
+      self._pending_options[channel] = (wave_spec, wave_block_function)
+
+  def _apply_pending_options(self):
+    """Switches channels to their changed wave options, keeping phase."""
+    with self._lock:
+      pending_options = self._pending_options
+      self._pending_options = {}
+
+    for channel, (wave_spec, wave_block_function) in pending_options.items():
+      previous_wave_spec = self._wave_specs[channel]
+      if (self._sound_wave_types[channel] in
+              wave_generator.PERIODIC_WAVE_TYPES):
+        wave_frame = self._frames_written - self._frame_offsets[channel]
+        cycle_frame = wave_frame % previous_wave_spec.samples_per_cycle
+        new_cycle_frame = round(
+            cycle_frame * wave_spec.samples_per_cycle /
+            previous_wave_spec.samples_per_cycle)
+        self._frame_offsets[channel] = self._frames_written - new_cycle_frame
+      elif (self._sound_wave_types[channel] in
+              wave_generator.PHASE_WAVE_TYPES and wave_spec.frequency > 0):
+        wave_frame = self._frames_written - self._frame_offsets[channel]
+        phase = (
+            wave_frame * previous_wave_spec.frequency % self._sample_rate /
+            self._sample_rate)
+        new_phase_frame = round(
+            phase * self._sample_rate / wave_spec.frequency)
+        self._frame_offsets[channel] = self._frames_written - new_phase_frame
+      self._wave_specs[channel] = wave_spec
+      self._wave_block_functions[channel] = wave_block_function
+
+  def _render_buffer(self) -> np.ndarray:
+    """Renders the next buffer.
+
+    Returns:
+      Int16 mixed frames of the buffer.
+    """
+    self._apply_pending_options()
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.SYNTHESIS) as counters:
+      channels_buffer = []
+      for wave_block_function, frame_offset in zip(
+              self._wave_block_functions, self._frame_offsets):
+        buffer_start = self._frames_written - frame_offset
+        sample_frames = np.arange(
+            buffer_start, buffer_start + self._buffer_size, dtype=np.int64)
+        channels_buffer.append(wave_block_function(sample_frames))
+      counters[wave_instrumentation.Counter.FRAMES] += self._buffer_size
+
+    with wave_instrumentation.measure(wave_instrumentation.Stage.MIXDOWN):
+      return wave_mixer.mix_channels(
+          channels_buffer, self._mix_mode, self._channel_gains)
+
+  def _get_buffered_frames(self, current_time: float) -> float:
+    """Gets the frames written but not yet played by the sink.
+
+    Args:
+      current_time: Monotonic time.
+
+    Returns:
+      Number of frames queued ahead of the sink. Negative if it ran out.
+    """
+    played_frames = (
+        (current_time - self._playback_start_time) * self._sample_rate)
+    return self._frames_written - played_frames
+
+  def write_buffer(self, paced: bool = True):
+    """Renders the next buffer and writes it to the sink.
+
+    Args:
+      paced: Whether to wait until the sink has room for the buffer, and
+        count underruns. If not, writes as fast as the sink accepts.
+    """
+    if paced and self._playback_start_time is not None:
+      max_buffered_frames = (self._max_buffers - 1) * self._buffer_size
+      excess_frames = (
+          self._get_buffered_frames(time.monotonic()) - max_buffered_frames)
+      if excess_frames > 0:
+        time.sleep(excess_frames / self._sample_rate)
+
+    mixed_buffer = self._render_buffer()
+
+    current_time = time.monotonic()
+    if self._playback_start_time is None:
+      self._playback_start_time = current_time
+    elif paced and self._get_buffered_frames(current_time) < 0:
+      self._underruns += 1
+      # Sink resumes playing from this buffer.
+      self._playback_start_time = (
+          current_time - self._frames_written / self._sample_rate)
+
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.WRITE) as counters:
+      buffer_data = wave_format.encode_samples(
+          mixed_buffer, self._sample_format)
+      self._sink.write(buffer_data)
+      if hasattr(self._sink, 'flush'):
+        self._sink.flush()
+      counters[wave_instrumentation.Counter.BYTES_WRITTEN] += len(buffer_data)
+    self._frames_written += self._buffer_size
+
+  def run(self, duration: Optional[float] = None, paced: bool = True):
+    """Streams buffers until stopped or for a duration.
+
+    Args:
+      duration: Seconds of sound to stream, rounded up to whole buffers.
+        None to stream until stopped.
+      paced: Whether to pace buffers as the sink plays them.
+    """
+    self._stopped.clear()
+    end_frame = None
+    if duration is not None:
+      end_frame = self._frames_written + int(duration * self._sample_rate)
+    while not self._stopped.is_set():
+      if end_frame is not None and self._frames_written >= end_frame:
+        break
+      self.write_buffer(paced)
+
+  def stop(self):
+    """Stops streaming after the current buffer, from any thread."""
+    self._stopped.set()
+
@@ -0,0 +1,448 @@
+"""Converts sound samples from one sample rate to another.
+
+Resampling is polyphase: the rates are reduced to a ratio of integers, up L
+and down M, and each output frame is a dot product of the input frames
+around it with one of L phases of a Kaiser-windowed sinc. The filter cuts
+off at the lower of the two Nyquist frequencies, so downsampling does not
+alias. The L phases repeat every L output frames, which read the input M
+frames further on, so blocks of output frames are a matrix product of
+overlapping windows of the input with a single filter matrix. A Resampler
+keeps the input frames it still needs, so any stream of chunks can be
+resampled in constant memory.
+
+It lets channels rendered at different sample rates be mixed, and cheap
+previews be rendered at a low sample rate and upsampled:
+
+  preview_samples = wave_resampler.get_preview_samples(
+      generator, 3, wave_generator.SoundWaveType.SIN_WAVE, 8000)
+"""
+
+import math
+import numpy as np
+from numpy.lib import stride_tricks
+import wave_cache
+import wave_format
+import wave_generator
+import wave_instrumentation
+import wave_mixer
+import wave_settings
+from typing import Iterable, Iterator, Optional, Tuple
+
+# Shape of the Kaiser window. Higher values attenuate the stopband more but
+# widen the transition band. 8.6 gives about 90 dB of attenuation.
+_KAISER_BETA = 8.6
+
+# Max number of output frames computed at once, bounding the memory of the
+# frames x taps arrays of each step.
+_OUTPUT_STEP_SIZE = 8192
+
+# Min output frames per block of the filter matrix. Small blocks make too
+# thin a matrix product to be efficient.
+_MIN_BLOCK_FRAMES = 64
+
+# Max number of weights in a filter matrix. Rate ratios of large coprime
+# factors, e.g. 44100 to 44101, gather the taps of each output frame instead.
+_MAX_FILTER_MATRIX_SIZE = 1 << 20
+
+# Filter bank of each rate ratio, by up factor, down factor and quality.
+_FILTER_CACHE = wave_cache.LruCache(
+    wave_settings.RESAMPLER_FILTER_CACHE_SIZE)
+
+# Filter matrix of each rate ratio, by up factor, down factor and quality.
+_FILTER_MATRIX_CACHE = wave_cache.LruCache(
+    wave_settings.RESAMPLER_FILTER_CACHE_SIZE)
+
+
+def _get_rate_ratio(input_rate: int, output_rate: int) -> Tuple[int, int]:
+  """Gets the up and down factors that convert between two sample rates.
+
+  Args:
+    input_rate: Sample rate of the input.
+    output_rate: Sample rate of the output.
+
+  Raises:
+    ValueError: Sample rates must be positive integers.
+
+  Returns:
+    Up factor L and down factor M, with no common divisor.
+  """
+  if (int(input_rate) != input_rate or int(output_rate) != output_rate or
+          input_rate < 1 or output_rate < 1):
+    raise ValueError(
+        f'Sample rates must be positive integers, got {input_rate} and '
+        f'{output_rate}.')
+  rate_divisor = math.gcd(int(input_rate), int(output_rate))
+  return int(output_rate) // rate_divisor, int(input_rate) // rate_divisor
+
+
+def _get_filter_bank(
+        up_factor: int, down_factor: int,
+        zero_crossings: int) -> np.ndarray:
+  """Gets the polyphase filter bank of a rate ratio, from cache if available.
+
+  Args:
+    up_factor: Up factor L.
+    down_factor: Down factor M.
+    zero_crossings: Zero crossings of the sinc on each side.
+
+  Returns:
+    Read-only L x taps weights. Row p weighs the input frames around an
+    output frame p / L input frames after an input frame, from the earliest
+    to the latest. Each row adds up to 1.
+  """
+  filter_key = (up_factor, down_factor, zero_crossings)
+  filter_bank = _FILTER_CACHE.get(filter_key)
+  if filter_bank is not None:
+    return filter_bank
+
+  # Cutoff, relative to the input Nyquist frequency.
+  cutoff = min(1.0, up_factor / down_factor)
+  half_width = zero_crossings / cutoff
+  half_taps = math.ceil(half_width)
+  # Offset in input frames from each output frame to each tap.
+  tap_offsets = (
+      np.arange(up_factor)[:, np.newaxis] / up_factor +
+      (half_taps - 1 - np.arange(2 * half_taps)))
+  window_positions = np.clip(tap_offsets / half_width, -1, 1)
+  window = np.i0(_KAISER_BETA * np.sqrt(1 - window_positions ** 2)) / np.i0(
+      _KAISER_BETA)
+  filter_bank = cutoff * np.sinc(cutoff * tap_offsets) * window
+  filter_bank[np.abs(tap_offsets) >= half_width] = 0
+  filter_bank /= filter_bank.sum(axis=1, keepdims=True)
+  filter_bank.flags.writeable = False
+
+  _FILTER_CACHE.put(filter_key, filter_bank)
+  return filter_bank
+
+
+def _get_filter_matrix(
+        up_factor: int, down_factor: int,
+        zero_crossings: int) -> Optional[np.ndarray]:
+  """Gets the filter matrix of a rate ratio, from cache if available.
+
+  A block of output frames, a whole number of times L, reads the input from
+  a frame that moves M frames for every L output frames.
+
+  Args:
+    up_factor: Up factor L.
+    down_factor: Down factor M.
+    zero_crossings: Zero crossings of the sinc on each side.
+
+  Returns:
+    Read-only window x block frames weights. Column i weighs the window of
+    input frames for output frame i of the block. None if it would be too
+    large.
+  """
+  filter_key = (up_factor, down_factor, zero_crossings)
+  if filter_key in _FILTER_MATRIX_CACHE:
+    return _FILTER_MATRIX_CACHE.get(filter_key)
+
+  filter_bank = _get_filter_bank(up_factor, down_factor, zero_crossings)
+  number_taps = filter_bank.shape[1]
+  block_frames = up_factor * -(-_MIN_BLOCK_FRAMES // up_factor)
+  output_positions = np.arange(block_frames) * down_factor
+  base_frames = output_positions // up_factor
+  window_size = base_frames[-1] + number_taps
+  filter_matrix = None
+  if window_size * block_frames <= _MAX_FILTER_MATRIX_SIZE:
+    filter_matrix = np.zeros((window_size, block_frames), dtype=np.float64)
+    tap_frames = base_frames[:, np.newaxis] + np.arange(number_taps)
+    filter_matrix[tap_frames, np.arange(block_frames)[:, np.newaxis]] = (
+        filter_bank[output_positions % up_factor])
+    filter_matrix.flags.writeable = False
+
+  _FILTER_MATRIX_CACHE.put(filter_key, filter_matrix)
+  return filter_matrix
+
+
+def get_resampled_length(
+        number_frames: int, input_rate: int, output_rate: int) -> int:
+  """Gets the number of frames that resampling some frames outputs.
+
+  Args:
+    number_frames: Number of input frames.
+    input_rate: Sample rate of the input.
+    output_rate: Sample rate of the output.
+
+  Returns:
+    Number of output frames.
+  """
+  up_factor, down_factor = _get_rate_ratio(input_rate, output_rate)
+  return -(-number_frames * up_factor // down_factor)
+
+
+class Resampler(object):
+  """Resamples a stream of samples, chunk by chunk.
+
+  Output frames are output as soon as all the input frames they depend on
+  are known, so each chunk of output lags the input by half the filter.
+  Flushing outputs the remaining frames, as if the input were followed by
+  silence.
+
+  Methods:
+    input_rate: Sample rate of the input.
+    output_rate: Sample rate of the output.
+    latency: Input frames each output frame waits for.
+    process: Resamples the next chunk of input.
+    flush: Outputs the frames still pending at the end of the input.
+  """
+
+  def __init__(
+          self, input_rate: int, output_rate: int,
+          zero_crossings: int = wave_settings.RESAMPLER_ZERO_CROSSINGS):
+    """Instantiates a Resampler.
+
+    Args:
+      input_rate: Sample rate of the input.
+      output_rate: Sample rate of the output.
+      zero_crossings: Zero crossings of the sinc on each side. More give a
+        sharper cutoff at a higher cost.
+
+    Raises:
+      ValueError: Sample rates must be positive integers.
+    """
+    self._input_rate = input_rate
+    self._output_rate = output_rate
+    self._up_factor, self._down_factor = _get_rate_ratio(
+        input_rate, output_rate)
+    self._filter_bank = _get_filter_bank(
+        self._up_factor, self._down_factor, zero_crossings)
+    self._filter_matrix = _get_filter_matrix(
+        self._up_factor, self._down_factor, zero_crossings)
+    self._half_taps = self._filter_bank.shape[1] // 2
+    self._tap_indexes = np.arange(2 * self._half_taps)
+    # Output frames per block of the filter matrix, 1 when gathering taps.
+    self._block_frames = 1
+    if self._filter_matrix is not None:
+      self._block_frames = self._filter_matrix.shape[1]
+    # Input frames before the first are silent.
+    self._input_start = -self._half_taps
+    self._input_frames = np.zeros(self._half_taps, dtype=np.float64)
+    self._number_input_frames = 0
+    self._next_output_frame = 0
+    self._min_value, self._max_value = wave_format.get_sample_range(
+        wave_format.WORKING_SAMPLE_FORMAT)
+
+  @property
+  def input_rate(self) -> int:
+    """Sample rate of the input."""
+    return self._input_rate
+
+  @property
+  def output_rate(self) -> int:
+    """Sample rate of the output."""
+    return self._output_rate
+
+  @property
+  def latency(self) -> int:
+    """Input frames that each output frame waits for."""
+    return self._half_taps
+
+  def _get_block_frames(
+          self, start_block: int, end_block: int) -> np.ndarray:
+    """Computes the output frames of blocks with the filter matrix.
+
+    Args:
+      start_block: First block to compute.
+      end_block: Block after the last block to compute. Input frames past
+        the known ones are taken as silent.
+
+    Returns:
+      Unrounded output frames of the blocks.
+    """
+    window_size = self._filter_matrix.shape[0]
+    input_step = self._block_frames * self._down_factor // self._up_factor
+    window_start = (
+        start_block * input_step - self._half_taps + 1 - self._input_start)
+    number_blocks = end_block - start_block
+    input_frames = self._input_frames[window_start:]
+    missing_frames = (number_blocks - 1) * input_step + window_size - len(
+        input_frames)
+    if missing_frames > 0:
+      input_frames = np.concatenate(
+          [input_frames, np.zeros(missing_frames, dtype=np.float64)])
+    input_windows = stride_tricks.sliding_window_view(
+        input_frames, window_size)[::input_step][:number_blocks]
+    return (input_windows @ self._filter_matrix).ravel()
+
+  def _get_tap_frames(
+          self, start_frame: int, end_frame: int) -> np.ndarray:
+    """Computes output frames by gathering the taps of each one.
+
+    Args:
+      start_frame: First output frame to compute.
+      end_frame: Frame after the last output frame to compute.
+
+    Returns:
+      Unrounded output frames.
+    """
+    output_positions = (
+        np.arange(start_frame, end_frame, dtype=np.int64) * self._down_factor)
+    base_frames = output_positions // self._up_factor
+    phases = output_positions % self._up_factor
+    tap_frames = (
+        (base_frames - self._input_start - self._half_taps + 1)
+        [:, np.newaxis] + self._tap_indexes)
+    return np.einsum(
+        'ij,ij->i', self._input_frames[tap_frames],
+        self._filter_bank[phases])
+
+  def _get_output_frames(self, end_output_frame: int) -> np.ndarray:
+    """Computes the output frames up to a frame, dropping unneeded input.
+
+    Args:
+      end_output_frame: Frame after the last output frame to compute. All
+        the input frames it depends on must be known.
+
+    Returns:
+      Samples of the output frames, in the working precision.
+    """
+    output_steps = []
+    # Blocks start at whole multiples of the block frames, so the first
+    # one may start before the next output frame.
+    first_frame = (
+        self._next_output_frame // self._block_frames * self._block_frames)
+    step_frames = max(
+        self._block_frames,
+        _OUTPUT_STEP_SIZE // self._block_frames * self._block_frames)
+    for step_start in range(first_frame, end_output_frame, step_frames):
+      step_end = min(step_start + step_frames, end_output_frame)
+      if self._filter_matrix is None:
+        output_steps.append(self._get_tap_frames(step_start, step_end))
+      else:
+        output_steps.append(self._get_block_frames(
+            step_start // self._block_frames,
+            -(-step_end // self._block_frames))[:step_end - step_start])
+    if output_steps:
+      output_steps[0] = output_steps[0][
+          self._next_output_frame - first_frame:]
+    self._next_output_frame = max(self._next_output_frame, end_output_frame)
+
+    first_needed_frame = (
+        self._next_output_frame // self._block_frames * self._block_frames *
+        self._down_factor // self._up_factor - self._half_taps + 1)
+    if first_needed_frame > self._input_start:
+      self._input_frames = self._input_frames[
+          first_needed_frame - self._input_start:]
+      self._input_start = first_needed_frame
+
+    if not output_steps:
+      return np.zeros(0, dtype=np.int16)
+    output_values = np.concatenate(output_steps)
+    np.rint(output_values, out=output_values)
+    np.clip(
+        output_values, self._min_value, self._max_value, out=output_values)
+    return output_values.astype(np.int16)
+
+  def process(self, channel_chunk: wave_mixer.ChannelSamples) -> np.ndarray:
+    """Resamples the next chunk of input.
+
+    Args:
+      channel_chunk: Next samples of the input.
+
+    Returns:
+      Int16 samples of the output frames that the input so far determines.
+    """
+    channel_chunk = np.asarray(channel_chunk, dtype=np.float64)
+    self._input_frames = np.concatenate([self._input_frames, channel_chunk])
+    self._number_input_frames += len(channel_chunk)
+    input_end = self._input_start + len(self._input_frames)
+    # Last output frame whose latest tap is a known input frame.
+    end_output_frame = (
+        ((input_end - self._half_taps) * self._up_factor - 1) //
+        self._down_factor + 1)
+    return self._get_output_frames(end_output_frame)
+
+  def flush(self) -> np.ndarray:
+    """Outputs the frames still pending at the end of the input.
+
+    Returns:
+      Int16 samples of the last output frames. The whole output has
+      get_resampled_length frames.
+    """
+    self._input_frames = np.concatenate(
+        [self._input_frames, np.zeros(self._half_taps, dtype=np.float64)])
+    end_output_frame = -(
+        -self._number_input_frames * self._up_factor // self._down_factor)
+    return self._get_output_frames(end_output_frame)
+
+
+def resample_chunks(
+        channel_chunks: Iterable[wave_mixer.ChannelSamples],
+        input_rate: int, output_rate: int) -> Iterator[np.ndarray]:
+  """Resamples chunks of samples as they are read.
+
+  Args:
+    channel_chunks: Chunks of samples of a channel.
+    input_rate: Sample rate of the chunks.
+    output_rate: Sample rate to resample to.
+
+  Yields:
+    Int16 chunks of resampled samples, of any size.
+  """
+  if input_rate == output_rate:
+    for channel_chunk in channel_chunks:
+      yield np.asarray(channel_chunk, dtype=np.int16)
+    return
+  resampler = Resampler(input_rate, output_rate)
+  for channel_chunk in channel_chunks:
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.RESAMPLE) as counters:
+      resampled_chunk = resampler.process(channel_chunk)
+      counters[wave_instrumentation.Counter.FRAMES] += len(resampled_chunk)
+    yield resampled_chunk
+  with wave_instrumentation.measure(
+          wave_instrumentation.Stage.RESAMPLE) as counters:
+    resampled_chunk = resampler.flush()
+    counters[wave_instrumentation.Counter.FRAMES] += len(resampled_chunk)
+  yield resampled_chunk
+
+
+def resample(
+        channel_samples: wave_mixer.ChannelSamples,
+        input_rate: int, output_rate: int) -> np.ndarray:
+  """Resamples the samples of a channel.
+
+  Args:
+    channel_samples: Samples of the channel.
+    input_rate: Sample rate of the samples.
+    output_rate: Sample rate to resample to.
+
+  Returns:
+    Int16 resampled samples.
+  """
+  return np.concatenate(list(resample_chunks(
+      [channel_samples], input_rate, output_rate)))
+
+
+def get_preview_samples(
+        wave_sound_generator: wave_generator.WaveSoundGenerator,
+        duration: float, sound_wave_type: wave_generator.SoundWaveType,
+        preview_sample_rate: int,
+        wave_specific_options: Optional[wave_generator.WaveOptions] = None
+) -> np.ndarray:
+  """Renders a sound wave at a low sample rate, upsampled to its own rate.
+
+  Rendering costs in proportion to the preview sample rate, for quick
+  iterations. Frequencies above half the preview sample rate are lost.
+
+  Args:
+    wave_sound_generator: Generator of the sound wave.
+    duration: Duration of the sound wave.
+    sound_wave_type: Type of sound wave to generate.
+    preview_sample_rate: Sample rate to render at.
+    wave_specific_options: Modifiers to the specific wave. Its SAMPLE_RATE
+      is the rate of the output.
+
+  Returns:
+    Int16 samples, at the sample rate of the wave.
+  """
+  output_rate = wave_sound_generator.get_wave_spec(
+      wave_specific_options).sample_rate
+  preview_options = dict(wave_specific_options or {})
+  preview_options[wave_generator.SoundWaveOption.SAMPLE_RATE] = (
+      preview_sample_rate)
+  preview_blocks = wave_sound_generator.get_wave_sound_blocks(
+      duration, sound_wave_type, preview_options)
+  return np.concatenate(list(resample_chunks(
+      preview_blocks, preview_sample_rate, output_rate)))
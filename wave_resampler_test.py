@@ -0,0 +1,120 @@
+"""Tests that resampled samples keep their tones and drop out-of-band ones."""
+
+import numpy as np
+import unittest
+import wave_resampler
+
+
+# Input and output sample rates compared.
+_RATE_PAIRS = (
+    (44100, 48000),
+    (44100, 44101),
+    (48000, 44100),
+    (44100, 22050),
+    (8000, 44100),
+)
+# Input and output sample rates of downsampling, with a tone above the
+# output Nyquist frequency.
+_OUT_OF_BAND_TONES = (
+    (96000, 44100, 30000),
+    (48000, 8000, 6000),
+    (44100, 22050, 15000),
+)
+# Duration of the resampled tones, in seconds.
+_DURATION = 0.5
+# Amplitude of the resampled tones.
+_AMPLITUDE = 10000
+# Frequency of the tones in the passband of every rate pair.
+_PASSBAND_FREQUENCY = 1000
+# Largest difference allowed from the ideal passband tone, with rounding.
+_MAX_PASSBAND_ERROR = 2
+# Largest sample allowed of a tone above the output Nyquist frequency.
+_MAX_STOPBAND_VALUE = 2
+
+
+def _get_tone(
+        sample_rate: int, frequency: float, number_frames: int) -> np.ndarray:
+  """Gets the values of a sine tone.
+
+  Args:
+    sample_rate: Frames per second of the tone.
+    frequency: Frequency of the tone.
+    number_frames: Number of frames.
+
+  Returns:
+    Float values of the tone.
+  """
+  return _AMPLITUDE * np.sin(
+      2 * np.pi * frequency * np.arange(number_frames) / sample_rate)
+
+
+def _get_steady_part(output_values: np.ndarray) -> np.ndarray:
+  """Gets the output without the filter transients at its start and end."""
+  edge_frames = len(output_values) // 10
+  return output_values[edge_frames:-edge_frames]
+
+
+class ResamplerTest(unittest.TestCase):
+  """Checks resampled tones for several rate pairs.
+
+  Methods:
+    test_output_length: Output has get_resampled_length frames.
+    test_chunks_equal_whole: Chunked output equals whole output.
+    test_passband_error: Tones in the passband are kept.
+    test_out_of_band_attenuation: Tones above the output Nyquist are dropped.
+  """
+
+  def setUp(self):
+    self._random_generator = np.random.default_rng(3)
+
+  def test_output_length(self):
+    for input_rate, output_rate in _RATE_PAIRS:
+      for number_frames in (0, 1, 999, int(_DURATION * input_rate)):
+        expected_length = -(-number_frames * output_rate // input_rate)
+        self.assertEqual(
+            wave_resampler.get_resampled_length(
+                number_frames, input_rate, output_rate), expected_length)
+        self.assertEqual(len(wave_resampler.resample(
+            np.zeros(number_frames, dtype=np.int16), input_rate,
+            output_rate)), expected_length)
+
+  def test_chunks_equal_whole(self):
+    for input_rate, output_rate in _RATE_PAIRS:
+      input_values = self._random_generator.integers(
+          -20000, 20000, int(_DURATION * input_rate)).astype(np.int16)
+      chunk_ends = np.sort(self._random_generator.integers(
+          0, len(input_values), 20))
+      input_chunks = np.split(input_values, chunk_ends)
+      chunked_values = np.concatenate(list(wave_resampler.resample_chunks(
+          input_chunks, input_rate, output_rate)))
+      np.testing.assert_array_equal(
+          chunked_values,
+          wave_resampler.resample(input_values, input_rate, output_rate),
+          err_msg=f'{input_rate} to {output_rate}')
+
+  def test_passband_error(self):
+    for input_rate, output_rate in _RATE_PAIRS:
+      input_values = np.rint(_get_tone(
+          input_rate, _PASSBAND_FREQUENCY, int(_DURATION * input_rate)))
+      output_values = wave_resampler.resample(
+          input_values, input_rate, output_rate)
+      expected_values = _get_tone(
+          output_rate, _PASSBAND_FREQUENCY, len(output_values))
+      errors = np.abs(output_values - expected_values)
+      self.assertLessEqual(
+          _get_steady_part(errors).max(), _MAX_PASSBAND_ERROR,
+          msg=f'{input_rate} to {output_rate}')
+
+  def test_out_of_band_attenuation(self):
+    for input_rate, output_rate, frequency in _OUT_OF_BAND_TONES:
+      input_values = _get_tone(
+          input_rate, frequency, int(_DURATION * input_rate))
+      output_values = wave_resampler.resample(
+          input_values, input_rate, output_rate)
+      self.assertLessEqual(
+          np.abs(_get_steady_part(output_values)).max(), _MAX_STOPBAND_VALUE,
+          msg=f'{frequency} Hz from {input_rate} to {output_rate}')
+
+
+if __name__ == '__main__':
+  unittest.main()
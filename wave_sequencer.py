@@ -0,0 +1,347 @@
+"""Renders timelines of notes, each with its own wave and envelope.
+
+  sequencer = wave_sequencer.Sequencer(generator, [
+      wave_sequencer.Note(0, 0.5, wave_generator.SoundWaveType.SIN_WAVE,
+                          {wave_generator.SoundWaveOption.FREQUENCY: 440},
+                          wave_sequencer.Envelope(0.01, 0.1, 0.7, 0.2)),
+      wave_sequencer.Note(0.5, 1, wave_generator.SoundWaveType.SQUARE_WAVE),
+  ])
+  sequencer.write({wave_creator.SoundFileOption.FILE_NAME: 'track.wav'})
+
+The track is rendered block by block. Each block only computes the notes
+that sound in it, and only over the frames where they sound, adding them
+into the block in place. Rendering costs in proportion to the frames of the
+notes, not to the length of the track times the number of notes. Each note
+starts its wave at frame 0, as if it were rendered alone.
+"""
+
+import numpy as np
+import wave_creator
+import wave_generator
+import wave_instrumentation
+import wave_mixer
+import wave_settings
+import wave_writer
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+
+
+class Envelope(NamedTuple):
+  """ADSR envelope of the gain of a note.
+
+  The gain rises linearly from 0 to 1 over the attack, falls linearly to the
+  sustain level over the decay, and holds it until the note ends. It then
+  falls linearly to 0 over the release, after the duration of the note.
+  """
+  # Seconds from 0 to full gain.
+  attack: float = 0.0
+  # Seconds from full gain to the sustain level.
+  decay: float = 0.0
+  # Gain held until the note ends, from 0 to 1.
+  sustain: float = 1.0
+  # Seconds from the gain at the end of the note to 0.
+  release: float = 0.0
+
+
+class Note(NamedTuple):
+  """Sound wave played over a span of a track."""
+  # Seconds from the start of the track.
+  start: float
+  # Seconds until the release, if any, starts.
+  duration: float
+  sound_wave_type: wave_generator.SoundWaveType
+  wave_specific_options: Optional[wave_generator.WaveOptions] = None
+  # Envelope of the gain, or None for full gain over the duration.
+  envelope: Optional[Envelope] = None
+  gain: float = 1.0
+  # Channel of the track the note is added to.
+  channel: int = 0
+
+
+def get_envelope_gains(
+        envelope: Envelope, note_frames: np.ndarray, number_frames: int,
+        sample_rate: int) -> np.ndarray:
+  """Gets the gains of an envelope at some frames of a note.
+
+  Args:
+    envelope: Envelope of the note.
+    note_frames: Frames from the start of the note.
+    number_frames: Frames of the note before its release.
+    sample_rate: Number of frames per second.
+
+  Returns:
+    Float64 gain of each frame.
+  """
+  attack_frames = round(envelope.attack * sample_rate)
+  decay_frames = round(envelope.decay * sample_rate)
+  release_frames = round(envelope.release * sample_rate)
+
+  def get_held_gains(frames: np.ndarray) -> np.ndarray:
+    """Gets the gains of frames as if the note had not ended."""
+    held_gains = np.full(len(frames), float(envelope.sustain))
+    if decay_frames:
+      in_decay = frames < attack_frames + decay_frames
+      held_gains[in_decay] = 1 - (1 - envelope.sustain) * (
+          frames[in_decay] - attack_frames) / decay_frames
+    if attack_frames:
+      in_attack = frames < attack_frames
+      held_gains[in_attack] = frames[in_attack] / attack_frames
+    return held_gains
+
+  gains = get_held_gains(note_frames)
+  in_release = note_frames >= number_frames
+  if np.any(in_release):
+    release_gain = get_held_gains(np.array([number_frames]))[0]
+    release_progress = (
+        (note_frames[in_release] - number_frames + 1) /
+        (release_frames + 1))
+    gains[in_release] = release_gain * np.maximum(1 - release_progress, 0)
+  return gains
+
+
+class _ScheduledNote(object):
+  """Note of a track, with its resolved frames and wave function.
+
+  Methods:
+    note: Note rendered.
+    start_frame: First frame of the note in the track.
+    number_frames: Frames of the note before its release.
+    end_frame: Frame after the last frame of the note, with its release.
+    wave_block_function: Block function of the wave of the note, while it
+      sounds.
+  """
+
+  def __init__(
+          self, note: Note, start_frame: int, number_frames: int,
+          end_frame: int):
+    """Instantiates an _ScheduledNote.
+
+    Args:
+      note: Note rendered.
+      start_frame: First frame of the note in the track.
+      number_frames: Frames of the note before its release.
+      end_frame: Frame after the last frame of the note, with its release.
+    """
+    self.note = note
+    self.start_frame = start_frame
+    self.number_frames = number_frames
+    self.end_frame = end_frame
+    self.wave_block_function = None
+
+
+class Sequencer(object):
+  """Track of notes, rendered block by block.
+
+  Methods:
+    sample_rate: Number of frames per second of the track.
+    number_channels: Number of channels of the track.
+    number_frames: Frames of the track, up to the end of its last note.
+    get_blocks: Renders the track block by block.
+    render: Renders the track into one buffer per channel.
+    write: Renders the track into a sound file.
+  """
+
+  def __init__(
+          self, wave_sound_generator: wave_generator.WaveSoundGenerator,
+          notes: Sequence[Note], number_channels: Optional[int] = None):
+    """Instantiates a Sequencer.
+
+    Args:
+      wave_sound_generator: Generator of the waves of the notes.
+      notes: Notes of the track, in any order.
+      number_channels: Number of channels of the track. Defaults to one
+        more than the highest channel of a note.
+
+    Raises:
+      ValueError: Notes must have non-negative starts and durations,
+        envelopes of non-negative times and a sustain from 0 to 1, channels
+        of the track and the same sample rate.
+    """
+    self._wave_sound_generator = wave_sound_generator
+    sample_rates = {
+        wave_sound_generator.get_wave_spec(note.wave_specific_options)
+        .sample_rate for note in notes}
+    if len(sample_rates) > 1:
+      raise ValueError('All notes must have the same sample rate.')
+    self._sample_rate = (
+        sample_rates.pop() if sample_rates else
+        wave_sound_generator.get_wave_spec().sample_rate)
+    if number_channels is None:
+      number_channels = 1 + max((note.channel for note in notes), default=0)
+    self._number_channels = number_channels
+
+    self._scheduled_notes = []
+    for note in notes:
+      self._check_note(note)
+      start_frame = round(note.start * self._sample_rate)
+      number_frames = round(note.duration * self._sample_rate)
+      release_frames = 0
+      if note.envelope is not None:
+        release_frames = round(note.envelope.release * self._sample_rate)
+      self._scheduled_notes.append(_ScheduledNote(
+          note, start_frame, number_frames,
+          start_frame + number_frames + release_frames))
+    self._scheduled_notes.sort(
+        key=lambda scheduled_note: scheduled_note.start_frame)
+    self._number_frames = max(
+        (scheduled_note.end_frame
+         for scheduled_note in self._scheduled_notes), default=0)
+
+  def _check_note(self, note: Note):
+    """Checks that a note can be rendered in the track.
+
+    Args:
+      note: Note to check.
+
+    Raises:
+      ValueError: Note must have a non-negative start and duration, an
+        envelope of non-negative times and a sustain from 0 to 1, and a
+        channel of the track.
+    """
+    if note.start < 0 or note.duration < 0:
+      raise ValueError(
+          f'Note start and duration must not be negative, got {note.start} '
+          f'and {note.duration}.')
+    if not 0 <= note.channel < self._number_channels:
+      raise ValueError(
+          f'Note channel must be from 0 to {self._number_channels - 1}, got '
+          f'{note.channel}.')
+    envelope = note.envelope
+    if envelope is None:
+      return
+    if min(envelope.attack, envelope.decay, envelope.release) < 0:
+      raise ValueError(f'Envelope times must not be negative: {envelope}')
+    if not 0 <= envelope.sustain <= 1:
+      raise ValueError(
+          f'Envelope sustain must be from 0 to 1, got {envelope.sustain}.')
+
+  @property
+  def sample_rate(self) -> int:
+    """Number of frames per second of the track."""
+    return self._sample_rate
+
+  @property
+  def number_channels(self) -> int:
+    """Number of channels of the track."""
+    return self._number_channels
+
+  @property
+  def number_frames(self) -> int:
+    """Frames of the track, up to the end of its last note."""
+    return self._number_frames
+
+  def _add_note_frames(
+          self, scheduled_note: _ScheduledNote, channel_block: np.ndarray,
+          block_start: int):
+    """Adds the frames of a note that sound in a block to the block.
+
+    Args:
+      scheduled_note: Note to add.
+      channel_block: Float64 values of the block of the note's channel.
+      block_start: Frame of the track at the start of the block.
+    """
+    note_start = max(scheduled_note.start_frame, block_start)
+    note_end = min(scheduled_note.end_frame, block_start + len(channel_block))
+    if note_end <= note_start:
+      return
+    with wave_instrumentation.measure(
+            wave_instrumentation.Stage.SYNTHESIS) as counters:
+      note_frames = np.arange(
+          note_start - scheduled_note.start_frame,
+          note_end - scheduled_note.start_frame, dtype=np.int64)
+      note_values = scheduled_note.wave_block_function(note_frames).astype(
+          np.float64)
+      note = scheduled_note.note
+      if note.envelope is not None:
+        note_values *= get_envelope_gains(
+            note.envelope, note_frames, scheduled_note.number_frames,
+            self._sample_rate)
+      if note.gain != 1:
+        note_values *= note.gain
+      channel_block[note_start - block_start:note_end - block_start] += (
+          note_values)
+      counters[wave_instrumentation.Counter.FRAMES] += len(note_frames)
+
+  def get_blocks(
+          self, block_size: int = wave_settings.RENDER_BLOCK_SIZE
+  ) -> Iterator[List[np.ndarray]]:
+    """Renders the track block by block, as blocks are read.
+
+    Wave functions are built when their note starts and dropped when it
+    ends, so only the notes sounding in a block are held.
+
+    Args:
+      block_size: Max number of frames per block.
+
+    Yields:
+      Int16 block of each channel.
+    """
+    next_note = 0
+    sounding_notes = []
+    for block_start in range(0, self._number_frames, block_size):
+      block_end = min(block_start + block_size, self._number_frames)
+      while (next_note < len(self._scheduled_notes) and
+             self._scheduled_notes[next_note].start_frame < block_end):
+        scheduled_note = self._scheduled_notes[next_note]
+        with wave_instrumentation.measure(wave_instrumentation.Stage.SETUP):
+          scheduled_note.wave_block_function = (
+              self._wave_sound_generator.get_wave_block_function(
+                  scheduled_note.note.sound_wave_type,
+                  scheduled_note.note.wave_specific_options))
+        sounding_notes.append(scheduled_note)
+        next_note += 1
+
+      channels_block = np.zeros(
+          (self._number_channels, block_end - block_start), dtype=np.float64)
+      for scheduled_note in sounding_notes:
+        self._add_note_frames(
+            scheduled_note, channels_block[scheduled_note.note.channel],
+            block_start)
+      for scheduled_note in sounding_notes:
+        if scheduled_note.end_frame <= block_end:
+          scheduled_note.wave_block_function = None
+      sounding_notes = [
+          scheduled_note for scheduled_note in sounding_notes
+          if scheduled_note.end_frame > block_end]
+
+      with wave_instrumentation.measure(wave_instrumentation.Stage.MIXDOWN):
+        channels_samples = [
+            wave_mixer.limit_to_sample_range(channel_block)
+            for channel_block in channels_block]
+      yield channels_samples
+
+  def render(self) -> List[np.ndarray]:
+    """Renders the track into one buffer per channel.
+
+    Returns:
+      Int16 samples of each channel.
+    """
+    channels_samples = np.zeros(
+        (self._number_channels, self._number_frames), dtype=np.int16)
+    block_start = 0
+    for channels_block in self.get_blocks():
+      block_end = block_start + len(channels_block[0])
+      for channel_samples, channel_block in zip(
+              channels_samples, channels_block):
+        channel_samples[block_start:block_end] = channel_block
+      block_start = block_end
+    return list(channels_samples)
+
+  def write(
+          self, file_options: Optional[wave_creator.SoundFileOptions] = None,
+          block_size: int = wave_settings.RENDER_BLOCK_SIZE
+  ) -> wave_writer.WavWriter:
+    """Renders the track into a sound file, block by block.
+
+    Args:
+      file_options: File configuration. Channels are mixed by its MIX_MODE.
+      block_size: Number of frames per block.
+
+    Returns:
+      Sound file.
+    """
+    with wave_creator.SoundFileWriter(
+            self._sample_rate, self._number_channels,
+            file_options) as sound_writer:
+      for channels_block in self.get_blocks(block_size):
+        sound_writer.write_block(channels_block)
+    return sound_writer.sound_file
@@ -0,0 +1,170 @@
+"""Tests that sequenced notes follow their envelopes across blocks."""
+
+import numpy as np
+import unittest
+import wave_generator
+import wave_sequencer
+from typing import Optional
+
+
+# Frames per second of the envelopes and notes.
+_SAMPLE_RATE = 1000
+# Envelope of 10 attack, 20 decay and 5 release frames at _SAMPLE_RATE.
+_ENVELOPE = wave_sequencer.Envelope(
+    attack=0.01, decay=0.02, sustain=0.5, release=0.005)
+# Frames of the notes before their release.
+_NUMBER_FRAMES = 100
+# Frames per block of the renders split into many blocks.
+_BLOCK_SIZES = (1, 7, 64, 250)
+
+
+class EnvelopeTest(unittest.TestCase):
+  """Checks the gains of an envelope at the boundaries of its stages.
+
+  Methods:
+    test_stage_boundaries: Gains at the start and end of each stage.
+    test_release_during_attack: Release falls from the gain of the attack.
+    test_no_envelope_times: Zero times hold the sustain, then drop to 0.
+  """
+
+  def _get_gains(
+          self, envelope: wave_sequencer.Envelope,
+          number_frames: int) -> np.ndarray:
+    """Gets the gains of every frame of a note and past its release.
+
+    Args:
+      envelope: Envelope of the note.
+      number_frames: Frames of the note before its release.
+
+    Returns:
+      Gain of each frame, with 5 frames after the release.
+    """
+    release_frames = round(envelope.release * _SAMPLE_RATE)
+    return wave_sequencer.get_envelope_gains(
+        envelope, np.arange(number_frames + release_frames + 5),
+        number_frames, _SAMPLE_RATE)
+
+  def test_stage_boundaries(self):
+    gains = self._get_gains(_ENVELOPE, _NUMBER_FRAMES)
+    expected_gains = {
+        # Attack, from 0 to 1.
+        0: 0.0, 1: 0.1, 5: 0.5, 9: 0.9,
+        # Decay, from 1 to the sustain.
+        10: 1.0, 20: 0.75, 29: 0.5 + 0.5 / 20,
+        # Sustain, until the note ends.
+        30: 0.5, _NUMBER_FRAMES - 1: 0.5,
+        # Release, from the sustain to 0 over 5 frames.
+        _NUMBER_FRAMES: 0.5 * 5 / 6, _NUMBER_FRAMES + 4: 0.5 / 6,
+        _NUMBER_FRAMES + 5: 0.0, _NUMBER_FRAMES + 9: 0.0,
+    }
+    for frame, expected_gain in expected_gains.items():
+      self.assertAlmostEqual(gains[frame], expected_gain, msg=f'Frame {frame}')
+    # Each stage is linear, so gains never jump between frames.
+    self.assertLessEqual(np.abs(np.diff(gains)).max(), 0.1 + 1e-12)
+
+  def test_release_during_attack(self):
+    gains = self._get_gains(_ENVELOPE, 4)
+    np.testing.assert_allclose(gains[:4], [0.0, 0.1, 0.2, 0.3])
+    # Release starts from the gain that the attack would have reached.
+    np.testing.assert_allclose(
+        gains[4:9], 0.4 * np.arange(5, 0, -1) / 6)
+    np.testing.assert_array_equal(gains[9:], 0.0)
+
+  def test_no_envelope_times(self):
+    gains = self._get_gains(
+        wave_sequencer.Envelope(sustain=0.25), _NUMBER_FRAMES)
+    np.testing.assert_array_equal(gains[:_NUMBER_FRAMES], 0.25)
+    np.testing.assert_array_equal(gains[_NUMBER_FRAMES:], 0.0)
+
+
+class SequencerTest(unittest.TestCase):
+  """Checks rendered tracks and the validation of their notes.
+
+  Methods:
+    test_blocks_equal_single_block: Notes across blocks render the same.
+    test_out_of_range_channels: Notes of channels not in the track fail.
+  """
+
+  def setUp(self):
+    self._wave_sound_generator = wave_generator.WaveSoundGenerator()
+
+  def _get_note(
+          self, start: float, duration: float,
+          sound_wave_type: wave_generator.SoundWaveType,
+          envelope: Optional[wave_sequencer.Envelope] = None,
+          channel: int = 0, **wave_options) -> wave_sequencer.Note:
+    """Gets a note at _SAMPLE_RATE.
+
+    Args:
+      start: Seconds from the start of the track.
+      duration: Seconds until the release.
+      sound_wave_type: Type of sound wave of the note.
+      envelope: Envelope of the gain of the note.
+      channel: Channel of the track the note is added to.
+      **wave_options: Modifiers to the wave, by SoundWaveOption value.
+
+    Returns:
+      Note.
+    """
+    wave_specific_options = {
+        wave_generator.SoundWaveOption.SAMPLE_RATE: _SAMPLE_RATE}
+    for option_name, option_value in wave_options.items():
+      wave_specific_options[
+          wave_generator.SoundWaveOption(option_name)] = option_value
+    return wave_sequencer.Note(
+        start, duration, sound_wave_type, wave_specific_options, envelope,
+        channel=channel)
+
+  def test_blocks_equal_single_block(self):
+    notes = [
+        self._get_note(
+            0.0123, 0.3, wave_generator.SoundWaveType.SIN_WAVE, _ENVELOPE,
+            frequency=30),
+        self._get_note(
+            0.1, 0.25, wave_generator.SoundWaveType.SQUARE_WAVE,
+            wave_sequencer.Envelope(0.05, 0, 1, 0.1), channel=1),
+        self._get_note(
+            0.2, 0.2, wave_generator.SoundWaveType.RANDOM_WAVE, channel=1,
+            seed=7, volume=0.3),
+        self._get_note(
+            0.25, 0.1, wave_generator.SoundWaveType.SAWTOOTH_WAVE, _ENVELOPE,
+            frequency=50),
+    ]
+    sequencer = wave_sequencer.Sequencer(self._wave_sound_generator, notes)
+    number_frames = sequencer.number_frames
+    # The square note ends last, after its release.
+    self.assertEqual(number_frames, round(0.45 * _SAMPLE_RATE))
+    single_block, = sequencer.get_blocks(number_frames)
+    self.assertTrue(all(
+        np.any(channel_block) for channel_block in single_block))
+
+    for block_size in _BLOCK_SIZES:
+      blocks = list(sequencer.get_blocks(block_size))
+      self.assertEqual(len(blocks), -(-number_frames // block_size))
+      for channel, channel_samples in enumerate(single_block):
+        np.testing.assert_array_equal(
+            np.concatenate([
+                channels_block[channel] for channels_block in blocks]),
+            channel_samples, err_msg=f'Block size {block_size}')
+    for channel_samples, channel_block in zip(
+            sequencer.render(), single_block):
+      np.testing.assert_array_equal(channel_samples, channel_block)
+
+  def test_out_of_range_channels(self):
+    for channel in (-1, 2, 3):
+      with self.assertRaises(ValueError):
+        wave_sequencer.Sequencer(
+            self._wave_sound_generator,
+            [self._get_note(
+                0, 0.1, wave_generator.SoundWaveType.SIN_WAVE,
+                channel=channel)],
+            number_channels=2)
+    sequencer = wave_sequencer.Sequencer(
+        self._wave_sound_generator,
+        [self._get_note(
+            0, 0.1, wave_generator.SoundWaveType.SIN_WAVE, channel=2)])
+    self.assertEqual(sequencer.number_channels, 3)
+
+
+if __name__ == '__main__':
+  unittest.main()
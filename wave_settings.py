@@ -3,3 +3,32 @@
 # 2 bytes because of using signed short integers => bit depth = INT16
 BYTES_OF_DATA = 2
 SIGNED_INTEGER = True
+
+# Number of frames computed at once when rendering in blocks.
+RENDER_BLOCK_SIZE = 65536
+
+# Max number of wave cycles kept in the wavetable cache.
+WAVETABLE_CACHE_SIZE = 128
+
+# Number of frames generated together from a seed by random waves.
+RANDOM_BLOCK_SIZE = 4096
+
+# Number of frames of each segment when rendering in parallel.
+PARALLEL_SEGMENT_SIZE = 2 ** 20
+
+# Max bytes of rendered samples kept in memory by a render cache.
+RENDER_CACHE_MEMORY_BYTES = 64 * 2 ** 20
+
+# Number of frames of each buffer when streaming in real time.
+REALTIME_BUFFER_SIZE = 512
+
+# Max number of buffers queued ahead of a real-time sink. Bounds the latency
+# from a change of wave options to hearing it.
+REALTIME_MAX_BUFFERS = 4
+
+# Zero crossings on each side of the windowed sinc used to resample. More
+# give a sharper cutoff at a higher cost per frame.
+RESAMPLER_ZERO_CROSSINGS = 16
+
+# Max number of resampling filter banks kept in the filter cache.
+RESAMPLER_FILTER_CACHE_SIZE = 16
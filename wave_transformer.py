@@ -0,0 +1,448 @@
+"""Transforms blocks of samples with pipelines of vectorized stages.
+
+A TransformerPipeline can be the WAVE_TRANSFORMER option of a wave instead
+of a per-sample callable:
+
+  wave_transformer.TransformerPipeline([
+      wave_transformer.Gain(0.2),
+      wave_transformer.FadeIn(4410),
+      wave_transformer.BitCrush(8),
+  ])
+
+Stages work on whole blocks of samples. The pipeline fuses consecutive
+gains and DC offsets into a single multiply-add, and every stage works in
+place on one float buffer, so a block is copied once whatever the number
+of stages. Per-sample callables are still supported, as a slower stage.
+"""
+
+import abc
+import hashlib
+import numpy as np
+from typing import Any, Callable, Optional, Sequence, Text
+
+# Bits of the samples that stages get, int16.
+_SAMPLE_BITS = 16
+
+
+class TransformerStage(abc.ABC):
+  """Stage of a transformer pipeline.
+
+  Methods:
+    depends_on_frame: Whether samples change with their frame position.
+    cache_key: Stable description of the stage, if deterministic.
+    apply: Transforms a block of samples in place.
+  """
+
+  # Whether the same sample value is transformed differently by frame.
+  depends_on_frame = False
+
+  @property
+  def cache_key(self) -> Optional[Text]:
+    """Stable description of the stage, or None if it cannot be keyed.
+
+    Stages are not keyed unless they override it, as their default repr
+    holds their address, which differs between processes and can be reused.
+    """
+    return None
+
+  @abc.abstractmethod
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    """Transforms a block of samples in place.
+
+    Args:
+      sample_values: Float64 values of the samples, transformed in place.
+      sample_frames: Frame of each sample.
+    """
+
+
+class _KeyedStage(TransformerStage):
+  """Built-in stage whose repr describes all it does, keyed by its repr."""
+
+  @property
+  def cache_key(self) -> Optional[Text]:
+    # Subclasses defined elsewhere may change what the stage does.
+    if type(self).__module__ != __name__:
+      return None
+    return repr(self)
+
+
+class _AffineStage(_KeyedStage):
+  """Stage that scales samples and then adds an offset to them."""
+
+  def __init__(self, scale: float, offset: float):
+    """Instantiates an _AffineStage.
+
+    Args:
+      scale: Factor to multiply samples by.
+      offset: Value to add to samples, after scaling.
+    """
+    self.scale = scale
+    self.offset = offset
+
+  def __repr__(self) -> Text:
+    return f'Affine({self.scale!r}, {self.offset!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    if self.scale != 1:
+      np.multiply(sample_values, self.scale, out=sample_values)
+    if self.offset != 0:
+      np.add(sample_values, self.offset, out=sample_values)
+
+
+class Gain(_AffineStage):
+  """Multiplies samples by a factor."""
+
+  def __init__(self, factor: float):
+    """Instantiates a Gain.
+
+    Args:
+      factor: Factor to multiply samples by.
+    """
+    super().__init__(factor, 0)
+
+  def __repr__(self) -> Text:
+    return f'Gain({self.scale!r})'
+
+
+class DcOffset(_AffineStage):
+  """Adds a constant to samples."""
+
+  def __init__(self, offset: float):
+    """Instantiates a DcOffset.
+
+    Args:
+      offset: Value to add to samples.
+    """
+    super().__init__(1, offset)
+
+  def __repr__(self) -> Text:
+    return f'DcOffset({self.offset!r})'
+
+
+class Clip(_KeyedStage):
+  """Limits samples to a range."""
+
+  def __init__(self, min_value: float, max_value: float):
+    """Instantiates a Clip.
+
+    Args:
+      min_value: Min value that samples can take.
+      max_value: Max value that samples can take.
+
+    Raises:
+      ValueError: min_value must not be above max_value.
+    """
+    if min_value > max_value:
+      raise ValueError(f'Empty clip range: [{min_value}, {max_value}].')
+    self._min_value = min_value
+    self._max_value = max_value
+
+  def __repr__(self) -> Text:
+    return f'Clip({self._min_value!r}, {self._max_value!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    np.clip(sample_values, self._min_value, self._max_value, out=sample_values)
+
+
+class Quantize(_KeyedStage):
+  """Rounds samples to the nearest multiple of a step."""
+
+  def __init__(self, step: float):
+    """Instantiates a Quantize.
+
+    Args:
+      step: Distance between the allowed sample values.
+
+    Raises:
+      ValueError: step must be positive.
+    """
+    if step <= 0:
+      raise ValueError(f'Quantization step must be positive, got {step}.')
+    self._step = step
+
+  def __repr__(self) -> Text:
+    return f'Quantize({self._step!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    np.divide(sample_values, self._step, out=sample_values)
+    np.round(sample_values, out=sample_values)
+    np.multiply(sample_values, self._step, out=sample_values)
+
+
+class BitCrush(_KeyedStage):
+  """Reduces the bit depth of samples, dropping their lowest bits."""
+
+  def __init__(self, bits: int):
+    """Instantiates a BitCrush.
+
+    Args:
+      bits: Bits of resolution to keep, from 1 to 16.
+
+    Raises:
+      ValueError: bits must be from 1 to 16.
+    """
+    if not 1 <= bits <= _SAMPLE_BITS:
+      raise ValueError(
+          f'Bits must be from 1 to {_SAMPLE_BITS}, got {bits}.')
+    self._bits = bits
+    self._step = 2 ** (_SAMPLE_BITS - bits)
+
+  def __repr__(self) -> Text:
+    return f'BitCrush({self._bits!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    np.floor_divide(sample_values, self._step, out=sample_values)
+    np.multiply(sample_values, self._step, out=sample_values)
+
+
+class FadeIn(_KeyedStage):
+  """Raises the gain linearly from 0 to 1 over the first frames."""
+
+  depends_on_frame = True
+
+  def __init__(self, number_frames: int, start_frame: int = 0):
+    """Instantiates a FadeIn.
+
+    Args:
+      number_frames: Number of frames of the fade.
+      start_frame: First frame of the fade. Frames before it are silent.
+
+    Raises:
+      ValueError: number_frames must be positive.
+    """
+    if number_frames < 1:
+      raise ValueError(f'Fade frames must be positive, got {number_frames}.')
+    self._number_frames = number_frames
+    self._start_frame = start_frame
+
+  def __repr__(self) -> Text:
+    return f'FadeIn({self._number_frames!r}, {self._start_frame!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    fade_gains = (sample_frames - self._start_frame) / self._number_frames
+    np.clip(fade_gains, 0, 1, out=fade_gains)
+    np.multiply(sample_values, fade_gains, out=sample_values)
+
+
+class FadeOut(_KeyedStage):
+  """Lowers the gain linearly from 1 to 0 over the frames before an end."""
+
+  depends_on_frame = True
+
+  def __init__(self, number_frames: int, end_frame: int):
+    """Instantiates a FadeOut.
+
+    Args:
+      number_frames: Number of frames of the fade.
+      end_frame: Frame after the last frame of the fade, e.g. the number of
+        frames of the sound. Frames from it on are silent.
+
+    Raises:
+      ValueError: number_frames must be positive.
+    """
+    if number_frames < 1:
+      raise ValueError(f'Fade frames must be positive, got {number_frames}.')
+    self._number_frames = number_frames
+    self._end_frame = end_frame
+
+  def __repr__(self) -> Text:
+    return f'FadeOut({self._number_frames!r}, {self._end_frame!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    fade_gains = (self._end_frame - sample_frames) / self._number_frames
+    np.clip(fade_gains, 0, 1, out=fade_gains)
+    np.multiply(sample_values, fade_gains, out=sample_values)
+
+
+def _get_argument_key(argument: Any) -> Text:
+  """Gets a stable description of an argument of a stage.
+
+  Args:
+    argument: Argument of the stage.
+
+  Returns:
+    Type, shape and digest of the bytes of arrays, else repr of argument.
+  """
+  if isinstance(argument, np.ndarray):
+    digest = hashlib.sha256(
+        np.ascontiguousarray(argument).tobytes()).hexdigest()
+    return f'array({argument.dtype.str}, {argument.shape}, {digest})'
+  return repr(argument)
+
+
+class Ufunc(TransformerStage):
+  """Applies a NumPy ufunc to samples, e.g. np.tanh or np.maximum."""
+
+  def __init__(self, ufunc: np.ufunc, *args: Any):
+    """Instantiates a Ufunc.
+
+    Args:
+      ufunc: Ufunc whose first argument is the samples.
+      *args: Other arguments of the ufunc.
+
+    Raises:
+      ValueError: ufunc must be a built-in NumPy ufunc with one output,
+        taking the samples and args.
+    """
+    if not isinstance(ufunc, np.ufunc):
+      raise ValueError(f'Not a NumPy ufunc: {ufunc!r}')
+    # Ufuncs of np.frompyfunc give objects, and are keyed by name only.
+    if getattr(np, ufunc.__name__, None) is not ufunc:
+      raise ValueError(f'Not a built-in NumPy ufunc: {ufunc!r}')
+    if ufunc.nout != 1:
+      raise ValueError(
+          f'{ufunc.__name__} has {ufunc.nout} outputs, expected 1.')
+    if ufunc.nin != 1 + len(args):
+      raise ValueError(
+          f'{ufunc.__name__} takes {ufunc.nin} inputs, got {1 + len(args)}.')
+    self._ufunc = ufunc
+    self._args = args
+
+  @property
+  def cache_key(self) -> Optional[Text]:
+    # Large arrays are elided by repr, so arrays are keyed by their bytes.
+    args = ''.join(f', {_get_argument_key(arg)}' for arg in self._args)
+    return f'Ufunc(np.{self._ufunc.__name__}{args})'
+
+  def __repr__(self) -> Text:
+    args = ''.join(f', {arg!r}' for arg in self._args)
+    return f'Ufunc(np.{self._ufunc.__name__}{args})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    self._ufunc(sample_values, *self._args, out=sample_values)
+
+
+class PerSampleFunction(TransformerStage):
+  """Calls a Python function on each sample. Much slower than other stages.
+
+  The function gets each sample truncated to an int, as WAVE_TRANSFORMER
+  callables do.
+  """
+
+  def __init__(self, function: Callable[[int], float]):
+    """Instantiates a PerSampleFunction.
+
+    Args:
+      function: Function that transforms a sample.
+    """
+    self._function = function
+
+  def __repr__(self) -> Text:
+    return f'PerSampleFunction({self._function!r})'
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    sample_values[:] = np.fromiter(
+        map(self._function, sample_values.astype(np.int64).tolist()),
+        dtype=np.float64, count=len(sample_values))
+
+
+def _fuse_stages(
+        stages: Sequence[TransformerStage]) -> Sequence[TransformerStage]:
+  """Fuses consecutive gains and DC offsets into single stages.
+
+  Args:
+    stages: Stages of a pipeline.
+
+  Returns:
+    Equivalent stages, with no two affine stages in a row.
+  """
+  fused_stages = []
+  for stage in stages:
+    if (isinstance(stage, _AffineStage) and fused_stages and
+            isinstance(fused_stages[-1], _AffineStage)):
+      previous_stage = fused_stages.pop()
+      # (x * a + b) * c + d = x * (a * c) + (b * c + d)
+      stage = _AffineStage(
+          previous_stage.scale * stage.scale,
+          previous_stage.offset * stage.scale + stage.offset)
+    fused_stages.append(stage)
+  return fused_stages
+
+
+class TransformerPipeline(object):
+  """Transforms blocks of samples with a sequence of stages.
+
+  Methods:
+    stages: Stages, in order.
+    depends_on_frame: Whether samples change with their frame position.
+    cache_key: Stable description of the pipeline, if deterministic.
+    apply: Transforms a block of float samples in place.
+    transform_block: Transforms a block of samples.
+    transform_frame: Transforms a single sample.
+  """
+
+  def __init__(self, stages: Sequence[TransformerStage]):
+    """Instantiates a TransformerPipeline.
+
+    Args:
+      stages: Stages to apply, in order.
+
+    Raises:
+      ValueError: Stages must be TransformerStages.
+    """
+    for stage in stages:
+      if not isinstance(stage, TransformerStage):
+        raise ValueError(f'Not a transformer stage: {stage!r}')
+    self._stages = tuple(stages)
+    self._fused_stages = _fuse_stages(self._stages)
+
+  def __repr__(self) -> Text:
+    return f'TransformerPipeline({list(self._stages)!r})'
+
+  @property
+  def stages(self) -> Sequence[TransformerStage]:
+    """Stages, in order."""
+    return self._stages
+
+  @property
+  def depends_on_frame(self) -> bool:
+    """Whether the same sample value is transformed differently by frame."""
+    return any(stage.depends_on_frame for stage in self._stages)
+
+  @property
+  def cache_key(self) -> Optional[Text]:
+    """Stable description of the pipeline, or None if it cannot be keyed."""
+    stage_keys = [stage.cache_key for stage in self._stages]
+    if None in stage_keys:
+      return None
+    return repr(stage_keys)
+
+  def apply(self, sample_values: np.ndarray, sample_frames: np.ndarray):
+    """Transforms a block of float samples in place, without truncating.
+
+    Args:
+      sample_values: Float64 values of the samples, transformed in place.
+      sample_frames: Frame of each sample.
+    """
+    for stage in self._fused_stages:
+      stage.apply(sample_values, sample_frames)
+
+  def transform_block(
+          self, sample_values: np.ndarray,
+          sample_frames: np.ndarray) -> np.ndarray:
+    """Transforms a block of samples.
+
+    Args:
+      sample_values: Values of the samples.
+      sample_frames: Frame of each sample.
+
+    Returns:
+      Int64 transformed values, truncated towards zero as int() does.
+    """
+    transformed_values = np.array(sample_values, dtype=np.float64)
+    self.apply(transformed_values, sample_frames)
+    return transformed_values.astype(np.int64)
+
+  def transform_frame(self, sample_value: int, sample_frame: int) -> int:
+    """Transforms a single sample.
+
+    Args:
+      sample_value: Value of the sample.
+      sample_frame: Frame of the sample.
+
+    Returns:
+      Transformed value, truncated towards zero as int() does.
+    """
+    return int(self.transform_block(
+        np.array([sample_value], dtype=np.float64),
+        np.array([sample_frame], dtype=np.int64))[0])
@@ -0,0 +1,38 @@
+"""Tests that transformer stages are validated and keyed safely."""
+
+import numpy as np
+import unittest
+import wave_transformer
+
+
+class UfuncTest(unittest.TestCase):
+  """Checks which ufuncs Ufunc stages accept and how they are keyed.
+
+  Methods:
+    test_built_in_ufunc: Built-in ufuncs transform samples and are keyed.
+    test_python_function_ufunc: Ufuncs of np.frompyfunc are rejected.
+    test_many_outputs_ufunc: Ufuncs with more than one output are rejected.
+  """
+
+  def test_built_in_ufunc(self):
+    stage = wave_transformer.Ufunc(np.maximum, 0)
+    sample_values = np.array([-2.0, 0.0, 3.5])
+    stage.apply(sample_values, np.arange(3))
+    np.testing.assert_array_equal(sample_values, [0.0, 0.0, 3.5])
+    self.assertEqual(stage.cache_key, 'Ufunc(np.maximum, 0)')
+
+  def test_python_function_ufunc(self):
+    halve = np.frompyfunc(lambda x: x * 0.5, 1, 1)
+    double = np.frompyfunc(lambda x: x * 2, 1, 1)
+    for python_function_ufunc in (halve, double):
+      with self.assertRaises(ValueError):
+        wave_transformer.Ufunc(python_function_ufunc)
+
+  def test_many_outputs_ufunc(self):
+    for many_outputs_ufunc in (np.modf, np.frexp):
+      with self.assertRaises(ValueError):
+        wave_transformer.Ufunc(many_outputs_ufunc)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,426 @@
+"""Writes sound wave files in any sample format, block by block.
+
+WAV files store samples in a sample format, or compressed as μ-law, A-law or
+IMA ADPCM. FLAC files store them losslessly compressed.
+"""
+
+import hashlib
+import numpy as np
+import struct
+import wave_codecs
+import wave_format
+import wave_reader
+from typing import Text
+
+# Format tags of each compression type of WAV files.
+_COMPRESSION_FORMAT_TAGS = {
+    wave_codecs.CompressionType.ULAW: wave_reader.WAVE_FORMAT_MULAW,
+    wave_codecs.CompressionType.ALAW: wave_reader.WAVE_FORMAT_ALAW,
+    wave_codecs.CompressionType.IMA_ADPCM: wave_reader.WAVE_FORMAT_IMA_ADPCM,
+}
+
+# Min number of IMA ADPCM blocks encoded at once. Blocks are encoded together,
+# one sample position at a time, so encoding a few at a time is slow.
+_MIN_ENCODED_ADPCM_BLOCKS = 32
+
+
+def _get_int16_data(sample_values: np.ndarray) -> bytes:
+  """Converts working precision samples into 16-bit samples.
+
+  Args:
+    sample_values: Samples in the working precision.
+
+  Returns:
+    Little-endian int16 samples, which compressed formats encode.
+  """
+  return wave_format.encode_samples(
+      sample_values, wave_format.SampleFormat.INT16)
+
+
+class WavWriter(object):
+  """WAV file written block by block, in constant memory.
+
+  The header is written on opening, and rewritten with the final sizes when
+  the file is closed. Files that are not closed keep a zero data size, which
+  readers such as wave_reader take as all of the data in the file.
+
+  Compressed files store 16-bit samples. IMA ADPCM frames are held until
+  they fill _MIN_ENCODED_ADPCM_BLOCKS blocks, and the last block is padded
+  with silence on closing.
+
+  Methods:
+    file_name: Name of the file.
+    number_channels: Number of channels.
+    sample_rate: Number of frames per second.
+    sample_format: Format the samples are stored in.
+    compression_type: How the samples are compressed.
+    number_frames: Number of frames written.
+    data_size: Bytes of samples written.
+    write_samples: Converts and writes interleaved samples.
+    close: Finishes the file, patching its header.
+  """
+
+  def __init__(
+          self, file_name: Text, number_channels: int, sample_rate: int,
+          sample_format: wave_format.SampleFormat,
+          compression_type: wave_codecs.CompressionType = (
+              wave_codecs.CompressionType.NONE)):
+    """Instantiates a WavWriter, writing the header of the file.
+
+    Args:
+      file_name: WAV file to write.
+      number_channels: Number of channels.
+      sample_rate: Number of frames per second.
+      sample_format: Format to store the samples in.
+      compression_type: How to compress the samples.
+
+    Raises:
+      ValueError: number_channels must be at least 1, or 1 or 2 for IMA
+        ADPCM, and compressed files must have 16-bit samples.
+    """
+    if number_channels < 1:
+      raise ValueError('Must provide samples for at least one channel.')
+    if (compression_type == wave_codecs.CompressionType.IMA_ADPCM and
+            number_channels > 2):
+      raise ValueError(
+          f'IMA ADPCM WAV files have 1 or 2 channels, got {number_channels}.')
+    if (compression_type != wave_codecs.CompressionType.NONE and
+            sample_format != wave_format.SampleFormat.INT16):
+      raise ValueError(
+          f'{compression_type.value} compression needs int16 samples, got '
+          f'{sample_format.value}.')
+    self._file_name = file_name
+    self._number_channels = number_channels
+    self._sample_rate = sample_rate
+    self._sample_format = sample_format
+    self._sample_width = wave_format.get_sample_width(sample_format)
+    self._compression_type = compression_type
+    # Bytes and frames of each block of the data.
+    self._block_align = number_channels * self._sample_width
+    self._block_frames = 1
+    if compression_type in (
+            wave_codecs.CompressionType.ULAW, wave_codecs.CompressionType.ALAW):
+      self._block_align = number_channels
+    elif compression_type == wave_codecs.CompressionType.IMA_ADPCM:
+      self._block_align = wave_codecs.get_ima_adpcm_block_align(
+          number_channels, sample_rate)
+      self._block_frames = wave_codecs.get_ima_adpcm_block_frames(
+          self._block_align, number_channels)
+    # Int16 frames waiting for a whole block to be encoded.
+    self._pending_frames = np.zeros((0, number_channels), dtype=np.int16)
+    self._number_frames = 0
+    self._data_size = 0
+    self._wav_file = open(file_name, 'wb')
+    self._wav_file.write(self._get_header())
+
+  def __enter__(self) -> 'WavWriter':
+    return self
+
+  def __exit__(self, *unused_exception_info):
+    self.close()
+
+  @property
+  def file_name(self) -> Text:
+    """Name of the file."""
+    return self._file_name
+
+  @property
+  def number_channels(self) -> int:
+    """Number of channels."""
+    return self._number_channels
+
+  @property
+  def sample_rate(self) -> int:
+    """Number of frames per second."""
+    return self._sample_rate
+
+  @property
+  def sample_format(self) -> wave_format.SampleFormat:
+    """Format the samples are stored in."""
+    return self._sample_format
+
+  @property
+  def compression_type(self) -> wave_codecs.CompressionType:
+    """How the samples are compressed."""
+    return self._compression_type
+
+  @property
+  def number_frames(self) -> int:
+    """Number of frames written."""
+    return self._number_frames
+
+  @property
+  def data_size(self) -> int:
+    """Bytes of samples written."""
+    return self._data_size
+
+  def _get_header(self) -> bytes:
+    """Gets the RIFF header, fmt chunk and data chunk header of the file.
+
+    Returns:
+      Header, of the same length for any number of frames.
+    """
+    format_tag = _COMPRESSION_FORMAT_TAGS.get(
+        self._compression_type,
+        wave_format.get_format_tag(self._sample_format))
+    sample_bits = 8 * self._sample_width
+    format_extension = b''
+    if self._compression_type in (
+            wave_codecs.CompressionType.ULAW, wave_codecs.CompressionType.ALAW):
+      sample_bits = 8
+    elif self._compression_type == wave_codecs.CompressionType.IMA_ADPCM:
+      sample_bits = 4
+      format_extension = struct.pack('<H', self._block_frames)
+    format_chunk = struct.pack(
+        '<HHIIHH', format_tag, self._number_channels, self._sample_rate,
+        self._sample_rate * self._block_align // self._block_frames,
+        self._block_align, sample_bits)
+    fact_chunk = b''
+    if format_tag != wave_reader.WAVE_FORMAT_PCM:
+      # Non-PCM formats have an extension size and a fact chunk.
+      format_chunk += struct.pack('<H', len(format_extension))
+      format_chunk += format_extension
+      fact_chunk = struct.pack('<4sII', b'fact', 4, self._number_frames)
+
+    data_size = self._data_size
+    riff_size = (
+        4 + 8 + len(format_chunk) + len(fact_chunk) + 8 + data_size +
+        data_size % 2)
+    return b''.join([
+        struct.pack('<4sI4s', b'RIFF', riff_size, b'WAVE'),
+        struct.pack('<4sI', b'fmt ', len(format_chunk)),
+        format_chunk,
+        fact_chunk,
+        struct.pack('<4sI', b'data', data_size),
+    ])
+
+  def write_samples(self, sample_values: np.ndarray) -> int:
+    """Converts and writes interleaved samples.
+
+    Args:
+      sample_values: Samples in the working precision, whole frames of
+        consecutive channels.
+
+    Raises:
+      ValueError: Samples are not a whole number of frames.
+
+    Returns:
+      Number of bytes written.
+    """
+    if len(sample_values) % self._number_channels:
+      raise ValueError(
+          f'{len(sample_values)} samples are not whole frames of '
+          f'{self._number_channels} channels.')
+    if self._compression_type == wave_codecs.CompressionType.NONE:
+      sound_data = wave_format.encode_samples(
+          sample_values, self._sample_format)
+    elif self._compression_type == wave_codecs.CompressionType.ULAW:
+      sound_data = wave_codecs.encode_ulaw(
+          np.frombuffer(_get_int16_data(sample_values), dtype='<i2'))
+    elif self._compression_type == wave_codecs.CompressionType.ALAW:
+      sound_data = wave_codecs.encode_alaw(
+          np.frombuffer(_get_int16_data(sample_values), dtype='<i2'))
+    else:
+      sound_data = self._encode_adpcm_blocks(np.frombuffer(
+          _get_int16_data(sample_values), dtype='<i2').reshape(
+              -1, self._number_channels), _MIN_ENCODED_ADPCM_BLOCKS)
+    self._wav_file.write(sound_data)
+    self._number_frames += len(sample_values) // self._number_channels
+    self._data_size += len(sound_data)
+    return len(sound_data)
+
+  def _encode_adpcm_blocks(
+          self, frames_values: np.ndarray, min_blocks: int) -> bytes:
+    """Encodes the whole IMA ADPCM blocks of the pending and new frames.
+
+    Args:
+      frames_values: Int16 samples, one row per frame.
+      min_blocks: Min number of whole blocks to encode. Fewer are kept
+        pending.
+
+    Returns:
+      Encoded blocks. Frames after the last whole block are kept pending.
+    """
+    frames_values = np.concatenate([self._pending_frames, frames_values])
+    number_blocks = len(frames_values) // self._block_frames
+    if number_blocks < min_blocks:
+      self._pending_frames = frames_values
+      return b''
+    block_end = number_blocks * self._block_frames
+    self._pending_frames = frames_values[block_end:]
+    return wave_codecs.encode_ima_adpcm(
+        frames_values[:block_end], self._block_frames)
+
+  def close(self):
+    """Finishes the file, patching its header. Can be called many times."""
+    if self._wav_file.closed:
+      return
+    if len(self._pending_frames):
+      silence = np.zeros(
+          (-len(self._pending_frames) % self._block_frames,
+           self._number_channels), dtype=np.int16)
+      sound_data = self._encode_adpcm_blocks(silence, 1)
+      self._wav_file.write(sound_data)
+      self._data_size += len(sound_data)
+    data_size = self._data_size
+    # Chunks are padded to an even size.
+    if data_size % 2:
+      self._wav_file.write(b'\0')
+    self._wav_file.seek(0)
+    self._wav_file.write(self._get_header())
+    self._wav_file.close()
+
+
+class FlacWriter(WavWriter):
+  """FLAC file written block by block, in constant memory.
+
+  Frames are held until they fill a FLAC frame of
+  wave_codecs.FLAC_BLOCK_SIZE frames. The STREAMINFO block is written on
+  opening, and rewritten with the number of frames, frame sizes and MD5 of
+  the samples when the file is closed, with the last, shorter, FLAC frame.
+
+  Methods:
+    Same as WavWriter, so it can be used wherever one is.
+  """
+
+  def __init__(self, file_name: Text, number_channels: int, sample_rate: int):
+    """Instantiates a FlacWriter, writing the header of the file.
+
+    Args:
+      file_name: FLAC file to write.
+      number_channels: Number of channels, at most 8.
+      sample_rate: Number of frames per second.
+
+    Raises:
+      ValueError: number_channels must be from 1 to 8.
+    """
+    if number_channels > 8:
+      raise ValueError(
+          f'FLAC files have at most 8 channels, got {number_channels}.')
+    self._samples_md5 = hashlib.md5()
+    # MD5 of all the samples, once closing.
+    self._samples_digest = None
+    self._number_flac_frames = 0
+    self._min_frame_size = 0
+    self._max_frame_size = 0
+    super().__init__(
+        file_name, number_channels, sample_rate,
+        wave_format.SampleFormat.INT16, wave_codecs.CompressionType.FLAC)
+    self._block_frames = wave_codecs.FLAC_BLOCK_SIZE
+
+  def _get_header(self) -> bytes:
+    """Gets the signature and STREAMINFO block of the file.
+
+    Returns:
+      Header, of the same length for any number of frames.
+    """
+    return wave_codecs.get_flac_header(
+        self._number_channels, self._sample_rate, 8 * self._sample_width,
+        self._number_frames, self._min_frame_size, self._max_frame_size,
+        self._samples_digest)
+
+  def _encode_flac_frames(self, frames_values: np.ndarray) -> bytes:
+    """Encodes the whole FLAC frames of the pending and new frames.
+
+    Args:
+      frames_values: Int16 samples, one row per frame.
+
+    Returns:
+      Encoded FLAC frames. Frames after the last whole one are kept pending.
+    """
+    frames_values = np.concatenate([self._pending_frames, frames_values])
+    block_end = len(frames_values) // self._block_frames * self._block_frames
+    self._pending_frames = frames_values[block_end:]
+    return b''.join(
+        self._encode_flac_frame(
+            frames_values[block_start:block_start + self._block_frames])
+        for block_start in range(0, block_end, self._block_frames))
+
+  def _encode_flac_frame(self, frames_values: np.ndarray) -> bytes:
+    """Encodes a FLAC frame, keeping track of frame sizes.
+
+    Args:
+      frames_values: Int16 samples of the frame, one row per frame.
+
+    Returns:
+      Encoded FLAC frame.
+    """
+    flac_frame = wave_codecs.encode_flac_frame(
+        frames_values, self._number_flac_frames, 8 * self._sample_width)
+    self._number_flac_frames += 1
+    self._min_frame_size = min(
+        self._min_frame_size or len(flac_frame), len(flac_frame))
+    self._max_frame_size = max(self._max_frame_size, len(flac_frame))
+    return flac_frame
+
+  def write_samples(self, sample_values: np.ndarray) -> int:
+    """Compresses and writes interleaved samples.
+
+    Args:
+      sample_values: Samples in the working precision, whole frames of
+        consecutive channels.
+
+    Raises:
+      ValueError: Samples are not a whole number of frames.
+
+    Returns:
+      Number of bytes written.
+    """
+    if len(sample_values) % self._number_channels:
+      raise ValueError(
+          f'{len(sample_values)} samples are not whole frames of '
+          f'{self._number_channels} channels.')
+    sample_data = _get_int16_data(sample_values)
+    self._samples_md5.update(sample_data)
+    sound_data = self._encode_flac_frames(
+        np.frombuffer(sample_data, dtype='<i2').reshape(
+            -1, self._number_channels))
+    self._wav_file.write(sound_data)
+    self._number_frames += len(sample_values) // self._number_channels
+    self._data_size += len(sound_data)
+    return len(sound_data)
+
+  def close(self):
+    """Finishes the file, patching its header. Can be called many times."""
+    if self._wav_file.closed:
+      return
+    if len(self._pending_frames):
+      sound_data = self._encode_flac_frame(self._pending_frames)
+      self._pending_frames = self._pending_frames[:0]
+      self._wav_file.write(sound_data)
+      self._data_size += len(sound_data)
+    self._samples_digest = self._samples_md5.digest()
+    self._wav_file.seek(0)
+    self._wav_file.write(self._get_header())
+    self._wav_file.close()
+
+
+def open_wav_writer(
+        file_name: Text, number_channels: int, sample_rate: int,
+        sample_format: wave_format.SampleFormat = (
+            wave_format.SampleFormat.INT16),
+        compression_type: wave_codecs.CompressionType = (
+            wave_codecs.CompressionType.NONE)) -> WavWriter:
+  """Opens a WAV file, or a FLAC file if compressed as FLAC, to write to.
+
+  Args:
+    file_name: File to write.
+    number_channels: Number of channels.
+    sample_rate: Number of frames per second.
+    sample_format: Format to store the samples in.
+    compression_type: How to compress the samples.
+
+  Raises:
+    ValueError: number_channels must be at least 1, and compressed files
+      must have 16-bit samples.
+
+  Returns:
+    Sound file writer.
+  """
+  if compression_type == wave_codecs.CompressionType.FLAC:
+    if sample_format != wave_format.SampleFormat.INT16:
+      raise ValueError(
+          f'FLAC compression needs int16 samples, got {sample_format.value}.')
+    return FlacWriter(file_name, number_channels, sample_rate)
+  return WavWriter(
+      file_name, number_channels, sample_rate, sample_format, compression_type)